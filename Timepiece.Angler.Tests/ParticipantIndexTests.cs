@@ -0,0 +1,72 @@
+using System.Text;
+using Timepiece.Angler.Networks;
+using Timepiece.DataTypes;
+
+namespace Timepiece.Angler.Tests;
+
+public class ParticipantIndexTests
+{
+  /// <summary>
+  /// Write an index file in the format written by find_participants.py --index.
+  /// </summary>
+  private static string WriteIndex(ushort version, (string Name, Ipv4Prefix[] Prefixes)[] participants,
+    (string Peer, uint Participant, bool Exact)[] peers)
+  {
+    var path = Path.GetTempFileName();
+    using var writer = new BinaryWriter(File.Create(path), Encoding.UTF8);
+    writer.Write("TPPI"u8.ToArray());
+    writer.Write(version);
+    writer.Write((uint) participants.Length);
+    foreach (var (name, prefixes) in participants)
+    {
+      writer.Write(name);
+      writer.Write((uint) prefixes.Length);
+      foreach (var prefix in prefixes)
+      {
+        writer.Write(prefix.Prefix);
+        writer.Write((byte) prefix.PrefixLength.ToLong());
+      }
+    }
+
+    writer.Write((uint) peers.Length);
+    foreach (var (peer, participant, exact) in peers)
+    {
+      writer.Write(peer);
+      writer.Write(participant);
+      writer.Write((byte) (exact ? 1 : 0));
+    }
+
+    return path;
+  }
+
+  [Fact]
+  public void ReadsWrittenIndex()
+  {
+    var uiuc = new[] {new Ipv4Prefix("72.36.0.0/16"), new Ipv4Prefix("130.126.0.0/16")};
+    var ncsa = new[] {new Ipv4Prefix("141.142.0.0/16")};
+    var path = WriteIndex(1, new[] {("NCSA-PARTICIPANT", ncsa), ("UIUC-PARTICIPANT", uiuc)},
+      new[] {("64.57.28.2", 0u, false), ("72.36.127.157", 1u, true)});
+    var index = ParticipantIndex.Read(path);
+    File.Delete(path);
+    Assert.Equal(ncsa.Select(p => p.ToString()), index.ParticipantPrefixes["NCSA-PARTICIPANT"].Select(p => p.ToString()));
+    Assert.Equal(uiuc.Select(p => p.ToString()), index.ParticipantPrefixes["UIUC-PARTICIPANT"].Select(p => p.ToString()));
+    Assert.Equal(("NCSA-PARTICIPANT", false), index.PeerParticipants["64.57.28.2"]);
+    Assert.Equal(("UIUC-PARTICIPANT", true), index.PeerParticipants["72.36.127.157"]);
+  }
+
+  [Fact]
+  public void RejectsUnknownVersion()
+  {
+    var path = WriteIndex(2, Array.Empty<(string, Ipv4Prefix[])>(), Array.Empty<(string, uint, bool)>());
+    Assert.Throws<InvalidDataException>(() => ParticipantIndex.Read(path));
+    File.Delete(path);
+  }
+
+  [Fact]
+  public void BuiltInPrefixesUsedWithoutIndex()
+  {
+    Assert.Null(Environment.GetEnvironmentVariable(Internet2Prefixes.IndexPathVariable));
+    Assert.Contains(Internet2Prefixes.GetParticipantPrefixes("64.57.28.2"),
+      p => p.Prefix.ToString() == "141.142.0.0/16" && !p.Exact);
+  }
+}
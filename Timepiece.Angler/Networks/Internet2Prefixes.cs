@@ -4,6 +4,30 @@ namespace Timepiece.Angler.Networks;
 
 public static class Internet2Prefixes
 {
+  /// <summary>
+  /// Environment variable giving the path of a participant index file (see <see cref="ParticipantIndex"/>)
+  /// to use instead of the built-in participant prefix lists.
+  /// </summary>
+  public const string IndexPathVariable = "TIMEPIECE_PARTICIPANT_INDEX";
+
+  /// <summary>
+  /// The participant prefix lists in use, loaded when first needed.
+  /// </summary>
+  private static readonly Lazy<ParticipantIndex> Index = new(LoadIndex);
+
+  /// <summary>
+  /// External peers to their participant prefix list.
+  /// If the Exact field is true, the participant is used in an exact match;
+  /// otherwise, the prefix list filter also matches longer prefixes.
+  /// </summary>
+  internal static IReadOnlyDictionary<string, (string Participant, bool Exact)> ExternalPeerParticipantList =>
+    Index.Value.PeerParticipants;
+
+  /// <summary>
+  /// Prefixes matched by each PARTICIPANT prefix list.
+  /// </summary>
+  internal static IReadOnlyDictionary<string, Ipv4Prefix[]> ParticipantPrefixes => Index.Value.ParticipantPrefixes;
+
   /// <summary>
   /// Return all the participant prefixes of a given node.
   /// Each prefix is bundled with the node's boolean indicating whether or not the prefix should match another exactly.
@@ -13,20 +37,32 @@ public static class Internet2Prefixes
   public static IEnumerable<(Ipv4Prefix Prefix, bool Exact)> GetParticipantPrefixes(string node)
   {
     // get the prefix list for this neighbor, to then get the prefixes it uses
-    if (!ExternalPeerParticipantList.TryGetValue(node, out var participantList))
+    if (!ExternalPeerParticipantList.TryGetValue(node, out var participantList) ||
+        !ParticipantPrefixes.TryGetValue(participantList.Participant, out var prefixes))
       return Enumerable.Empty<(Ipv4Prefix, bool)>();
-    return ParticipantPrefixes.Where(prefixList => participantList.Participant == prefixList.Key)
-      .SelectMany(prefixList => prefixList.Value)
-      .Select(p => (p, participantList.Exact));
+    return prefixes.Select(p => (p, participantList.Exact));
   }
 
   /// <summary>
-  /// External peers to their participant prefix list.
-  /// If the Exact field is true, the participant is used in an exact match;
-  /// otherwise, the prefix list filter also matches longer prefixes.
+  /// Read the participant index file given by <see cref="IndexPathVariable"/>, if any,
+  /// and otherwise use the built-in participant prefix lists.
+  /// </summary>
+  private static ParticipantIndex LoadIndex()
+  {
+    var path = Environment.GetEnvironmentVariable(IndexPathVariable);
+    if (string.IsNullOrEmpty(path))
+      return new ParticipantIndex(BuiltInExternalPeerParticipantList,
+        BuiltInParticipantPrefixes.ToDictionary(p => p.Key, p => p.Value.ToArray()));
+    Console.WriteLine($"Reading participant prefix lists from {path}");
+    return ParticipantIndex.Read(path);
+  }
+
+  /// <summary>
+  /// Built-in external peers to their participant prefix list,
+  /// used unless a participant index file is given.
   /// Discovered via the find_participants.py script.
   /// </summary>
-  internal static readonly Dictionary<string, (string Participant, bool Exact)> ExternalPeerParticipantList = new()
+  private static readonly Dictionary<string, (string Participant, bool Exact)> BuiltInExternalPeerParticipantList = new()
   {
     {"64.57.23.30", ("WORLDBANK-PARTICIPANT", false)},
     {"64.57.28.2", ("NCSA-PARTICIPANT", false)},
@@ -158,9 +194,10 @@ public static class Internet2Prefixes
   };
 
   /// <summary>
-  /// Prefixes matched by each PARTICIPANT prefix list.
+  /// Built-in prefixes matched by each PARTICIPANT prefix list,
+  /// used unless a participant index file is given.
   /// </summary>
-  internal static readonly Dictionary<string, List<Ipv4Prefix>> ParticipantPrefixes = new()
+  private static readonly Dictionary<string, List<Ipv4Prefix>> BuiltInParticipantPrefixes = new()
   {
     {
       "AREON-PARTICIPANT", new List<Ipv4Prefix>
@@ -0,0 +1,92 @@
+using System.Text;
+using Timepiece.DataTypes;
+using ZenLib;
+
+namespace Timepiece.Angler.Networks;
+
+/// <summary>
+/// The participant prefix lists of external peers, and the prefixes of each list.
+/// Read from an index file written by <c>find_participants.py --index</c>, so that
+/// updating the participants of a network does not require rebuilding Timepiece.Angler.
+/// </summary>
+public class ParticipantIndex
+{
+  /// <summary>
+  /// The bytes every index file starts with.
+  /// </summary>
+  private static readonly byte[] Magic = "TPPI"u8.ToArray();
+
+  /// <summary>
+  /// The version of the index file format this class reads.
+  /// </summary>
+  private const ushort Version = 1;
+
+  public ParticipantIndex(IReadOnlyDictionary<string, (string Participant, bool Exact)> peerParticipants,
+    IReadOnlyDictionary<string, Ipv4Prefix[]> participantPrefixes)
+  {
+    PeerParticipants = peerParticipants;
+    ParticipantPrefixes = participantPrefixes;
+  }
+
+  /// <summary>
+  /// External peers to their participant prefix list and whether the list is matched exactly.
+  /// </summary>
+  public IReadOnlyDictionary<string, (string Participant, bool Exact)> PeerParticipants { get; }
+
+  /// <summary>
+  /// Participant prefix lists to their prefixes.
+  /// </summary>
+  public IReadOnlyDictionary<string, Ipv4Prefix[]> ParticipantPrefixes { get; }
+
+  /// <summary>
+  /// Read an index file.
+  /// All numbers are little-endian, and strings are prefixed by their length as <see cref="BinaryReader"/> expects.
+  /// The file starts with the magic bytes "TPPI" and the format version (u16).
+  /// It then lists the prefix lists (a u32 count, then each list's name, a u32 count of its prefixes,
+  /// and each prefix as its address (u32) and length (u8)),
+  /// and finally the peers (a u32 count, then each peer's address, the position of its list (u32)
+  /// and whether the list is matched exactly (u8)).
+  /// </summary>
+  /// <param name="path">The path to the index file.</param>
+  /// <returns>The index.</returns>
+  /// <exception cref="InvalidDataException">If the file is not an index file this class can read.</exception>
+  public static ParticipantIndex Read(string path)
+  {
+    using var reader = new BinaryReader(File.OpenRead(path), Encoding.UTF8);
+    if (!reader.ReadBytes(Magic.Length).SequenceEqual(Magic))
+      throw new InvalidDataException($"{path} is not a participant index file.");
+    var version = reader.ReadUInt16();
+    if (version != Version)
+      throw new InvalidDataException(
+        $"{path} is a version {version} participant index file, but only version {Version} is supported.");
+
+    var participants = new string[reader.ReadUInt32()];
+    var participantPrefixes = new Dictionary<string, Ipv4Prefix[]>(participants.Length);
+    for (var i = 0; i < participants.Length; i++)
+    {
+      participants[i] = reader.ReadString();
+      var prefixes = new Ipv4Prefix[reader.ReadUInt32()];
+      for (var j = 0; j < prefixes.Length; j++)
+      {
+        prefixes[j] = new Ipv4Prefix
+        {
+          Prefix = reader.ReadUInt32(),
+          PrefixLength = new UInt<_6>(reader.ReadByte())
+        };
+      }
+
+      participantPrefixes[participants[i]] = prefixes;
+    }
+
+    var peerCount = reader.ReadUInt32();
+    var peerParticipants = new Dictionary<string, (string Participant, bool Exact)>((int) peerCount);
+    for (var i = 0; i < peerCount; i++)
+    {
+      var peer = reader.ReadString();
+      var participant = participants[reader.ReadUInt32()];
+      peerParticipants[peer] = (participant, reader.ReadByte() != 0);
+    }
+
+    return new ParticipantIndex(peerParticipants, participantPrefixes);
+  }
+}
@@ -1,4 +1,5 @@
 ﻿using System.CommandLine;
+using System.CommandLine.Invocation;
 using System.Diagnostics;
 using Newtonsoft.Json;
 using Timepiece;
@@ -6,8 +7,7 @@ using Timepiece.Angler.Ast;
 using Timepiece.Angler.Networks;
 using ZenLib;
 
-ZenSettings.UseLargeStack = true;
-ZenSettings.LargeStackSize = 30_000_000;
+RuntimeSettings.ConfigureZen();
 
 var rootCommand = new RootCommand("Timepiece benchmark runner");
 var listQueriesCommand = new Command("list-queries", "Print the types of queries available to check");
@@ -25,6 +25,15 @@ var trackTermsOption = new System.CommandLine.Option<bool>(
 var prefixDepthOption = new System.CommandLine.Option<int?>(new[] {"--max-prefixes", "-P"}, () => null,
   "If specified, use up to the specified maximum number of prefixes for each node; otherwise use all prefixes." +
   "Relevant only for Internet2Reachable.");
+var nodeTimesOption = new System.CommandLine.Option<bool>(
+  new[] {"--node-times", "-N"},
+  "If given, report the time taken to check each node");
+var orderOption = new System.CommandLine.Option<string?>(
+  new[] {"--order", "-O"},
+  "If given, a file of estimated node times (written by node_order.py) to schedule the checks longest-first");
+var statsFileOption = new System.CommandLine.Option<string?>(
+  new[] {"--stats-file", "-S"},
+  "If given, a file to write the run's events to as JSON lines (e.g. /dev/fd/3 for an open file descriptor)");
 var fileArgument = new Argument<string>(
   "file",
   "The .angler.json file to use");
@@ -40,17 +49,52 @@ runCommand.Add(monoOption);
 runCommand.Add(queryOption);
 runCommand.Add(trackTermsOption);
 runCommand.Add(prefixDepthOption);
+runCommand.Add(nodeTimesOption);
+runCommand.Add(orderOption);
+runCommand.Add(statsFileOption);
+// the last deserialized network, with its file's full path and last write time, reused by the next jobs
+// of a worker on the same unchanged file; only one is kept, so a worker serving many files (or an edited file)
+// does not hold on to old networks
+(string Path, DateTime Written, AnglerNetwork? Ast)? cached = null;
+// more options than SetHandler can bind, so they are read from the parse result
 runCommand.SetHandler(
-  (file, queryType, mono, printQuery, trackTerms, prefixDepth) =>
+  (InvocationContext context) =>
   {
-    var json = new JsonTextReader(new StreamReader(file));
+    var file = context.ParseResult.GetValueForArgument(fileArgument);
+    var queryType = context.ParseResult.GetValueForArgument(queryArgument);
+    var mono = context.ParseResult.GetValueForOption(monoOption);
+    var printQuery = context.ParseResult.GetValueForOption(queryOption);
+    var trackTerms = context.ParseResult.GetValueForOption(trackTermsOption);
+    var prefixDepth = context.ParseResult.GetValueForOption(prefixDepthOption);
+    var nodeTimes = context.ParseResult.GetValueForOption(nodeTimesOption);
+    var order = context.ParseResult.GetValueForOption(orderOption);
+    var statsFile = context.ParseResult.GetValueForOption(statsFileOption);
+    using var events = statsFile is null
+      ? null
+      : StatsStream.Open(statsFile, new Dictionary<string, object?> {{"file", file}, {"query", queryType.ToString()}});
+    var path = Path.GetFullPath(file);
+    var written = File.GetLastWriteTimeUtc(file);
+    AnglerNetwork? ast;
+    if (cached is { } last && last.Path == path && last.Written == written)
+    {
+      ast = last.Ast;
+      Console.WriteLine($"Reusing deserialized JSON file {file}");
+    }
+    else
+    {
+      // let the old network be collected before deserializing the new one
+      cached = null;
+      var json = new JsonTextReader(new StreamReader(file));
 
-    var ast = AstSerializationBinder.JsonSerializer().Deserialize<AnglerNetwork>(json);
+      ast = AstSerializationBinder.JsonSerializer().Deserialize<AnglerNetwork>(json);
+
+      Console.WriteLine($"Successfully deserialized JSON file {file}");
+      Debug.WriteLine("Running in debug mode...");
+      Debug.WriteLine("Warning: additional assertions in debug mode may substantially slow running time!");
+      json.Close();
+      cached = (path, written, ast);
+    }
 
-    Console.WriteLine($"Successfully deserialized JSON file {file}");
-    Debug.WriteLine("Running in debug mode...");
-    Debug.WriteLine("Warning: additional assertions in debug mode may substantially slow running time!");
-    json.Close();
     if (ast != null)
     {
       var (topology, transfer) = ast.TopologyAndTransfer(trackTerms: trackTerms);
@@ -110,14 +154,21 @@ runCommand.SetHandler(
       // turn on query printing if true
       net.PrintFormulas = printQuery;
       if (mono)
-        Profile.RunMonoWithStats(net);
+        Profile.RunMonoWithStats(net, events);
       else
-        Profile.RunAnnotatedWithStats(net);
+        Profile.RunAnnotatedWithStats(net, nodeTimes ? Statistics.All : Statistics.Summary,
+          order is null ? null : CheckOrder.Read(order), events);
     }
     else
     {
       Console.WriteLine("Failed to deserialize contents of {file} (received null).");
+      events?.Error($"Failed to deserialize contents of {file} (received null).");
     }
-  }, fileArgument, queryArgument, monoOption, queryOption, trackTermsOption, prefixDepthOption);
+  });
+
+var workerCommand = new Command("worker",
+  "Run commands given as JSON lines of arguments on stdin in this process, reusing deserialized files across them");
+workerCommand.SetHandler(() => Worker.Serve(jobArgs => rootCommand.InvokeAsync(jobArgs)));
+rootCommand.AddCommand(workerCommand);
 
 await rootCommand.InvokeAsync(args);
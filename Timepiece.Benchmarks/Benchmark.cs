@@ -4,7 +4,8 @@ namespace Timepiece.Benchmarks;
 
 public class Benchmark
 {
-  public Benchmark(uint n, string? destination, BenchmarkType type, bool verbose, bool runMonolithic, bool inferTimes)
+  public Benchmark(uint n, string? destination, BenchmarkType type, bool verbose, bool runMonolithic, bool inferTimes,
+    bool reportNodeTimes = false, CheckOrder? order = null, StatsStream? events = null)
   {
     N = n;
     if (type.HasSymbolicDestination())
@@ -27,6 +28,9 @@ public class Benchmark
     Verbose = verbose;
     RunMonolithic = runMonolithic;
     InferTimes = inferTimes;
+    ReportNodeTimes = reportNodeTimes;
+    Order = order;
+    Events = events;
   }
 
   public BenchmarkType Bench { get; set; }
@@ -41,6 +45,21 @@ public class Benchmark
 
   public bool InferTimes { get; set; }
 
+  /// <summary>
+  ///   If true, report the time taken to check each node, in addition to the summary statistics.
+  /// </summary>
+  public bool ReportNodeTimes { get; set; }
+
+  /// <summary>
+  ///   If given, the estimated node times used to schedule the modular checks longest-first.
+  /// </summary>
+  public CheckOrder? Order { get; set; }
+
+  /// <summary>
+  ///   If given, the stream to write the run's events to as JSON lines.
+  /// </summary>
+  public StatsStream? Events { get; set; }
+
   public void Run()
   {
     switch (Bench)
@@ -105,9 +124,9 @@ public class Benchmark
   {
     net.PrintFormulas = Verbose;
     if (RunMonolithic)
-      Profile.RunMonoWithStats(net);
+      Profile.RunMonoWithStats(net, Events);
     else
-      Profile.RunAnnotatedWithStats(net);
+      Profile.RunAnnotatedWithStats(net, ReportNodeTimes ? Statistics.All : Statistics.Summary, Order, Events);
   }
 }
 
@@ -1,11 +1,12 @@
 ﻿// See https://aka.ms/new-console-template for more information
 
 using System.CommandLine;
+using System.CommandLine.Invocation;
+using Timepiece;
 using Timepiece.Benchmarks;
 using ZenLib;
 
-ZenSettings.UseLargeStack = true;
-ZenSettings.LargeStackSize = 30_000_000;
+RuntimeSettings.ConfigureZen();
 
 var rootCommand = new RootCommand("Timepiece benchmark runner");
 var sizeOption = new System.CommandLine.Option<uint>(
@@ -35,6 +36,15 @@ var verboseOption = new System.CommandLine.Option<bool>(
 var monoOption = new System.CommandLine.Option<bool>(
   new[] {"--mono", "--ms", "-m"},
   "If given, run the benchmark monolithically simulating Minesweeper");
+var nodeTimesOption = new System.CommandLine.Option<bool>(
+  new[] {"--node-times", "-N"},
+  "If given, report the time taken to check each node");
+var orderOption = new System.CommandLine.Option<string?>(
+  new[] {"--order", "-O"},
+  "If given, a file of estimated node times (written by node_order.py) to schedule the checks longest-first");
+var statsFileOption = new System.CommandLine.Option<string?>(
+  new[] {"--stats-file", "-S"},
+  "If given, a file to write the run's events to as JSON lines (e.g. /dev/fd/3 for an open file descriptor)");
 var benchArgument = new Argument<BenchmarkType>(
   "benchmark",
   description: "The type of benchmark to test (accepts short-hands: 'r', 'l', 'v', 'h'...)",
@@ -45,12 +55,36 @@ rootCommand.Add(benchArgument);
 rootCommand.Add(verboseOption);
 rootCommand.Add(monoOption);
 rootCommand.Add(inferOption);
+rootCommand.Add(nodeTimesOption);
+rootCommand.Add(orderOption);
+rootCommand.Add(statsFileOption);
 
+// more options than SetHandler can bind, so they are read from the parse result
 rootCommand.SetHandler(
-  (size, dest, bench, verbose, mono, infer) =>
+  (InvocationContext context) =>
   {
+    var size = context.ParseResult.GetValueForOption(sizeOption);
+    var dest = context.ParseResult.GetValueForOption(destOption);
+    var bench = context.ParseResult.GetValueForArgument(benchArgument);
+    var order = context.ParseResult.GetValueForOption(orderOption);
+    var statsFile = context.ParseResult.GetValueForOption(statsFileOption);
+    using var events = statsFile is null
+      ? null
+      : StatsStream.Open(statsFile,
+        new Dictionary<string, object?> {{"benchmark", bench.ToString()}, {"size", size}, {"destination", dest}});
     Console.WriteLine($"k={size}");
-    new Benchmark(size, dest, bench, verbose, mono, infer).Run();
-  }, sizeOption, destOption, benchArgument, verboseOption, monoOption, inferOption);
+    new Benchmark(size, dest, bench,
+      context.ParseResult.GetValueForOption(verboseOption),
+      context.ParseResult.GetValueForOption(monoOption),
+      context.ParseResult.GetValueForOption(inferOption),
+      context.ParseResult.GetValueForOption(nodeTimesOption),
+      order is null ? null : CheckOrder.Read(order),
+      events).Run();
+  });
+
+var workerCommand = new Command("worker",
+  "Run benchmarks given as JSON lines of arguments on stdin in this process, skipping startup costs after the first");
+workerCommand.SetHandler(() => Worker.Serve(jobArgs => rootCommand.InvokeAsync(jobArgs)));
+rootCommand.AddCommand(workerCommand);
 
 await rootCommand.InvokeAsync(args);
@@ -0,0 +1,48 @@
+using System.Collections.Generic;
+using System.IO;
+using Xunit;
+
+namespace Timepiece.Tests;
+
+public class CheckOrderTests
+{
+  private static string WriteHints(string contents)
+  {
+    var path = Path.GetTempFileName();
+    File.WriteAllText(path, contents);
+    return path;
+  }
+
+  [Fact]
+  public void ReadsWrittenHints()
+  {
+    var path = WriteHints("# node\tms\naggregation-13\t5400\n\nedge-20\t310\n");
+    var order = CheckOrder.Read(path);
+    File.Delete(path);
+    Assert.Equal(2, order.Estimates.Count);
+    Assert.Equal(5400, order.Estimates["aggregation-13"]);
+    Assert.Equal(310, order.Estimates["edge-20"]);
+  }
+
+  [Theory]
+  [InlineData("edge-20\n")]
+  [InlineData("edge-20\t-1\n")]
+  [InlineData("edge-20\t3.5\n")]
+  public void RejectsInvalidHints(string contents)
+  {
+    var path = WriteHints(contents);
+    Assert.Throws<InvalidDataException>(() => CheckOrder.Read(path));
+    File.Delete(path);
+  }
+
+  [Fact]
+  public void OrdersLongestFirstWithUnknownNodesFirst()
+  {
+    var order = new CheckOrder(new Dictionary<string, long>
+    {
+      {"core-0", 100}, {"aggregation-4", 900}, {"edge-6", 100}, {"edge-7", 300}
+    });
+    var nodes = new[] {"core-0", "core-1", "aggregation-4", "edge-6", "edge-7"};
+    Assert.Equal(new[] {"core-1", "aggregation-4", "edge-7", "core-0", "edge-6"}, order.Order(nodes));
+  }
+}
@@ -0,0 +1,31 @@
+using System;
+using Xunit;
+
+namespace Timepiece.Tests;
+
+public class RuntimeSettingsTests
+{
+  [Theory]
+  [InlineData(null)]
+  [InlineData("")]
+  [InlineData(" ")]
+  public void UnsetStackSizeIsDefault(string? value)
+  {
+    Assert.Equal(RuntimeSettings.DefaultZenStackSize, RuntimeSettings.ParseStackSize(value));
+  }
+
+  [Fact]
+  public void ParsesStackSize()
+  {
+    Assert.Equal(100_000_000, RuntimeSettings.ParseStackSize("100000000"));
+  }
+
+  [Theory]
+  [InlineData("0")]
+  [InlineData("-1")]
+  [InlineData("30MB")]
+  public void RejectsInvalidStackSize(string value)
+  {
+    Assert.Throws<ArgumentException>(() => RuntimeSettings.ParseStackSize(value));
+  }
+}
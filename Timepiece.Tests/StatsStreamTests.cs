@@ -0,0 +1,55 @@
+using System.Collections.Generic;
+using System.IO;
+using System.Linq;
+using Newtonsoft.Json.Linq;
+using Xunit;
+
+namespace Timepiece.Tests;
+
+public class StatsStreamTests
+{
+  private static List<JObject> Events(StringWriter writer)
+  {
+    return writer.ToString().Split('\n', System.StringSplitOptions.RemoveEmptyEntries).Select(JObject.Parse)
+      .ToList();
+  }
+
+  [Fact]
+  public void WritesOneEventPerLine()
+  {
+    var writer = new StringWriter();
+    var events = new StatsStream(writer, new Dictionary<string, object?> {{"benchmark", "Reach"}, {"size", 4}});
+    events.Run("modular", 2);
+    events.Start("edge-19");
+    events.Finish("edge-19", 12, false);
+    events.Start("core-0");
+    events.Finish("core-0", 30, true);
+    events.ModularSummary(new Dictionary<string, long> {{"edge-19", 12}, {"core-0", 30}}, 35, new[] {"core-0"});
+    var written = Events(writer);
+
+    Assert.Equal(new[] {"run", "start", "finish", "start", "finish", "summary"},
+      written.Select(e => e["event"]!.Value<string>()));
+    Assert.Equal("Reach", written[0]["benchmark"]!.Value<string>());
+    Assert.Equal(StatsStream.Version, written[0]["version"]!.Value<int>());
+    Assert.Equal(2, written[0]["nodes"]!.Value<int>());
+    Assert.True(written[4]["counterexample"]!.Value<bool>());
+    var summary = written[5];
+    Assert.Equal(30, summary["max"]!.Value<long>());
+    Assert.Equal(42, summary["total"]!.Value<long>());
+    Assert.Equal(35, summary["wall"]!.Value<long>());
+    Assert.False(summary["passed"]!.Value<bool>());
+    Assert.Equal(new[] {"core-0"}, summary["failed"]!.Values<string>());
+  }
+
+  [Fact]
+  public void IncompleteModularRunDoesNotPass()
+  {
+    var writer = new StringWriter();
+    var events = new StatsStream(writer);
+    events.ModularSummary(new Dictionary<string, long>(), null, new List<string>());
+    var summary = Events(writer).Single();
+    Assert.Equal(0, summary["n"]!.Value<int>());
+    Assert.Equal(JTokenType.Null, summary["wall"]!.Type);
+    Assert.False(summary["passed"]!.Value<bool>());
+  }
+}
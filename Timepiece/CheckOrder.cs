@@ -0,0 +1,65 @@
+using System;
+using System.Collections.Generic;
+using System.Globalization;
+using System.IO;
+using System.Linq;
+
+namespace Timepiece;
+
+/// <summary>
+///   Estimated times to check each node, used to schedule a network's modular checks longest-first
+///   (see <c>node_order.py</c>, which writes them from the times of past runs).
+/// </summary>
+public class CheckOrder
+{
+  public CheckOrder(IReadOnlyDictionary<string, long> estimates)
+  {
+    Estimates = estimates;
+  }
+
+  /// <summary>
+  ///   The estimated time to check each node in milliseconds, keyed by node name.
+  /// </summary>
+  public IReadOnlyDictionary<string, long> Estimates { get; }
+
+  /// <summary>
+  ///   Read the estimates from a hint file: one node per line, as its name and its estimated time
+  ///   in milliseconds separated by a tab. Blank lines and lines starting with '#' are ignored.
+  /// </summary>
+  /// <param name="path">The path to the hint file.</param>
+  /// <returns>The estimates of the file.</returns>
+  /// <exception cref="InvalidDataException">If a line does not give a node and a non-negative time.</exception>
+  public static CheckOrder Read(string path)
+  {
+    var estimates = new Dictionary<string, long>();
+    var lineNumber = 0;
+    foreach (var line in File.ReadLines(path))
+    {
+      lineNumber++;
+      if (string.IsNullOrWhiteSpace(line) || line.StartsWith('#')) continue;
+      var fields = line.Split('\t');
+      if (fields.Length != 2 || !long.TryParse(fields[1], NumberStyles.None, CultureInfo.InvariantCulture,
+            out var ms))
+        throw new InvalidDataException(
+          $"{path}:{lineNumber}: expected a node name and a time in milliseconds separated by a tab.");
+      estimates[fields[0]] = ms;
+    }
+
+    return new CheckOrder(estimates);
+  }
+
+  /// <summary>
+  ///   Order the given nodes longest-first by their estimated times.
+  ///   Nodes without an estimate come first (as any of them may be the slowest),
+  ///   and nodes with equal estimates keep their given order.
+  /// </summary>
+  /// <param name="nodes">The nodes to order.</param>
+  /// <typeparam name="NodeType">The type of nodes, whose string forms are looked up in the estimates.</typeparam>
+  /// <returns>The ordered nodes.</returns>
+  public IReadOnlyList<NodeType> Order<NodeType>(IEnumerable<NodeType> nodes)
+  {
+    return nodes
+      .OrderByDescending(node => Estimates.TryGetValue(node.ToString(), out var ms) ? ms : long.MaxValue)
+      .ToList();
+  }
+}
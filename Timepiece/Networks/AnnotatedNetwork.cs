@@ -1,8 +1,10 @@
 #nullable enable
 using System;
+using System.Collections.Concurrent;
 using System.Collections.Generic;
 using System.Linq;
 using System.Numerics;
+using System.Threading.Tasks;
 using Timepiece.DataTypes;
 using ZenLib;
 using static ZenLib.Zen;
@@ -194,6 +196,34 @@ public class AnnotatedNetwork<RouteType, NodeType> : Network<RouteType, NodeType
     return s;
   }
 
+  /// <summary>
+  ///   Verify that the annotations are sound, calling the given function f on each node's check,
+  ///   and starting the checks in the given order on at most maxWorkers threads.
+  ///   Each thread takes the next unstarted node when it finishes one, so ordering the nodes longest-first
+  ///   avoids a slow node starting last and leaving the other threads idle while it finishes.
+  /// </summary>
+  /// <param name="collector"></param>
+  /// <param name="f"></param>
+  /// <param name="order">The nodes of the network in the order to start their checks.</param>
+  /// <param name="maxWorkers">The maximum number of checks to run at once.</param>
+  /// <returns></returns>
+  public Dictionary<NodeType, Option<State<RouteType, NodeType>>> CheckAnnotationsWith<TAcc>(
+    TAcc collector,
+    Func<NodeType, TAcc, Func<Option<State<RouteType, NodeType>>>,
+      Option<State<RouteType, NodeType>>> f,
+    IEnumerable<NodeType> order,
+    int maxWorkers)
+  {
+    var routes = NodeRoutes();
+    var time = Symbolic<BigInteger>("time");
+    var s = new ConcurrentDictionary<NodeType, Option<State<RouteType, NodeType>>>();
+    // without buffering, the partitioner hands out one node at a time in order
+    Parallel.ForEach(Partitioner.Create(order, EnumerablePartitionerOptions.NoBuffering),
+      new ParallelOptions {MaxDegreeOfParallelism = maxWorkers},
+      node => s[node] = f(node, collector, () => CheckAnnotations(node, routes, time)));
+    return new Dictionary<NodeType, Option<State<RouteType, NodeType>>>(s);
+  }
+
   public Option<State<RouteType, NodeType>> CheckAnnotations(NodeType node)
   {
     return CheckAnnotations(node, NeighborRoutes(node), Symbolic<BigInteger>("time"));
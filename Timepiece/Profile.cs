@@ -11,22 +11,39 @@ namespace Timepiece;
 
 public static class Profile
 {
-  public static void RunMonoWithStats<RouteType, NodeType>(AnnotatedNetwork<RouteType, NodeType> annotatedNetwork)
+  /// <summary>
+  ///   Run the monolithic check of the given network and report its time.
+  /// </summary>
+  /// <param name="annotatedNetwork"></param>
+  /// <param name="events">If given, the stream to also write the run's events to.</param>
+  public static void RunMonoWithStats<RouteType, NodeType>(AnnotatedNetwork<RouteType, NodeType> annotatedNetwork,
+    StatsStream events = null)
   {
     const string headers = "n\ttotal";
-    var monoTime = Time(RunMono, annotatedNetwork);
-    var data = $"{annotatedNetwork.Digraph.Nodes.Count}\t{monoTime}";
+    var numNodes = annotatedNetwork.Digraph.Nodes.Count;
+    events?.Run("mono", numNodes);
+    var passed = false;
+    var monoTime = Time(net => passed = RunMono(net, events), annotatedNetwork);
+    var data = $"{numNodes}\t{monoTime}";
     Console.WriteLine($"Monolithic verification took {monoTime}ms");
     Console.WriteLine(headers);
     Console.WriteLine(data);
+    events?.MonolithicSummary(numNodes, monoTime, passed);
   }
 
-  public static void RunMono<RouteType, NodeType>(AnnotatedNetwork<RouteType, NodeType> annotatedNetwork)
+  /// <summary>
+  ///   Run the monolithic check of the given network, reporting any counterexample.
+  /// </summary>
+  /// <param name="annotatedNetwork"></param>
+  /// <param name="events">If given, the stream to write an error event to if the check does not complete.</param>
+  /// <returns>True if the check passed, and false otherwise.</returns>
+  public static bool RunMono<RouteType, NodeType>(AnnotatedNetwork<RouteType, NodeType> annotatedNetwork,
+    StatsStream events = null)
   {
     try
     {
       var s = annotatedNetwork.Check(SmtCheck.Monolithic);
-      if (!s.HasValue) return;
+      if (!s.HasValue) return true;
       s.Value.ReportCheckFailure();
       Console.WriteLine("Error, monolithic verification failed!");
     }
@@ -35,23 +52,43 @@ public static class Profile
       Console.WriteLine("Error, monolithic verification did not complete:");
       Console.WriteLine(e.Message);
       Console.WriteLine(e.StackTrace);
+      events?.Error(e.Message);
     }
+
+    return false;
   }
 
-  public static void RunAnnotatedWithStats<RouteType, NodeType>(AnnotatedNetwork<RouteType, NodeType> annotatedNetwork)
+  /// <summary>
+  ///   Run the modular checks of the given network and report the requested statistics on their times.
+  /// </summary>
+  /// <param name="annotatedNetwork"></param>
+  /// <param name="stats">The statistics to report: include Statistics.Individual to report each node's time.</param>
+  /// <param name="order">If given, start the checks longest-first by its estimates, on at most one thread per processor.</param>
+  /// <param name="events">If given, the stream to also write the run's events to.</param>
+  public static void RunAnnotatedWithStats<RouteType, NodeType>(AnnotatedNetwork<RouteType, NodeType> annotatedNetwork,
+    Statistics stats = Statistics.Summary, CheckOrder order = null, StatsStream events = null)
   {
     var processes = Environment.ProcessorCount;
     Console.WriteLine($"Environment.ProcessorCount: {processes}");
+    if (order is not null)
+      Console.WriteLine($"Checking nodes longest-first using {order.Estimates.Count} estimated node times");
     var numNodes = annotatedNetwork.Digraph.Nodes.Count;
     var nodeTimes = new ConcurrentDictionary<NodeType, long>(processes * 2, numNodes);
+    var failedNodes = new List<NodeType>();
+    Func<NodeType, ConcurrentDictionary<NodeType, long>, Func<Option<State<RouteType, NodeType>>>,
+      Option<State<RouteType, NodeType>>> check = events is null
+      ? LogCheckTime
+      : (node, times, checkFunction) => LogCheckEvents(node, times, checkFunction, events);
+    events?.Run("modular", numNodes);
     long? t = null;
     try
     {
       t = Time(net =>
       {
-        var s = net.CheckAnnotationsWith(nodeTimes, LogCheckTime);
+        var s = order is null
+          ? net.CheckAnnotationsWith(nodeTimes, check)
+          : net.CheckAnnotationsWith(nodeTimes, check, order.Order(net.Digraph.Nodes), processes);
         var passed = true;
-        var failedNodes = new List<NodeType>();
         foreach (var (node, counterexample) in s)
         {
           if (!counterexample.HasValue) continue;
@@ -79,14 +116,17 @@ public static class Profile
     {
       Console.WriteLine("Error, modular verification did not complete:");
       Console.WriteLine(e.Message);
+      events?.Error(e.Message);
     }
     finally
     {
       if (!nodeTimes.IsEmpty)
       {
         Console.WriteLine("Statistics:");
-        StatisticsExtensions.ReportTimes(nodeTimes, Statistics.Summary, t, true);
+        StatisticsExtensions.ReportTimes(nodeTimes, stats, t, true);
       }
+
+      events?.ModularSummary(nodeTimes, t, failedNodes);
     }
   }
 
@@ -112,4 +152,20 @@ public static class Profile
     times.Add(node, timer.ElapsedMilliseconds);
     return s;
   }
+
+  /// <summary>
+  ///   Time the given check of a node as <see cref="LogCheckTime{T,NodeType}" /> does,
+  ///   also writing its start and finish to the given stream.
+  /// </summary>
+  public static Option<T> LogCheckEvents<T, NodeType>(NodeType node, IDictionary<NodeType, long> times,
+    Func<Option<T>> checkFunction, StatsStream events)
+  {
+    events.Start(node);
+    var timer = Stopwatch.StartNew();
+    var s = checkFunction();
+    var ms = timer.ElapsedMilliseconds;
+    times.Add(node, ms);
+    events.Finish(node, ms, s.HasValue);
+    return s;
+  }
 }
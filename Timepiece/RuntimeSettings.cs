@@ -0,0 +1,46 @@
+#nullable enable
+using System;
+using ZenLib;
+
+namespace Timepiece;
+
+/// <summary>
+///   Runtime settings shared by the Timepiece DLLs, which can be overridden by environment variables
+///   (e.g. when tuning them with <c>run_all.py --tune</c>) without rebuilding.
+/// </summary>
+public static class RuntimeSettings
+{
+  /// <summary>
+  ///   Environment variable giving the size (in bytes) of the stack Zen runs on.
+  /// </summary>
+  public const string ZenStackSizeVariable = "TIMEPIECE_ZEN_STACK_SIZE";
+
+  /// <summary>
+  ///   The size (in bytes) of the stack Zen runs on if <see cref="ZenStackSizeVariable" /> is not set.
+  /// </summary>
+  public const int DefaultZenStackSize = 30_000_000;
+
+  /// <summary>
+  ///   Run Zen on a large stack, of the size given by <see cref="ZenStackSizeVariable" /> if it is set.
+  /// </summary>
+  /// <exception cref="ArgumentException">If the variable is set but is not a positive integer.</exception>
+  public static void ConfigureZen()
+  {
+    ZenSettings.UseLargeStack = true;
+    ZenSettings.LargeStackSize = ParseStackSize(Environment.GetEnvironmentVariable(ZenStackSizeVariable));
+  }
+
+  /// <summary>
+  ///   Return the stack size given by the value of <see cref="ZenStackSizeVariable" />,
+  ///   or <see cref="DefaultZenStackSize" /> if it is unset or empty.
+  /// </summary>
+  /// <param name="value">The value of the variable.</param>
+  /// <returns>The stack size in bytes.</returns>
+  /// <exception cref="ArgumentException">If the value is not a positive integer.</exception>
+  public static int ParseStackSize(string? value)
+  {
+    if (string.IsNullOrWhiteSpace(value)) return DefaultZenStackSize;
+    if (int.TryParse(value, out var size) && size > 0) return size;
+    throw new ArgumentException($"{ZenStackSizeVariable} must be a positive number of bytes, not '{value}'.");
+  }
+}
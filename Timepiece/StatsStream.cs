@@ -0,0 +1,155 @@
+#nullable enable
+using System;
+using System.Collections.Generic;
+using System.Diagnostics;
+using System.IO;
+using System.Linq;
+using Newtonsoft.Json;
+
+namespace Timepiece;
+
+/// <summary>
+///   A machine-readable stream of the events of a run, written as JSON lines (one object per line, each with
+///   an <c>"event"</c> field) alongside the human-readable console output, for tools such as <c>run_all.py</c>
+///   to read as the run goes instead of parsing the console output. The events are:
+///   <list type="bullet">
+///     <item><c>run</c>: the run's metadata (its mode, number of nodes, processors, start time and the fields
+///       given by the DLL, e.g. its benchmark and size), written once before any checks start;</item>
+///     <item><c>start</c> and <c>finish</c>: a node's modular check starting and finishing, with its
+///       <c>duration</c> and whether it found a <c>counterexample</c>;</item>
+///     <item><c>summary</c>: the statistics of the run as in its table (<c>n</c>, <c>max</c>, ... <c>wall</c>,
+///       or <c>n</c> and <c>total</c> for monolithic runs), whether all checks <c>passed</c>, and any
+///       <c>failed</c> nodes;</item>
+///     <item><c>error</c>: verification did not complete.</item>
+///   </list>
+///   Every event has the milliseconds since the stream was opened (<c>ms</c>).
+///   Events may be written from several threads at once.
+/// </summary>
+public sealed class StatsStream : IDisposable
+{
+  /// <summary>
+  ///   The version of the events' format, bumped whenever their meaning changes.
+  /// </summary>
+  public const int Version = 1;
+
+  private readonly object _lock = new();
+  private readonly IDictionary<string, object?> _metadata;
+  private readonly Stopwatch _timer = Stopwatch.StartNew();
+  private readonly TextWriter _writer;
+
+  /// <summary>
+  ///   Construct a stream writing events to the given writer.
+  /// </summary>
+  /// <param name="writer">The writer to write to, which is closed with the stream.</param>
+  /// <param name="metadata">Fields to add to the run event.</param>
+  public StatsStream(TextWriter writer, IDictionary<string, object?>? metadata = null)
+  {
+    _writer = writer;
+    _metadata = metadata ?? new Dictionary<string, object?>();
+  }
+
+  public void Dispose()
+  {
+    lock (_lock)
+    {
+      _writer.Dispose();
+    }
+  }
+
+  /// <summary>
+  ///   Open a stream writing events to the file at the given path, replacing any existing file.
+  ///   On Linux, a path of the form <c>/dev/fd/N</c> writes to the open file descriptor N.
+  /// </summary>
+  /// <param name="path">The path to write to.</param>
+  /// <param name="metadata">Fields to add to the run event.</param>
+  /// <returns>The stream.</returns>
+  public static StatsStream Open(string path, IDictionary<string, object?>? metadata = null)
+  {
+    return new StatsStream(new StreamWriter(path, false) {AutoFlush = true}, metadata);
+  }
+
+  private void Write(string name, IEnumerable<KeyValuePair<string, object?>> fields)
+  {
+    var ev = new Dictionary<string, object?> {{"event", name}, {"ms", _timer.ElapsedMilliseconds}};
+    foreach (var (key, value) in fields) ev[key] = value;
+    var line = JsonConvert.SerializeObject(ev, Formatting.None);
+    lock (_lock)
+    {
+      _writer.WriteLine(line);
+    }
+  }
+
+  /// <summary>
+  ///   Write the run event.
+  /// </summary>
+  /// <param name="mode">"modular" or "mono".</param>
+  /// <param name="nodes">The number of nodes in the network.</param>
+  public void Run(string mode, int nodes)
+  {
+    Write("run", _metadata.Concat(new Dictionary<string, object?>
+    {
+      {"version", Version},
+      {"mode", mode},
+      {"nodes", nodes},
+      {"processors", Environment.ProcessorCount},
+      {"started", DateTime.UtcNow.ToString("o")}
+    }));
+  }
+
+  public void Start(object node)
+  {
+    Write("start", new Dictionary<string, object?> {{"node", node.ToString()}});
+  }
+
+  public void Finish(object node, long duration, bool counterexample)
+  {
+    Write("finish", new Dictionary<string, object?>
+    {
+      {"node", node.ToString()}, {"duration", duration}, {"counterexample", counterexample}
+    });
+  }
+
+  /// <summary>
+  ///   Write the summary event of a modular run, with the statistics of its table
+  ///   (see <see cref="StatisticsExtensions.ReportTimes{TKey}" />).
+  /// </summary>
+  /// <param name="times">The time taken to check each node.</param>
+  /// <param name="wallTime">The wall-clock time of the checks, if they completed.</param>
+  /// <param name="failed">The nodes with counterexamples.</param>
+  public void ModularSummary<TKey>(IDictionary<TKey, long> times, long? wallTime, IEnumerable<TKey> failed)
+  {
+    var fields = new Dictionary<string, object?> {{"n", times.Count}};
+    if (times.Count > 0)
+    {
+      var sorted = times.Values.OrderBy(t => t).ToList();
+      fields["max"] = sorted[^1];
+      fields["min"] = sorted[0];
+      fields["avg"] = sorted.Average();
+      fields["med"] = sorted[times.Count / 2];
+      fields["99p"] = sorted[(int) (times.Count * 0.99)];
+      fields["total"] = sorted.Sum();
+    }
+
+    fields["wall"] = wallTime;
+    var failedNodes = failed.Select(n => n!.ToString()).ToList();
+    fields["passed"] = wallTime is not null && failedNodes.Count == 0;
+    fields["failed"] = failedNodes;
+    Write("summary", fields);
+  }
+
+  /// <summary>
+  ///   Write the summary event of a monolithic run.
+  /// </summary>
+  /// <param name="nodes">The number of nodes in the network.</param>
+  /// <param name="total">The time taken to check the network.</param>
+  /// <param name="passed">Whether the check passed.</param>
+  public void MonolithicSummary(int nodes, long total, bool passed)
+  {
+    Write("summary", new Dictionary<string, object?> {{"n", nodes}, {"total", total}, {"passed", passed}});
+  }
+
+  public void Error(string message)
+  {
+    Write("error", new Dictionary<string, object?> {{"message", message}});
+  }
+}
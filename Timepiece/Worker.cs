@@ -0,0 +1,60 @@
+#nullable enable
+using System;
+using System.Diagnostics;
+using System.Threading.Tasks;
+using Newtonsoft.Json;
+using Newtonsoft.Json.Linq;
+
+namespace Timepiece;
+
+/// <summary>
+///   A long-lived worker serving benchmark jobs read from standard input.
+///   Each job is a line of JSON of the form <c>{"id": 0, "args": ["-k", "8", "reach"]}</c>,
+///   whose arguments are run exactly as if they were given on the command line.
+///   Once a job finishes, the worker writes a line starting with <see cref="DoneMarker" />
+///   and followed by a JSON object reporting the job's id, its status and exit code (if it returned one)
+///   and whether the job ran warm (i.e. after an earlier job in this process paid for JIT compilation and loading).
+///   The worker exits when standard input is closed.
+/// </summary>
+public static class Worker
+{
+  /// <summary>
+  ///   Prefix of the line reporting that a job has finished.
+  /// </summary>
+  public const string DoneMarker = "##timepiece-worker";
+
+  /// <summary>
+  ///   Serve jobs from standard input until it is closed.
+  /// </summary>
+  /// <param name="runJob">Run a job with the given arguments and return its exit code.</param>
+  public static async Task Serve(Func<string[], Task<int>> runJob)
+  {
+    var jobs = 0;
+    while (await Console.In.ReadLineAsync() is { } line)
+    {
+      if (string.IsNullOrWhiteSpace(line)) continue;
+      JToken? id = null;
+      string status;
+      int? code = null;
+      var timer = Stopwatch.StartNew();
+      try
+      {
+        var job = JObject.Parse(line);
+        id = job["id"];
+        var args = job["args"]?.ToObject<string[]>() ?? Array.Empty<string>();
+        code = await runJob(args);
+        status = code == 0 ? "done" : "error";
+      }
+      catch (Exception e)
+      {
+        Console.WriteLine($"Error, worker job failed: {e.Message}");
+        status = "error";
+      }
+
+      Console.WriteLine(
+        $"{DoneMarker} {JsonConvert.SerializeObject(new {id, status, code, warm = jobs > 0, ms = timer.ElapsedMilliseconds})}");
+      Console.Out.Flush();
+      jobs++;
+    }
+  }
+}
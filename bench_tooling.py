@@ -0,0 +1,621 @@
+#!/usr/bin/env python3
+# Benchmark the Python tooling on synthetic data, to catch throughput regressions before they cost campaign time.
+# Writes a corpus of fat-tree benchmark logs (in the format of run_all.py and in the line-by-line format
+# of paper-results), a stream of the events of the same runs (as Timepiece writes with --stats-file), Juniper configs with participant policies (as find_participants.py reads them)
+# and .dat files (as plot.py reads them), then times the functions that read them,
+# reporting the throughput and peak memory use of each.
+# With --baseline, compares against the results of an earlier run (written with --output)
+# and exits with status 1 if any has regressed.
+# Usage: bench_tooling.py [--output results.json] [--baseline results.json]
+# Run with --help for more options.
+
+import argparse
+import datetime
+import io
+import json
+import pathlib
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Optional
+
+import matplotlib
+
+# plots are only saved, never shown
+matplotlib.use("Agg")
+
+import find_participants
+import make_dat
+import plot
+import results_db
+import run_all
+import stats_stream
+
+# the default sizes of fat-tree logs
+DEFAULT_SIZES = list(range(4, 44, 4))
+# the processor count written into logs, as on the machine paper-results were run on
+PROCESSORS = 48
+# the fat-tree roles of nodes, in the order Timepiece numbers them
+ROLES = ["core", "aggregation", "edge"]
+# the relative change in throughput (or memory growth) under which results count as the same
+DEFAULT_TOLERANCE = 0.2
+# memory growth changes by at least this much (in kB) before it counts as a regression,
+# as small allocations come and go with the allocator
+MEMORY_SLACK = 16 * 1024
+# the options that decide the corpus, which must match for results to be compared
+CORPUS_OPTIONS = ["size", "trials", "node_times", "configs", "neighbors", "participants", "prefixes", "dats", "seed"]
+
+
+def fattree_node_names(size: int) -> list[str]:
+    """Return the names of the nodes of a fat-tree with the given number of pods, in the order they are numbered."""
+    cores = (size // 2) ** 2
+    aggregations = size * size // 2
+    names = []
+    for i in range(make_dat.fattree_nodes(size)):
+        role = ROLES[0] if i < cores else ROLES[1] if i < cores + aggregations else ROLES[2]
+        names.append("{}-{}".format(role, i))
+    return names
+
+
+def trial_times(rng: random.Random, size: int) -> dict[str, int]:
+    """Return made-up check times (in ms) of the nodes of a fat-tree, growing with its size as real ones do."""
+    scale = 50 * size
+    return {node: max(1, int(rng.lognormvariate(0, 0.5) * scale)) for node in fattree_node_names(size)}
+
+
+def summary(times: dict[str, int]) -> dict[str, float]:
+    """Return the table row Timepiece prints for the given node times (see Timepiece/Statistics.cs)."""
+    ordered = sorted(times.values())
+    total = sum(ordered)
+    return {
+        "n": len(ordered),
+        "max": ordered[-1],
+        "min": ordered[0],
+        "avg": total / len(ordered),
+        "med": ordered[len(ordered) // 2],
+        "99p": ordered[int(len(ordered) * 0.99)],
+        "total": total,
+        "wall": max(ordered[-1], total // PROCESSORS),
+    }
+
+
+def format_value(value: float) -> str:
+    return str(value) if isinstance(value, float) else str(int(value))
+
+
+def write_trial(log, rng: random.Random, size: int, lines: bool, node_times: bool):
+    """Write Timepiece's output for a modular trial of a benchmark of the given size, in the given format."""
+    log.write("k={}\n".format(size))
+    log.write("Environment.ProcessorCount: {}\n".format(PROCESSORS))
+    times = trial_times(rng, size)
+    row = summary(times)
+    slowest = max(times, key=times.get)
+    fastest = min(times, key=times.get)
+    log.write("    All the modular checks passed!\n")
+    log.write("Modular verification took {}ms\n".format(row["wall"]))
+    if lines:
+        # as in the logs of paper-results
+        log.write("Check statistics:\n")
+        log.write("Maximum check time: node {} in {}ms\n".format(slowest, row["max"]))
+        log.write("Minimum check time: node {} in {}ms\n".format(fastest, row["min"]))
+        log.write("Average check time: {}ms\n".format(row["avg"]))
+        log.write("Median check time: node {} in {}ms\n".format(fastest, row["med"]))
+        log.write("99th percentile check time: node {} in {}ms\n".format(slowest, row["99p"]))
+        log.write("Total check time: {}ms\n".format(row["total"]))
+        return
+    log.write("Statistics:\n")
+    log.write("Maximum time: {} in {}ms\n".format(slowest, row["max"]))
+    log.write("Minimum time: {} in {}ms\n".format(fastest, row["min"]))
+    log.write("Average time: {}ms\n".format(row["avg"]))
+    log.write("Median time: {} in {}ms\n".format(fastest, row["med"]))
+    log.write("99th percentile time: {} in {}ms\n".format(slowest, row["99p"]))
+    log.write("Total time: {}ms\n".format(row["total"]))
+    if node_times:
+        for node, ms in times.items():
+            log.write("{} took {}ms\n".format(node, ms))
+    log.write("{}\n{}\n".format(run_all.MOD_HEADER, "\t".join(format_value(row[h]) for h in row)))
+
+
+def write_log(
+    path: pathlib.Path,
+    sizes: list[int],
+    trials: int,
+    lines=False,
+    node_times=False,
+    seed=0,
+):
+    """
+    Write a log of the trials of a fat-tree benchmark of each given size, as run_all.py writes them,
+    with Timepiece's statistics printed as a table (and with `node_times`, the time of each node)
+    or, if `lines` is set, line by line as in the logs of paper-results.
+    """
+    rng = random.Random(seed)
+    started = datetime.datetime(2022, 10, 19, tzinfo=datetime.timezone.utc)
+    with open(path, "w") as log:
+        for size in sizes:
+            log.write(run_all.benchmark_output(size, ["r"]) + "\n")
+            for trial in range(trials):
+                started += datetime.timedelta(seconds=1)
+                log.write("Trial {} of {} started {}\n".format(trial, trials, started))
+                write_trial(log, rng, size, lines, node_times)
+                log.write("\n")
+
+
+def write_events(path: pathlib.Path, sizes: list[int], trials: int, seed=0):
+    """
+    Write the event stream of the modular trials of a fat-tree benchmark of each given size,
+    as Timepiece writes it with --stats-file (see stats_stream.py): a run event,
+    the start and finish of each node's check, and a summary.
+    """
+    rng = random.Random(seed)
+    with open(path, "w") as stream:
+        for size in sizes:
+            for _ in range(trials):
+                times = trial_times(rng, size)
+                ms = 0
+                events = [{"event": "run", "version": 1, "mode": "modular", "nodes": len(times), "size": size}]
+                for node, duration in times.items():
+                    events.append({"event": "start", "node": node})
+                    events.append({"event": "finish", "node": node, "duration": duration, "counterexample": False})
+                events.append(dict(summary(times), event="summary", passed=True, failed=[]))
+                for event in events:
+                    ms += 1
+                    stream.write(json.dumps(dict(event, ms=ms)) + "\n")
+
+
+def write_config(path: pathlib.Path, rng: random.Random, index: int, neighbors: int, participants: int, prefixes: int):
+    """
+    Write a Juniper config with the given numbers of neighbors and of participant policies (each filtering on
+    a prefix list of the given number of prefixes, half of them exactly), as find_participants.py reads them.
+    Each neighbor imports one of the participant policies (or, for every fourth neighbor, none)
+    and a policy without a participant term; every tenth neighbor is inactive.
+    """
+    policies = ["R{}P{}-IN".format(index, p) for p in range(participants)]
+    with open(path, "w") as config:
+        config.write("policy-options {\n")
+        for policy in policies:
+            config.write("    prefix-list {} {{\n".format(find_participants.prefix_list_name(policy)))
+            for _ in range(prefixes):
+                config.write("        10.{}.{}.0/24;\n".format(rng.randrange(256), rng.randrange(256)))
+            config.write("    }\n")
+        for p, policy in enumerate(policies):
+            config.write("    policy-statement {} {{\n".format(policy))
+            config.write("        term participant {\n            from {\n")
+            config.write(
+                "                prefix-list-filter {} {};\n".format(
+                    find_participants.prefix_list_name(policy), "exact" if p % 2 == 0 else "orlonger"
+                )
+            )
+            config.write("            }\n            then next policy;\n        }\n")
+            config.write("        term reject {\n            then reject;\n        }\n    }\n")
+        config.write("    policy-statement SANITY-IN {\n        term martians {\n            then reject;\n")
+        config.write("        }\n    }\n}\n")
+        config.write("protocols {\n    bgp {\n        group PEERS {\n")
+        for n in range(neighbors):
+            address = "192.{}.{}.{}".format(index % 256, n // 256 % 256, n % 256)
+            config.write("            {}neighbor {} {{\n".format("inactive: " if n % 10 == 9 else "", address))
+            config.write('                description "neighbor {}";\n'.format(n))
+            imports = ["SANITY-IN"] if n % 4 == 3 or not policies else [rng.choice(policies), "SANITY-IN"]
+            config.write("                import [ {} ];\n".format(" ".join(imports)))
+            config.write("                peer-as {};\n".format(64512 + n))
+            config.write("            }\n")
+        config.write("        }\n    }\n}\n")
+
+
+def write_configs(directory: pathlib.Path, configs: int, neighbors: int, participants: int, prefixes: int, seed=0):
+    """Write the given number of Juniper configs (see `write_config`) to the directory as .cfg files."""
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    for index in range(configs):
+        write_config(directory.joinpath("router{}.cfg".format(index)), rng, index, neighbors, participants, prefixes)
+
+
+def write_dats(directory: pathlib.Path, benchmarks: int, sizes: list[int], seed=0):
+    """
+    Write the modular and monolithic .dat files of the given number of benchmarks to the directory,
+    with a row for each given size, as make_dat.py writes them.
+    """
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    for b in range(benchmarks):
+        modular_rows, mono_rows = [], []
+        for size in sizes:
+            row = summary(trial_times(rng, size))
+            modular_rows.append(row)
+            mono_rows.append({"n": row["n"], "total": row["total"] * size})
+        for name, rows, headers in [
+            ("bench{}.dat".format(b), modular_rows, make_dat.MOD_HEADERS),
+            ("bench{}-m.dat".format(b), mono_rows, make_dat.MONO_HEADERS),
+        ]:
+            with open(directory.joinpath(name), "w") as dat:
+                make_dat.write_dat(rows, list(headers), dat)
+
+
+def mib_of(*paths: pathlib.Path) -> float:
+    """Return the total size of the given files in MiB."""
+    return sum(path.stat().st_size for path in paths) / (1 << 20)
+
+
+class Corpus:
+    """The synthetic inputs of the benchmarks, written to subdirectories of the given directory."""
+
+    def __init__(self, directory: pathlib.Path):
+        self.directory = directory
+        self.logs = directory.joinpath("logs")
+        self.configs = directory.joinpath("configs")
+        self.dats = directory.joinpath("dats")
+        self.table_log = self.logs.joinpath("table.txt")
+        self.lines_log = self.logs.joinpath("lines.txt")
+        self.events = self.logs.joinpath("events.jsonl")
+
+    def write(self, args):
+        self.logs.mkdir(parents=True, exist_ok=True)
+        write_log(self.table_log, args.size, args.trials, node_times=args.node_times, seed=args.seed)
+        write_log(self.lines_log, args.size, args.trials, lines=True, seed=args.seed)
+        write_events(self.events, args.size, args.trials, seed=args.seed)
+        write_configs(self.configs, args.configs, args.neighbors, args.participants, args.prefixes, seed=args.seed)
+        write_dats(self.dats, args.dats, args.size, seed=args.seed)
+
+    def config_files(self) -> list[pathlib.Path]:
+        return sorted(self.configs.glob("*.cfg"))
+
+    def describe(self) -> str:
+        return (
+            "logs: {:.1f} MiB (table) and {:.1f} MiB (lines); events: {:.1f} MiB; "
+            "{} configs: {:.1f} MiB; {} .dat files"
+        ).format(
+            mib_of(self.table_log),
+            mib_of(self.lines_log),
+            mib_of(self.events),
+            len(self.config_files()),
+            mib_of(*self.config_files()),
+            sum(1 for _ in self.dats.glob("*.dat")),
+        )
+
+
+def peak_rss() -> Optional[int]:
+    """Return the peak resident set size of this process in kB, or None if /proc cannot be read."""
+    try:
+        return run_all.proc_status("/proc/self/status")["VmHWM"]
+    except (OSError, KeyError):
+        return None
+
+
+def reset_peak_rss():
+    """Reset the peak resident set size of this process to its current size, where Linux allows it."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+class Case:
+    """
+    A benchmark: a function timed on the corpus, and the amount of work each call does
+    (e.g. bytes read or rows summarized) in the given unit, from which its throughput is found.
+    """
+
+    def __init__(self, name: str, unit: str, work: Callable[[Corpus], float], fn: Callable[[Corpus], object]):
+        self.name = name
+        self.unit = unit
+        self.work = work
+        self.fn = fn
+
+    def run(self, corpus: Corpus, repeat: int) -> dict:
+        """
+        Call the function `repeat` times, returning the best and median time of a call,
+        the throughput of the best call, the peak memory use of this process while calling it
+        and how much that peak exceeds its memory use before the first call (its growth), in kB.
+        """
+        work = self.work(corpus)
+        reset_peak_rss()
+        base_rss = peak_rss()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            self.fn(corpus)
+            times.append(time.perf_counter() - start)
+        best = min(times)
+        return {
+            "unit": self.unit,
+            "work": work,
+            "best": best,
+            "median": statistics.median(times),
+            "throughput": work / best if best > 0 else float("inf"),
+            "peak_rss": peak_rss(),
+            "growth": None if base_rss is None else peak_rss() - base_rss,
+        }
+
+
+def stream_log(corpus: Corpus):
+    """Parse the table log's rows and node times as run_all.py does while a run's output streams in."""
+    output = run_all.OutputStream(None, run_all.MOD_HEADER, echo=False, node_times=results_db.NodeTimes())
+    with open(corpus.table_log, "rb") as log:
+        output.pump(log)
+    output.close()
+
+
+def follow_events(corpus: Corpus):
+    """
+    Follow the event stream as run_all.py does while a run writes it: the stream is copied into the file
+    the follower created, as Timepiece would write it, and read as the follower does once the run exits.
+    """
+    events = stats_stream.EventFollower(results_db.NodeTimes())
+    shutil.copyfile(corpus.events, events.path)
+    events.stop()
+    events.rows()
+
+
+def min_rows(corpus: Corpus):
+    """Tabulate the table log's rows by size, as make_dat.py does."""
+    make_dat.min_rows_by_key(make_dat.log_rows(corpus.table_log)["modular"], make_dat.MOD_HEADERS, "n", "total")
+
+
+def scan_configs(corpus: Corpus, jobs: int):
+    """Find the participant prefix list of each neighbor of the configs, as find_participants.py does."""
+    scans = find_participants.scan_configs(corpus.config_files(), {}, jobs)
+    for scan in scans.values():
+        find_participants.neighbor_participants_of(scan)
+
+
+def plot_dats(corpus: Corpus):
+    """Plot each benchmark of the .dat files to a multi-page PDF in memory, as plot.py does."""
+    # read the files again each time, rather than from plot.py's cache
+    plot._read_dat.cache_clear()
+    tables = plot.load_benchmarks(plot.find_benchmarks([str(corpus.dats)]))
+    plot.save_pages(tables, io.BytesIO())
+
+
+def cases(jobs: int) -> list[Case]:
+    return [
+        Case(
+            "OutputStream",
+            "MiB",
+            lambda corpus: mib_of(corpus.table_log),
+            stream_log,
+        ),
+        Case(
+            "EventFollower",
+            "MiB",
+            lambda corpus: mib_of(corpus.events),
+            follow_events,
+        ),
+        Case(
+            "log_rows[table]",
+            "MiB",
+            lambda corpus: mib_of(corpus.table_log),
+            lambda corpus: make_dat.log_rows(corpus.table_log),
+        ),
+        Case(
+            "log_rows[lines]",
+            "MiB",
+            lambda corpus: mib_of(corpus.lines_log),
+            lambda corpus: make_dat.log_rows(corpus.lines_log),
+        ),
+        Case(
+            "log_rows+min_rows_by_key",
+            "MiB",
+            lambda corpus: mib_of(corpus.table_log),
+            min_rows,
+        ),
+        Case(
+            "scan_configs",
+            "MiB",
+            lambda corpus: mib_of(*corpus.config_files()),
+            lambda corpus: scan_configs(corpus, jobs),
+        ),
+        Case(
+            "plot_modular_vs_mono",
+            "plots",
+            lambda corpus: len(plot.find_benchmarks([str(corpus.dats)])),
+            plot_dats,
+        ),
+    ]
+
+
+def print_results(results: dict[str, dict]):
+    def mib(kb):
+        return "unknown" if kb is None else "{:.1f}".format(kb / 1024)
+
+    print("case\tbest (s)\tmedian (s)\tthroughput\tpeak RSS (MiB)\tgrowth (MiB)")
+    for name, result in results.items():
+        print(
+            "{}\t{:.3f}\t{:.3f}\t{:.1f} {}/s\t{}\t{}".format(
+                name,
+                result["best"],
+                result["median"],
+                result["throughput"],
+                result["unit"],
+                mib(result["peak_rss"]),
+                mib(result["growth"]),
+            )
+        )
+
+
+def regressions(baseline: dict[str, dict], results: dict[str, dict], tolerance: float) -> list[str]:
+    """
+    Return a description of each case whose throughput fell (or whose memory growth rose)
+    by more than `tolerance` relative to the baseline.
+    """
+    found = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            found.append(
+                "{}: throughput fell from {:.1f} to {:.1f} {}/s".format(
+                    name, before["throughput"], result["throughput"], result["unit"]
+                )
+            )
+        if (
+            result["growth"] is not None
+            and before.get("growth") is not None
+            and result["growth"] > before["growth"] * (1 + tolerance)
+            and result["growth"] - before["growth"] > MEMORY_SLACK
+        ):
+            found.append(
+                "{}: memory growth rose from {:.1f} to {:.1f} MiB".format(
+                    name, before["growth"] / 1024, result["growth"] / 1024
+                )
+            )
+    return found
+
+
+def parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Python tooling (run_all.py, make_dat.py, find_participants.py and plot.py) "
+        "on synthetic logs, configs and .dat files, reporting the throughput and peak memory use of each"
+    )
+    parser.add_argument(
+        "--dir",
+        type=pathlib.Path,
+        help="Write the corpus to this directory and keep it (default: a temporary directory)",
+    )
+    parser.add_argument(
+        "--generate-only",
+        action="store_true",
+        help="Only write the corpus (to --dir), without benchmarking",
+    )
+    parser.add_argument(
+        "--size",
+        "-k",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="The fat-tree sizes of the logs and .dat files (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--trials",
+        "-n",
+        type=int,
+        default=10,
+        help="The number of trials of each size in the logs (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-node-times",
+        dest="node_times",
+        action="store_false",
+        help="Leave the time of each node (as printed with --node-times) out of the table log",
+    )
+    parser.add_argument(
+        "--configs",
+        type=int,
+        default=200,
+        help="The number of Juniper configs (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--neighbors",
+        type=int,
+        default=50,
+        help="The number of neighbors of each config (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--participants",
+        type=int,
+        default=20,
+        help="The number of participant policies of each config (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--prefixes",
+        type=int,
+        default=20,
+        help="The number of prefixes of each participant prefix list (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--dats",
+        type=int,
+        default=10,
+        help="The number of benchmarks to write modular and monolithic .dat files of (default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the corpus (default: %(default)s)")
+    parser.add_argument(
+        "--repeat",
+        "-r",
+        type=int,
+        default=3,
+        help="Time each benchmark this many times, reporting the best (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Scan the configs with this many processes, whose memory is not counted (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        metavar="CASE",
+        help="Only run these benchmarks (default: all of {})".format(", ".join(case.name for case in cases(1))),
+    )
+    parser.add_argument("--output", "-o", type=pathlib.Path, help="Write the results to this JSON file")
+    parser.add_argument(
+        "--baseline",
+        "-b",
+        type=pathlib.Path,
+        help="Compare the results against those of an earlier run written with --output, "
+        "exiting with status 1 if any has regressed",
+    )
+    parser.add_argument(
+        "--tolerance",
+        "-t",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="With --baseline, the relative change under which results count as the same (default: %(default)s)",
+    )
+    args = parser.parse_args()
+    if args.generate_only and args.dir is None:
+        parser.error("--generate-only requires --dir")
+    if min(args.size) < 2 or any(size % 2 for size in args.size):
+        parser.error("--size must be even and at least 2")
+    if min(args.trials, args.configs, args.dats, args.repeat, args.jobs) < 1:
+        parser.error("--trials, --configs, --dats, --repeat and --jobs must be at least 1")
+    if args.only is not None:
+        unknown = set(args.only) - {case.name for case in cases(1)}
+        if unknown:
+            parser.error("unknown benchmarks: {}".format(", ".join(sorted(unknown))))
+    return args
+
+
+if __name__ == "__main__":
+    args = parser()
+    baseline = None
+    if args.baseline is not None:
+        if not args.baseline.exists():
+            print("Could not find {}, exiting...".format(args.baseline))
+            sys.exit(2)
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        differ = [option for option in CORPUS_OPTIONS if baseline["corpus"].get(option) != getattr(args, option)]
+        if differ:
+            print("Warning: the baseline's corpus was written with different {}".format(", ".join(differ)))
+        baseline = baseline["results"]
+    with tempfile.TemporaryDirectory(prefix="bench-tooling-") as temp:
+        corpus = Corpus(args.dir or pathlib.Path(temp))
+        start = time.perf_counter()
+        corpus.write(args)
+        print("Wrote the corpus to {} in {:.1f}s".format(corpus.directory, time.perf_counter() - start))
+        print(corpus.describe())
+        if args.generate_only:
+            sys.exit(0)
+        results = {}
+        for case in cases(args.jobs):
+            if args.only is None or case.name in args.only:
+                results[case.name] = case.run(corpus, args.repeat)
+    print_results(results)
+    if args.output is not None:
+        corpus_args = {name: value for name, value in vars(args).items() if not isinstance(value, pathlib.Path)}
+        with open(args.output, "w") as f:
+            json.dump({"corpus": corpus_args, "results": results}, f, indent=2)
+    if baseline is not None:
+        found = regressions(baseline, results, args.tolerance)
+        for regression in found:
+            print("Regression: " + regression)
+        if not found:
+            print("No regressions against {}".format(args.baseline))
+        sys.exit(1 if found else 0)
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# Compare two sets of benchmark results to find performance regressions.
+# Usage: compare.py [baseline] [current]
+# Each result set is a .dat file, a log file, a results database or a directory of .dat (or with --logs, log) files.
+# Exits with status 1 if any regression is found.
+# Run with --help for more options.
+
+import argparse
+import math
+import pathlib
+import re
+import statistics
+import sys
+
+import make_dat
+import results_db
+import stats
+
+# the time written into the paper-results .dat files for benchmarks that timed out (two hours, in ms)
+LEGACY_TIMEOUT = 7200000
+
+# the names each benchmark goes by (see BenchmarkTypeExtensions.Parse in Timepiece.Benchmarks/Benchmark.cs),
+# so that results of the same benchmark run under different names can be aligned
+BENCHMARK_NAMES = [
+    ("SpReachable", "r", "reach"),
+    ("SpReachableSymbolic", "rs", "reachSymbolic"),
+    ("SpPathLength", "l", "length"),
+    ("SpPathLengthSymbolic", "ls", "lengthSymbolic"),
+    ("ApReachable", "ar", "allReach"),
+    ("ApReachableSymbolic", "ars", "allReachSymbolic"),
+    ("ApPathLength", "al", "allLength"),
+    ("ApPathLengthSymbolic", "als", "allLengthSymbolic"),
+    ("ValleyFree", "v", "valley"),
+    ("ValleyFreeSymbolic", "vs", "valleySymbolic"),
+    ("ValleyFreeLength", "vl", "valleyLength"),
+    ("ApValleyFree", "av", "allValley"),
+    ("ApValleyFreeSymbolic", "avs", "allValleySymbolic"),
+    ("FatTreeHijack", "h", "hijack"),
+    ("FatTreeHijackSymbolic", "hs", "hijackSymbolic"),
+    ("ApFatTreeHijack", "ah", "allHijack"),
+    ("ApFatTreeHijackSymbolic", "ahs", "allHijackSymbolic"),
+]
+ALIASES = {name: names[0] for names in BENCHMARK_NAMES for name in names}
+
+
+def canonical_policy(policy: str, aliases: dict[str, str]) -> str:
+    """Return the name results of the given policy are aligned under."""
+    policy = aliases.get(policy, policy)
+    return ALIASES.get(policy, policy)
+
+
+def policy_from_file_name(path: pathlib.Path) -> str:
+    """
+    Return the policy a .dat file is named after: run_all.py names them after their options (e.g. r-m.dat),
+    and paper-results after the policy and a date (e.g. r-2022-10-20.dat).
+    """
+    stem = re.sub(r"-\d{4}-\d{2}-\d{2}$", "", path.stem)
+    if stem.endswith("-m"):
+        stem = stem[: -len("-m")]
+    return stem
+
+
+class ResultSet:
+    """
+    Measurements of benchmarks keyed by (policy, mode, number of nodes),
+    with the values of each metric in each trial and the timeouts (in ms) of trials that timed out.
+    """
+
+    def __init__(self, aliases=None):
+        self.aliases = aliases or {}
+        self.values: dict[tuple[str, str, int], dict[str, list[float]]] = {}
+        self.timeouts: dict[tuple[str, str, int], list[float]] = {}
+
+    def key(self, policy: str, mode: str, n) -> tuple[str, str, int]:
+        return canonical_policy(policy, self.aliases), mode, int(n)
+
+    def add(self, policy: str, mode: str, row: dict[str, float]):
+        """Add a trial's table row."""
+        metrics = self.values.setdefault(self.key(policy, mode, row["n"]), {})
+        for metric, value in row.items():
+            if metric != "n" and not math.isnan(value):
+                metrics.setdefault(metric, []).append(value)
+
+    def add_timeout(self, policy: str, mode: str, n, ms: float):
+        """Add a trial that timed out after the given time."""
+        self.timeouts.setdefault(self.key(policy, mode, n), []).append(ms)
+
+    def keys(self) -> set[tuple[str, str, int]]:
+        return set(self.values) | set(self.timeouts)
+
+    def load(self, path: pathlib.Path, logs=False):
+        """Load a .dat file, log file or results database, or the .dat (or with `logs`, .txt) files of a directory."""
+        if path.is_dir():
+            for file in sorted(path.glob("*.txt" if logs else "*.dat")):
+                self.load(file)
+        elif path.suffix == ".db":
+            self.load_db(path)
+        elif path.suffix == ".dat":
+            self.load_dat(path)
+        else:
+            self.load_log(path)
+
+    def load_dat(self, path: pathlib.Path):
+        """
+        Load a .dat file: either one written by run_all.py or make_dat.py (with an n column),
+        or one of the paper-results (with columns k, tk, med, 99 and ms, and timeouts written as LEGACY_TIMEOUT).
+        """
+        policy = policy_from_file_name(path)
+        with open(path) as f:
+            lines = [line.split() for line in f if line.strip()]
+        if not lines:
+            return
+        headers, rows = lines[0], [dict(zip(lines[0], map(float, line))) for line in lines[1:]]
+        if headers[0] == "k":
+            for row in rows:
+                n = make_dat.fattree_nodes(int(row["k"]))
+                if row["tk"] >= LEGACY_TIMEOUT:
+                    self.add_timeout(policy, "modular", n, row["tk"])
+                else:
+                    self.add(policy, "modular", {"n": n, "wall": row["tk"], "med": row["med"], "99p": row["99"]})
+                if row["ms"] >= LEGACY_TIMEOUT:
+                    self.add_timeout(policy, "mono", n, row["ms"])
+                else:
+                    self.add(policy, "mono", {"n": n, "total": row["ms"]})
+            return
+        mode = "modular" if "wall" in headers else "mono"
+        known = ALIASES.keys() | self.aliases.keys()
+        if mode == "mono" and policy not in known and policy[:-1] in known:
+            # named after a monolithic log of paper-results (e.g. rm-2022-10-20.txt)
+            policy = policy[:-1]
+        for row in rows:
+            # predicted times are not measurements
+            if row.get("extrapolated", 0) != 1:
+                self.add(policy, mode, {h: row[h] for h in headers if h in results_db.COLUMNS})
+
+    def load_log(self, path: pathlib.Path):
+        """
+        Load the trials of a log written by run_all.py (see make_dat.scan_log),
+        whether Timepiece printed its statistics as tables or line by line (as in paper-results).
+        """
+        for trial in make_dat.scan_log(path):
+            if trial.options is None:
+                # not written by run_all.py, so the policy is unknown
+                continue
+            policy, mode = results_db.policy_and_mode(trial.options)
+            if trial.row:
+                self.add(policy, trial.mode or mode, trial.row)
+            elif trial.size is not None:
+                self.add_timeout(policy, mode, make_dat.fattree_nodes(trial.size), trial.timeout)
+
+    def load_db(self, path: pathlib.Path):
+        """Load every run recorded in a results database."""
+        conn = results_db.connect(path)
+        for mode in ["modular", "mono"]:
+            for policy in results_db.policies(conn, mode):
+                for row in results_db.query_rows(conn, policy, mode):
+                    self.add(policy, mode, row)
+
+
+def compare(
+    baseline: ResultSet, current: ResultSet, metric: str, threshold: float, alpha: float
+) -> list[tuple[tuple[str, str, int], str, str, str, str, str, bool]]:
+    """
+    Compare the mean of the metric (the total time for monolithic benchmarks) for each key of both result sets.
+    A key is slower (or faster) if the current mean is over (under) `1 + threshold` times (1 / that of) the baseline's,
+    and the difference is significant at level `alpha` by Welch's t-test; with a single trial on either side
+    it cannot be tested, so any such slowdown counts.
+    A benchmark that now times out where it did not before (within the current timeout) is also slower.
+    Return, for each key, the formatted baseline and current means, change, p-value and verdict,
+    and whether it is a regression.
+    """
+    comparisons = []
+    for key in sorted(baseline.keys() & current.keys()):
+        _, mode, _ = key
+        key_metric = "total" if mode == "mono" else metric
+        base = baseline.values.get(key, {}).get(key_metric, [])
+        cur = current.values.get(key, {}).get(key_metric, [])
+        base_timeout = max(baseline.timeouts.get(key, []), default=None)
+        cur_timeout = max(current.timeouts.get(key, []), default=None)
+
+        def describe(values, timeout):
+            if values:
+                return "{:.0f}".format(statistics.mean(values))
+            return "timeout ({:.0f})".format(timeout)
+
+        if not base and not cur:
+            if base_timeout is None or cur_timeout is None:
+                # the metric is not recorded on one side
+                continue
+            comparisons.append((key, describe(base, base_timeout), describe(cur, cur_timeout), "", "", "both timed out", False))
+            continue
+        if not base or not cur:
+            if not base and base_timeout is None or not cur and cur_timeout is None:
+                continue
+            if cur:
+                # the baseline timed out
+                faster = statistics.mean(cur) < base_timeout
+                verdict, regression = ("faster (baseline timed out)" if faster else "same (baseline timed out)"), False
+            else:
+                # slower, unless the baseline already took longer than the current timeout
+                regression = statistics.mean(base) * (1 + threshold) < cur_timeout
+                verdict = "REGRESSION (timed out)" if regression else "inconclusive (timed out)"
+            comparisons.append((key, describe(base, base_timeout), describe(cur, cur_timeout), "", "", verdict, regression))
+            continue
+        ratio = statistics.mean(cur) / statistics.mean(base) if statistics.mean(base) > 0 else math.inf
+        p = stats.welch_t_test(base, cur)
+        significant = math.isnan(p) or p < alpha
+        regression = False
+        if ratio > 1 + threshold:
+            regression = significant
+            verdict = "REGRESSION" if significant else "slower (not significant)"
+        elif ratio < 1 / (1 + threshold):
+            verdict = "faster" if significant else "faster (not significant)"
+        else:
+            verdict = "same"
+        if math.isnan(p) and verdict != "same":
+            verdict += " (untested)"
+        comparisons.append(
+            (
+                key,
+                describe(base, None),
+                describe(cur, None),
+                "{:+.1%}".format(ratio - 1),
+                "" if math.isnan(p) else "{:.3g}".format(p),
+                verdict,
+                regression,
+            )
+        )
+    return comparisons
+
+
+def print_comparisons(comparisons, metric: str):
+    """Print the comparisons as a table."""
+    headers = ("policy", "mode", "n", "baseline", "current", "change", "p", "verdict")
+    table = [headers] + [
+        (policy, mode, str(n), base, cur, change, p, verdict)
+        for (policy, mode, n), base, cur, change, p, verdict, _ in comparisons
+    ]
+    widths = [max(len(row[i]) for row in table) for i in range(len(headers))]
+    print("Comparing mean {} (modular) and total (mono) times in ms".format(metric))
+    for row in table:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+
+def parser():
+    parser = argparse.ArgumentParser(
+        description="Compare benchmark results against a baseline (e.g. paper-results), "
+        "reporting the change of each benchmark at each size and exiting with status 1 if any has regressed "
+        "(or 2 if the result sets have nothing in common)"
+    )
+    parser.add_argument(
+        "baseline",
+        type=pathlib.Path,
+        help="The baseline results: a .dat file, log file, results database (.db) or directory of .dat files",
+    )
+    parser.add_argument(
+        "current", type=pathlib.Path, help="The current results, in any of the same forms"
+    )
+    parser.add_argument(
+        "--logs",
+        "-l",
+        nargs="?",
+        const="both",
+        choices=["baseline", "current", "both"],
+        help="Read the log (.txt) files of the baseline's, current results' or both directories "
+        "instead of their .dat files (default if given: %(const)s)",
+    )
+    parser.add_argument(
+        "--metric",
+        "-m",
+        choices=["wall", "med", "99p", "max", "min", "avg", "total"],
+        default="wall",
+        help="The time to compare for modular benchmarks; monolithic benchmarks are compared by total time "
+        "(paper-results only have wall, med and 99p; default: %(default)s)",
+    )
+    parser.add_argument(
+        "--threshold",
+        "-t",
+        type=float,
+        default=0.1,
+        help="The relative change under which times count as the same (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.05,
+        help="The significance level of changes, for sizes with multiple trials on both sides (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--alias",
+        action="append",
+        default=[],
+        metavar="OLD=NEW",
+        help="Compare results of the policy OLD as results of NEW, e.g. lw=l for the paper's weak length benchmark "
+        "(may be repeated)",
+    )
+    args = parser.parse_args()
+    for alias in args.alias:
+        if "=" not in alias:
+            parser.error("--alias must be of the form OLD=NEW")
+    return args
+
+
+if __name__ == "__main__":
+    args = parser()
+    aliases = dict(alias.split("=", 1) for alias in args.alias)
+    result_sets = []
+    for side, path in [("baseline", args.baseline), ("current", args.current)]:
+        if not path.exists():
+            print("Could not find {}, exiting...".format(path))
+            sys.exit(2)
+        result_set = ResultSet(aliases)
+        result_set.load(path, args.logs in (side, "both"))
+        result_sets.append(result_set)
+    baseline, current = result_sets
+    comparisons = compare(baseline, current, args.metric, args.threshold, args.alpha)
+    if not comparisons:
+        print("The result sets have no benchmarks of the same policy, mode and size in common")
+        sys.exit(2)
+    print_comparisons(comparisons, args.metric)
+    # only count sizes of benchmarks the current results have at least one size of
+    benchmarks = {(policy, mode) for policy, mode, _ in current.keys()}
+    missing = [key for key in baseline.keys() - current.keys() if key[:2] in benchmarks]
+    if missing:
+        print(
+            "{} benchmark sizes of the baseline are missing from the current results "
+            "(e.g. as they timed out or were not run)".format(len(missing))
+        )
+    regressions = sum(1 for comparison in comparisons if comparison[-1])
+    print("{} regressions in {} comparisons".format(regressions, len(comparisons)))
+    sys.exit(1 if regressions else 0)
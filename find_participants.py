@@ -6,94 +6,344 @@
 # and (b) which neighbors use those policies.
 # This all assumes that your configs are written such that their policy statements
 # contain an initial "participant" term.
+# Configs are scanned in parallel, line by line, and what is found in each is cached,
+# so that rerunning on a directory only scans the configs that changed.
+# Usage: find_participants.py [config directory]
+import argparse
+import concurrent.futures
+import hashlib
 import ipaddress
+import json
 import os
 import pathlib
 import re
+import struct
 import sys
 
-# multiline regex to find policies with participant terms
-HAS_PARTICIPANT_TERM = re.compile(
-    r"policy-statement (\w*-IN) \{\n\s*term participant", flags=re.MULTILINE
-)
+from make_dat import available_cpus
+
+# policy statement declaration regex: the policy has a participant term if its next non-blank line starts one
+POLICY_DECL = re.compile(r"policy-statement (\w*-IN) \{$")
+PARTICIPANT_TERM = "term participant"
 # neighbor declaration regex
 NEIGHBOR_DECL = re.compile(r"^(?:inactive: )?neighbor ([0-9a-f\.:]*)")
 IMPORT_POLICIES = re.compile(r"^import \[ (([\w-]* ?)*) \];")
+# exact prefix list filter regex
+EXACT_FILTER = re.compile(r"^prefix-list-filter (\S*) exact;$")
+# prefix list declaration regex, and the regex of each prefix in the list
+PREFIX_LIST_DECL = re.compile(r"^(?:inactive: )?prefix-list (\S+-PARTICIPANT) \{$")
+PREFIX_LIST_ENTRY = re.compile(r"^([0-9a-f\.:]+/\d+);$")
 
+# the version of the cache's format: bump it whenever what a scan finds changes
+CACHE_VERSION = 2
+# the format of index files (see write_index), as read by Timepiece.Angler's ParticipantIndex
+INDEX_MAGIC = b"TPPI"
+INDEX_VERSION = 1
+# bytes to read at a time when hashing a config
+HASH_CHUNK = 1 << 20
 
-def is_prefix_list_filter_exact(policy_name: str, lines: list[str]) -> bool:
-    """
-    Return if the prefix list filter is used in a policy where the filter is applied exactly or not.
-    """
-    prefix_list_name = policy_name.replace("-IN", "-PARTICIPANT")
-    search_term = f"prefix-list-filter {prefix_list_name} exact;"
-    return search_term in lines
+
+def prefix_list_name(policy_name: str) -> str:
+    """Return the name of the participant prefix list of the given policy."""
+    return policy_name.replace("-IN", "-PARTICIPANT")
 
 
-def get_neighbor_import_policies(config_lines: list[str]) -> dict[ipaddress.IPv4Address | ipaddress.IPv6Address, set[str]]:
-    """Return a dictionary mapping neighbors to sets of import policy names."""
+def scan_config(path: pathlib.Path) -> dict:
+    """
+    Scan a config in a single pass over its lines, returning the SHA-256 hash of its contents and what it contains:
+    the policies with participant terms, the prefix lists filtered exactly (anywhere in the config),
+    the import policies of each neighbor (in the order the neighbors are declared)
+    and the prefixes of each participant prefix list.
+    """
+    digest = hashlib.sha256()
+    participant_policies = []
+    exact_prefix_lists = set()
     neighbors_to_policies = {}
+    prefix_lists = {}
+    # the participant prefix list whose prefixes are being declared, if any
+    current_prefix_list = None
+    # the policy statement declared on the last non-blank line, if any
+    declared_policy = None
     # start with no neighbor
     current_neighbor = None
-    for line in config_lines:
-        # first see if the line identifies a neighbor
-        neighbor_match = NEIGHBOR_DECL.match(line)
-        if neighbor_match is not None:
-            # set the current neighbor to fill in
-            current_neighbor = ipaddress.ip_address(neighbor_match.group(1))
-            # continue to the next line
-            continue
-        # now see if the line identifies import policies
-        # we want to match only one import policy group after each neighbor
-        import_match = IMPORT_POLICIES.match(line)
-        if current_neighbor is not None and import_match is not None:
-            # get all the policies of the import
-            policies = set(import_match.group(1).split())
-            if current_neighbor not in neighbors_to_policies:
-                neighbors_to_policies[current_neighbor] = set()
-            neighbors_to_policies[current_neighbor].update(policies)
-            # reset current_neighbor
-            current_neighbor = None
+    with open(path, "rb") as config:
+        for raw_line in config:
+            digest.update(raw_line)
+            line = raw_line.decode(errors="replace").strip()
+            if not line:
+                continue
+            if current_prefix_list is not None:
+                entry_match = PREFIX_LIST_ENTRY.match(line)
+                if entry_match is not None:
+                    current_prefix_list.append(entry_match.group(1))
+                    continue
+                if line == "}":
+                    current_prefix_list = None
+                    continue
+            if declared_policy is not None and line.startswith(PARTICIPANT_TERM):
+                participant_policies.append(declared_policy)
+            declared_policy = None
+            policy_match = POLICY_DECL.search(line)
+            if policy_match is not None:
+                declared_policy = policy_match.group(1)
+                continue
+            prefix_list_match = PREFIX_LIST_DECL.match(line)
+            if prefix_list_match is not None:
+                current_prefix_list = prefix_lists.setdefault(prefix_list_match.group(1), [])
+                continue
+            filter_match = EXACT_FILTER.match(line)
+            if filter_match is not None:
+                exact_prefix_lists.add(filter_match.group(1))
+                continue
+            # first see if the line identifies a neighbor
+            neighbor_match = NEIGHBOR_DECL.match(line)
+            if neighbor_match is not None:
+                # set the current neighbor to fill in
+                current_neighbor = str(ipaddress.ip_address(neighbor_match.group(1)))
+                continue
+            # now see if the line identifies import policies
+            # we want to match only one import policy group after each neighbor
+            import_match = IMPORT_POLICIES.match(line)
+            if current_neighbor is not None and import_match is not None:
+                policies = neighbors_to_policies.setdefault(current_neighbor, [])
+                policies.extend(p for p in import_match.group(1).split() if p not in policies)
+                # reset current_neighbor
+                current_neighbor = None
+    return {
+        "sha256": digest.hexdigest(),
+        "participant_policies": participant_policies,
+        "exact_prefix_lists": sorted(exact_prefix_lists),
+        "neighbors": neighbors_to_policies,
+        "prefix_lists": prefix_lists,
+    }
+
+
+def file_hash(path: pathlib.Path) -> str:
+    """Return the SHA-256 hash of the file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scan_changed_config(path: pathlib.Path, cached_scan: dict | None) -> dict:
+    """
+    Scan the config, unless its contents still have the hash of the given cached scan
+    (e.g. the config was only touched or copied), in which case return the cached scan.
+    """
+    if cached_scan is not None and file_hash(path) == cached_scan["sha256"]:
+        return cached_scan
+    return scan_config(path)
+
+
+def neighbor_participants_of(scan: dict) -> dict[ipaddress.IPv4Address | ipaddress.IPv6Address, tuple[str, bool]]:
+    """Return a dictionary mapping the neighbors of a scanned config to their participant prefix lists."""
+    exact_prefix_lists = set(scan["exact_prefix_lists"])
+    # for each PARTICIPANT policy, check if it's exact or orlonger
+    participant_filters = {
+        policy: prefix_list_name(policy) in exact_prefix_lists for policy in scan["participant_policies"]
+    }
+    return {
+        ipaddress.ip_address(neighbor): (prefix_list_name(policy), exact)
+        # the format of a dict entry
+        for policy, exact in participant_filters.items()
+        for neighbor, neighbor_policies in scan["neighbors"].items()
+        if policy in neighbor_policies
+    }
+
+
+def write_string(out, s: str):
+    """Write a string prefixed by its length in UTF-8 bytes, as 7-bit groups (as .NET's BinaryReader reads it)."""
+    data = s.encode()
+    length = len(data)
+    while length >= 0x80:
+        out.write(bytes([length & 0x7F | 0x80]))
+        length >>= 7
+    out.write(bytes([length]))
+    out.write(data)
+
+
+def write_index(
+    index_file: pathlib.Path,
+    neighbor_participants: dict[ipaddress.IPv4Address | ipaddress.IPv6Address, tuple[str, bool]],
+    prefix_lists: dict[str, set[ipaddress.IPv4Network]],
+):
+    """
+    Write an index of the neighbors' participant prefix lists for Timepiece.Angler to load
+    (see Internet2Prefixes), with all numbers little-endian:
+    the magic bytes "TPPI" and the format version (u16);
+    the number of prefix lists (u32) and for each, its name, its number of prefixes (u32)
+    and each prefix as its address (u32) and length (u8), sorted;
+    the number of neighbors (u32) and for each, its address (as a string), the position of its prefix list (u32)
+    and whether the list is matched exactly (u8).
+    Names and addresses are strings prefixed by their length (see `write_string`).
+    Neighbors are sorted as in the dictionary entries printed otherwise.
+    """
+    # every participant prefix list, as the neighbors' lists may be declared in the configs of other routers
+    names = sorted(prefix_lists.keys() | {participant for participant, _ in neighbor_participants.values()})
+    positions = {name: i for i, name in enumerate(names)}
+    tmp_file = index_file.with_name(index_file.name + ".tmp")
+    with open(tmp_file, "wb") as out:
+        out.write(INDEX_MAGIC)
+        out.write(struct.pack("<H", INDEX_VERSION))
+        out.write(struct.pack("<I", len(names)))
+        for name in names:
+            write_string(out, name)
+            prefixes = sorted(prefix_lists.get(name, set()))
+            out.write(struct.pack("<I", len(prefixes)))
+            for prefix in prefixes:
+                out.write(struct.pack("<IB", int(prefix.network_address), prefix.prefixlen))
+        out.write(struct.pack("<I", len(neighbor_participants)))
+        for neighbor, (participant, exact) in sorted(
+            neighbor_participants.items(), key=lambda item: (item[0].version, item[0])
+        ):
+            write_string(out, str(neighbor))
+            out.write(struct.pack("<IB", positions[participant], exact))
+    # replace any older index at once, in case it is being read
+    os.replace(tmp_file, index_file)
+
+
+def load_cache(cache_file: pathlib.Path) -> dict[str, dict]:
+    """Return the cached scans of each config, by path, or none if the cache is missing or outdated."""
+    try:
+        with open(cache_file, "r") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != CACHE_VERSION:
+        return {}
+    return cache["configs"]
+
+
+def save_cache(cache_file: pathlib.Path, configs: dict[str, dict]):
+    """Save the scans of each config, replacing the cache file atomically so that an interrupted save loses nothing."""
+    tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+    try:
+        with open(tmp_file, "w") as f:
+            json.dump({"version": CACHE_VERSION, "configs": configs}, f)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"// Warning: could not save the cache to {cache_file}: {e}", file=sys.stderr)
+
+
+def scan_configs(config_files: list[pathlib.Path], cache: dict[str, dict], jobs: int) -> dict[str, dict]:
+    """
+    Return the scan of each config (by path), reusing the cached scans of configs with the same size and mtime,
+    and otherwise scanning configs across a pool of `jobs` processes.
+    """
+    scans = {}
+    to_scan = []
+    for path in config_files:
+        stat = path.stat()
+        key = str(path.resolve())
+        cached = cache.get(key)
+        if cached is not None and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            scans[key] = cached
         else:
-            # neither a neighbor nor an import: skip
-            continue
-    return neighbors_to_policies
+            # only worth hashing if the size has not changed
+            same_size = cached is not None and cached["size"] == stat.st_size
+            to_scan.append((path, key, stat, cached if same_size else None))
+    if jobs > 1 and len(to_scan) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            # hand out several configs at a time, as most configs are quick to scan
+            chunksize = max(1, len(to_scan) // (4 * jobs))
+            results = executor.map(
+                scan_changed_config, [p for p, _, _, _ in to_scan], [c for _, _, _, c in to_scan], chunksize=chunksize
+            )
+            for (_, key, stat, _), scan in zip(to_scan, results):
+                scans[key] = {**scan, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    else:
+        for path, key, stat, cached in to_scan:
+            scans[key] = {**scan_changed_config(path, cached), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return scans
+
+
+def parser():
+    parser = argparse.ArgumentParser(
+        description="Print the participant prefix list of each neighbor in a directory of Juniper (.cfg) configs, "
+        "as entries of a C# dictionary"
+    )
+    parser.add_argument("configs", type=pathlib.Path, help="The directory of configs")
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=available_cpus(),
+        help="Scan this many configs at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache",
+        type=pathlib.Path,
+        help="Cache what is found in each config in this file (default: .find_participants.json in the configs' directory)",
+    )
+    parser.add_argument(
+        "--index",
+        type=pathlib.Path,
+        help="Write the neighbors' participant prefix lists and their IPv4 prefixes to this index file, "
+        "for Timepiece.Angler to load (see Internet2Prefixes), rather than printing dictionary entries",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="use_cache",
+        action="store_false",
+        help="Scan every config, without reading or writing the cache",
+    )
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.cache is None:
+        args.cache = args.configs / ".find_participants.json"
+    return args
 
 
 if __name__ == "__main__":
-    configs = sys.argv[1]
+    args = parser()
+    config_files = sorted(
+        # skip found paths that are not for .cfg files
+        path for path in args.configs.iterdir() if path.is_file() and path.suffix == ".cfg"
+    )
+    cache = load_cache(args.cache) if args.use_cache else {}
+    scans = scan_configs(config_files, cache, args.jobs)
+    if args.use_cache and scans != cache:
+        save_cache(args.cache, scans)
     neighbor_participants = {}
-    for config_file in os.listdir(configs):
-        path = pathlib.Path(os.path.join(configs, config_file))
-        if not path.is_file() or not path.suffix == ".cfg":
-            # skip found paths that are not for .cfg files
-            continue
-        with open(path, "r") as config:
-            config_text = config.read()
-        # strip the lines
-        lines = [line.strip() for line in config_text.splitlines()]
-        # get all the PARTICIPANT policies
-        participant_policies: list[str] = HAS_PARTICIPANT_TERM.findall(config_text)
-        # for each PARTICIPANT policy, check if it's exact or orlonger
-        participant_filters = {pol: is_prefix_list_filter_exact(pol, lines) for pol in participant_policies}
-        # for each found policy, find the neighbors that use it
-        neighbors_to_policies = get_neighbor_import_policies(lines)
-        for neighbor in neighbors_to_policies.keys():
+    for path in config_files:
+        config_participants = neighbor_participants_of(scans[str(path.resolve())])
+        for neighbor in scans[str(path.resolve())]["neighbors"]:
+            neighbor = ipaddress.ip_address(neighbor)
             if neighbor in neighbor_participants:
                 print(
-                    f"// Warning: neighbor {neighbor} has value {neighbor_participants[neighbor]} which will be overwritten.")
+                    f"// Warning: neighbor {neighbor} has value {neighbor_participants[neighbor]} which will be overwritten.",
+                    file=sys.stdout if args.index is None else sys.stderr)
         # update the outer collection -- duplicates will be overwritten
-        neighbor_participants.update(
-            {
-                neighbor: (policy.replace("-IN", "-PARTICIPANT"), exact)
-                # the format of a dict entry
-                for policy, exact in participant_filters.items()
-                for neighbor, neighbor_policies in neighbors_to_policies.items()
-                if policy in neighbor_policies
-            }
+        neighbor_participants.update(config_participants)
+    if args.index is not None:
+        prefix_lists = {}
+        ipv6_prefixes = 0
+        for scan in scans.values():
+            for name, prefixes in scan["prefix_lists"].items():
+                networks = prefix_lists.setdefault(name, set())
+                for prefix in prefixes:
+                    network = ipaddress.ip_network(prefix, strict=False)
+                    if network.version == 4:
+                        networks.add(network)
+                    else:
+                        ipv6_prefixes += 1
+        write_index(args.index, neighbor_participants, prefix_lists)
+        if ipv6_prefixes > 0:
+            print(f"// Warning: skipped {ipv6_prefixes} IPv6 prefixes, as Timepiece only models IPv4 prefixes.", file=sys.stderr)
+        print(
+            f"Wrote {len(neighbor_participants)} neighbors and {len(prefix_lists)} prefix lists "
+            f"({sum(map(len, prefix_lists.values()))} prefixes) to {args.index}",
+            file=sys.stderr,
         )
+        sys.exit(0)
     output_lines = [
         f'{{"{neighbor}", ("{participant}", {"true" if exact else "false"})}},'
-        for (neighbor, (participant, exact)) in sorted(neighbor_participants.items())
+        # IPv4 and IPv6 addresses cannot be compared, so list the IPv4 neighbors first
+        for (neighbor, (participant, exact)) in sorted(
+            neighbor_participants.items(), key=lambda item: (item[0].version, item[0])
+        )
     ]
     print("\n".join(output_lines))
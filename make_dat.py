@@ -1,30 +1,159 @@
 #!/usr/bin/env python3
-# Print a .dat to stdout using the given benchmark log file.
-# Usage: make_dat.py [log file] [mono|modular]
+# Print a .dat to stdout using the given benchmark log files,
+# or the runs of the given policy recorded in a results database,
+# or write a .dat for each mode of each of many logs to a directory.
+# Usage: make_dat.py [log file]... [mono|modular]
+#        make_dat.py --db [database] [policy] [mono|modular]
+#        make_dat.py --out-dir [directory] [log file, directory of logs or glob]...
 
+import argparse
+import concurrent.futures
+import contextlib
 import csv
+import glob
 import itertools
+import math
+import mmap
+import os
 import pathlib
 import re
+import stat
 import sys
-from typing import Any, Callable
+from typing import Any, Callable, NamedTuple, Optional
 
-# regex patterns for identifying table rows for modular and monolithic benchmarks
-MOD_PAT = re.compile(
-    r"^(n\tmax\tmin\tavg\tmed\t99p\ttotal\twall)\n((?:[\d\.]+\s)*)", re.M
+import results_db
+import stats
+
+MODES = ["mono", "modular"]
+# the columns of the .dat files and how to format them
+MONO_HEADERS = {"n": int, "total": float}
+MOD_HEADERS = {
+    "n": int,
+    "max": float,
+    "min": float,
+    "avg": float,
+    "med": float,
+    "99p": float,
+    "total": float,
+    "wall": float,
+}
+
+
+# a pattern matching each line of a benchmark log that make_dat.py uses, so that a log can be scanned in one pass:
+# the lines run_all.py writes before each trial, the size Timepiece prints, its tables of statistics
+# (a header and a row of tab-separated values), and the statistics older versions printed line by line
+# (as in the logs of paper-results)
+LOG_PAT = re.compile(
+    rb"^(?:Running benchmark k=(?P<benchmark>\d+) with options: (?P<options>[^\r\n]*)"
+    rb"|(?P<trial>Trial \d+ of \d+ started)[^\r\n]*"
+    rb"|k=(?P<size>\d+)"
+    rb"|Timed out after (?P<timeout>\d+) seconds"
+    rb"|(?P<header>n\tmax\tmin\tavg\tmed\t99p\ttotal\twall|n\ttotal)\r?\n(?P<values>[\d.]+(?:\t[\d.]+)*)"
+    rb"|(?P<stat>Modular verification|Monolithic verification|Maximum check|Minimum check|Average check"
+    rb"|Median check|99th percentile check|Total check) (?:took|time:)(?: node \S+ in)? (?P<ms>[\d.]+)ms"
+    rb")\r?$",
+    re.M,
 )
-MONO_PAT = re.compile(r"^(n\ttotal)\n((?:[\d\.]+\s)*)", re.M)
+# the column and mode of each statistic printed line by line
+STAT_LINES = {
+    b"Modular verification": ("wall", "modular"),
+    b"Monolithic verification": ("total", "mono"),
+    b"Maximum check": ("max", "modular"),
+    b"Minimum check": ("min", "modular"),
+    b"Average check": ("avg", "modular"),
+    b"Median check": ("med", "modular"),
+    b"99th percentile check": ("99p", "modular"),
+    b"Total check": ("total", "modular"),
+}
 
 
-def output_to_rows(s: str, is_mono: bool = False) -> list[dict[str, float]]:
+class Trial(NamedTuple):
     """
-    Convert the given text `s` to dictionary rows.
-    Each row is one match of the `MOD_PAT` or `MONO_PAT` in `s`.
+    A benchmark run found in a log: its options and fat-tree size (if run by run_all.py),
+    its mode (if known), its table row (empty if it printed no statistics) and how long it ran (in ms) if it timed out.
     """
-    return [
-        dict(zip(match[1].split("\t"), map(float, match[2].split("\t"))))
-        for match in (MONO_PAT if is_mono else MOD_PAT).finditer(s)
-    ]
+
+    options: Optional[list[str]]
+    size: Optional[int]
+    mode: Optional[str]
+    row: dict[str, float]
+    timeout: Optional[float]
+
+
+def fattree_nodes(size: int) -> int:
+    """Return the number of nodes in a fat-tree with the given number of pods."""
+    return 5 * size * size // 4
+
+
+def scan_log(log_file: pathlib.Path) -> list[Trial]:
+    """
+    Scan the given log for its trials in a single pass over the memory-mapped file.
+    Each trial's statistics are merged into one row, whether they were printed as a table or line by line
+    (preferring the table's values); rows without an n column (e.g. from paper-results)
+    take it from the fat-tree size. Logs of Timepiece's output without run_all.py's lines are split into
+    trials wherever a statistic repeats.
+    """
+    trials = []
+    options, size, mode = None, None, None
+    lines, table, timeout = {}, {}, None
+
+    def end_trial():
+        nonlocal lines, table, timeout, mode
+        row = {**lines, **table}
+        if "n" not in row and size is not None and row:
+            row["n"] = fattree_nodes(size)
+        if "n" in row or timeout is not None:
+            trial_mode = mode
+            if trial_mode is None and options is not None:
+                trial_mode = results_db.policy_and_mode(options)[1]
+            trials.append(Trial(options, size, trial_mode, row, timeout))
+        lines, table, timeout, mode = {}, {}, None, None
+
+    with contextlib.ExitStack() as stack:
+        f = stack.enter_context(open(log_file, "rb"))
+        status = os.fstat(f.fileno())
+        if not stat.S_ISREG(status.st_mode):
+            # pipes (e.g. <(cat ...)) cannot be mapped
+            log = f.read()
+        elif status.st_size == 0:
+            # neither can empty files
+            log = b""
+        else:
+            log = stack.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        for match in LOG_PAT.finditer(log):
+            if match["benchmark"] is not None:
+                end_trial()
+                size, options = int(match["benchmark"]), match["options"].decode().split()
+            elif match["trial"] is not None:
+                end_trial()
+            elif match["size"] is not None:
+                if lines or table:
+                    end_trial()
+                size = int(match["size"])
+            elif match["timeout"] is not None:
+                timeout = int(match["timeout"]) * 1000.0
+            elif match["header"] is not None:
+                if table:
+                    end_trial()
+                headers = match["header"].decode().split("\t")
+                table = dict(zip(headers, map(float, match["values"].split(b"\t"))))
+                mode = "mono" if headers == list(MONO_HEADERS) else "modular"
+            else:
+                column, mode = STAT_LINES[match["stat"]]
+                if column in lines:
+                    end_trial()
+                lines[column] = float(match["ms"])
+    end_trial()
+    return trials
+
+
+def log_rows(log_file: pathlib.Path) -> dict[str, list[dict[str, float]]]:
+    """Return the rows of each mode (mono or modular) of the trials in the given log that did not time out."""
+    rows = {}
+    for trial in scan_log(log_file):
+        if trial.row and trial.mode is not None:
+            rows.setdefault(trial.mode, []).append(trial.row)
+    return rows
 
 
 def min_rows_by_key(
@@ -37,49 +166,253 @@ def min_rows_by_key(
     Group rows by the given `groupkey`, and then keep only the row with the smallest `minkey` value.
     """
     min_rows = []
-    for _, g in itertools.groupby(rows, key=lambda r: r[groupkey]):
+    # sort first so that all the rows with the same key are grouped, however they are ordered
+    for _, g in itertools.groupby(
+        sorted(rows, key=lambda r: r[groupkey]), key=lambda r: r[groupkey]
+    ):
         groups = list(g)
         # take the row with the lowest total time
-        min_row = min(groups, key=lambda row: row[minkey])
-        casted = {h: cast(min_row[h]) for h, cast in headers.items()}
+        min_row = min(groups, key=lambda row: row.get(minkey, math.inf))
+        # logs of older versions may lack some statistics
+        casted = {h: cast(min_row[h]) if h in min_row else math.nan for h, cast in headers.items()}
         min_rows.append(casted)
     min_rows.sort(key=lambda r: r[groupkey])
     return min_rows
 
 
-def dat_to_stdout(rows: list[dict[str, float]], headers: list[str]):
-    """Print the given `rows` to stdout formatted like a .dat file."""
-    writer = csv.DictWriter(sys.stdout, fieldnames=headers, delimiter="\t")
+def summaries_by_key(
+    rows: list[dict[str, float]], groupkey: str, metric: str, confidence: float
+) -> list[dict[str, float]]:
+    """
+    Group rows by the given `groupkey` and summarize the `metric` of each group (see stats.metric_columns),
+    in the same order as `min_rows_by_key`.
+    """
+    return [
+        stats.metric_columns(list(g), metric, confidence)
+        for _, g in itertools.groupby(
+            sorted(rows, key=lambda r: r[groupkey]), key=lambda r: r[groupkey]
+        )
+    ]
+
+
+def tabulate(
+    rows: list[dict[str, float]], is_mono: bool, metric: Optional[str], confidence: float
+) -> tuple[list[dict[str, float]], list[str]]:
+    """
+    Return the minimum-total-time row of each size and the .dat columns,
+    adding the summary columns of the given metric (see summaries_by_key), if any.
+    """
+    headers = MONO_HEADERS if is_mono else MOD_HEADERS
+    min_rows = min_rows_by_key(rows, headers, "n", "total")
+    columns = list(headers.keys())
+    if metric is not None:
+        metric = "total" if is_mono else metric
+        for row, summary in zip(min_rows, summaries_by_key(rows, "n", metric, confidence)):
+            row.update(summary)
+        columns.extend(stats.stat_columns(metric))
+    return min_rows, columns
+
+
+def write_dat(rows: list[dict[str, float]], headers: list[str], out=sys.stdout):
+    """Write the given `rows` to `out` (by default, stdout) formatted like a .dat file."""
+    writer = csv.DictWriter(out, fieldnames=headers, delimiter="\t")
     writer.writeheader()
     writer.writerows(rows)
 
 
+def expand_sources(sources: list[str]) -> list[pathlib.Path]:
+    """
+    Return the log files given by each source: a log file, a directory (standing for its .txt files)
+    or a glob pattern (e.g. quoted to not exceed the shell's limit on the number of arguments).
+    """
+    log_files = []
+    for source in sources:
+        path = pathlib.Path(source)
+        if path.is_dir():
+            log_files.extend(sorted(path.glob("*.txt")))
+        elif not path.exists() and glob.has_magic(source):
+            log_files.extend(sorted(pathlib.Path(p) for p in glob.glob(source)))
+        else:
+            log_files.append(path)
+    return log_files
+
+
+def dat_files(log_file: pathlib.Path, modes, out_dir: pathlib.Path) -> dict[str, pathlib.Path]:
+    """
+    Return the .dat file to write each of the given modes of a log to in batch mode:
+    the log's name with a .dat suffix, or if the log has both modes, with a -m.dat suffix for the monolithic one.
+    """
+    if len(modes) == 1:
+        return {mode: out_dir / "{}.dat".format(log_file.stem) for mode in modes}
+    return {mode: out_dir / "{}{}.dat".format(log_file.stem, "-m" if mode == "mono" else "") for mode in modes}
+
+
+def write_log_dats(
+    log_file: pathlib.Path, out_dir: pathlib.Path, metric: Optional[str], confidence: float
+) -> list[pathlib.Path]:
+    """Write a .dat file of each mode in the given log to `out_dir`, returning the files written."""
+    rows = log_rows(log_file)
+    written = []
+    for mode, dat_file in dat_files(log_file, rows, out_dir).items():
+        min_rows, columns = tabulate(rows[mode], mode == "mono", metric, confidence)
+        with open(dat_file, "w", newline="") as out:
+            write_dat(min_rows, columns, out)
+        written.append(dat_file)
+    return written
+
+
+def available_cpus() -> int:
+    """Return the number of CPUs this process may run on (or on platforms that cannot tell, of the machine)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def parallel_map(fn, log_files: list[pathlib.Path], jobs: int, *args) -> list:
+    """Apply `fn` to each log file (and the given arguments) across a pool of `jobs` processes."""
+    if jobs <= 1 or len(log_files) <= 1:
+        return [fn(log_file, *args) for log_file in log_files]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        # hand out several logs at a time, as most logs are quick to scan
+        chunksize = max(1, len(log_files) // (4 * jobs))
+        return list(
+            executor.map(fn, log_files, *([arg] * len(log_files) for arg in args), chunksize=chunksize)
+        )
+
+
+def parser():
+    parser = argparse.ArgumentParser(
+        description="Print a .dat table of the minimum-total-time results of a benchmark, "
+        "or with --out-dir, write a table of each benchmark in many logs"
+    )
+    parser.add_argument(
+        "--db",
+        type=pathlib.Path,
+        help="Read the results from this results database (e.g. {}), "
+        "interpreting the source as a policy rather than a log file".format(results_db.DEFAULT_DB),
+    )
+    parser.add_argument(
+        "--options",
+        help="With --db, only use runs with exactly these (space-separated) DLL options",
+    )
+    parser.add_argument(
+        "--git-rev", help="With --db, only use runs of this git revision"
+    )
+    parser.add_argument(
+        "--since",
+        help="With --db, only use runs started at or after this ISO 8601 time",
+    )
+    parser.add_argument(
+        "--cold",
+        action="store_true",
+        help="With --db, only use runs in freshly started processes (not reusing a warm worker, see run_all.py --warm)",
+    )
+    parser.add_argument(
+        "--cores",
+        type=int,
+        help="With --db, only use runs given this many cores (runs of run_all.py --scaling studies are never used)",
+    )
+    parser.add_argument(
+        "--stats",
+        "-s",
+        choices=["wall", "med", "99p", "total"],
+        help="Add columns with the median, mean and confidence interval of this metric across trials, "
+        "excluding outliers, and the numbers of trials and outliers (monolithic benchmarks always use total)",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="With --stats, the confidence level of the intervals (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--out-dir",
+        "-o",
+        type=pathlib.Path,
+        help="Write a .dat file to this directory for each mode of each log, "
+        "named after the log (with a -m suffix for monolithic results if a log has both), "
+        "rather than printing one table",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=available_cpus(),
+        help="Scan this many logs at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        "source",
+        nargs="+",
+        help="The log files, directories of logs (.txt files) or glob patterns of logs to tabulate "
+        "(or with --db, the policy), followed by the kind of benchmark (mono or modular): "
+        "without --db, the kind may be left out to detect it from the logs",
+    )
+    args = parser.parse_args()
+    args.mode = None
+    if len(args.source) > 1 and args.source[-1] in MODES:
+        args.mode = args.source.pop()
+    if args.db is not None and (args.mode is None or len(args.source) != 1):
+        parser.error("--db requires a policy and the kind of benchmark (mono or modular)")
+    if args.db is not None and args.out_dir is not None:
+        parser.error("--out-dir reads logs and cannot be combined with --db")
+    if args.out_dir is not None and args.mode is not None:
+        parser.error("--out-dir writes tables of both kinds of benchmark, so the kind cannot be given")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return args
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        raise Exception("Usage: make_dat.py [log file] [mono|modular]")
-
-    log_file = pathlib.PurePath(sys.argv[1])
-    if sys.argv[2] == "mono":
-        is_mono = True
-    elif sys.argv[2] == "modular":
-        is_mono = False
-    else:
-        raise Exception("Must specify modular or mono!")
-
-    with open(log_file, "r") as log:
-        rows = output_to_rows(log.read(), is_mono)
-    if is_mono:
-        headers = {"n": int, "total": float}
-    else:
-        headers = {
-            "n": int,
-            "max": float,
-            "min": float,
-            "avg": float,
-            "med": float,
-            "99p": float,
-            "total": float,
-            "wall": float,
-        }
-    min_rows = min_rows_by_key(rows, headers, "n", "total")
-    dat_to_stdout(min_rows, list(headers.keys()))
+    args = parser()
+
+    if args.db is not None:
+        rows = results_db.query_rows(
+            results_db.connect(args.db),
+            args.source[0],
+            args.mode,
+            options=args.options,
+            git_rev=args.git_rev,
+            since=args.since,
+            warm=False if args.cold else None,
+            cores=args.cores,
+        )
+        min_rows, columns = tabulate(rows, args.mode == "mono", args.stats, args.confidence)
+        write_dat(min_rows, columns)
+        sys.exit(0)
+
+    log_files = expand_sources(args.source)
+    missing = [log_file for log_file in log_files if not log_file.exists()]
+    if missing:
+        print("Could not find log file(s): {}".format(", ".join(map(str, missing))), file=sys.stderr)
+        sys.exit(1)
+    if args.out_dir is not None:
+        stems = [log_file.stem for log_file in log_files]
+        duplicates = sorted({stem for stem in stems if stems.count(stem) > 1})
+        if duplicates:
+            print(
+                "Logs in different directories would write the same .dat files: {}".format(", ".join(duplicates)),
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        args.out_dir.mkdir(parents=True, exist_ok=True)
+        written = parallel_map(write_log_dats, log_files, args.jobs, args.out_dir, args.stats, args.confidence)
+        for log_file, dat_files in zip(log_files, written):
+            if not dat_files:
+                print("No results found in {}".format(log_file), file=sys.stderr)
+        print("Wrote {} .dat files to {}".format(sum(map(len, written)), args.out_dir), file=sys.stderr)
+        sys.exit(0)
+
+    # combine the rows of every log into one table
+    rows = {}
+    for log in parallel_map(log_rows, log_files, args.jobs):
+        for mode, mode_rows in log.items():
+            rows.setdefault(mode, []).extend(mode_rows)
+    mode = args.mode
+    if mode is None:
+        if len(rows) > 1:
+            print("The logs have both mono and modular results: give the kind of benchmark to tabulate", file=sys.stderr)
+            sys.exit(1)
+        # an empty table, if no results were found
+        mode = next(iter(rows), "modular")
+    min_rows, columns = tabulate(rows.get(mode, []), mode == "mono", args.stats, args.confidence)
+    write_dat(min_rows, columns)
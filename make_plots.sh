@@ -4,18 +4,22 @@
 TIMEOUT=$1
 mkdir -p results
 
+# tabulate every benchmark's logs in one pass
+logs=()
 for benchmark in "${@:2}"; do
-    modlog="${benchmark}.txt"
-    moddat="${benchmark}.dat"
-    monolog="${benchmark}-m.txt"
-    monodat="${benchmark}-m.dat"
-    if [ -e "logs/${modlog}" ] && [ -e "logs/${monolog}" ]; then
-        python3 make_dat.py "logs/${modlog}" > "results/${moddat}"
-        python3 make_dat.py "logs/${monolog}" > "results/${monodat}"
+    if [ -e "logs/${benchmark}.txt" ] && [ -e "logs/${benchmark}-m.txt" ]; then
+        logs+=("logs/${benchmark}.txt" "logs/${benchmark}-m.txt")
     else
         echo "Unable to find relevant log files for ${benchmark} benchmark."
-        continue
     fi
+done
+if [ ${#logs[@]} -gt 0 ]; then
+    python3 make_dat.py --out-dir results "${logs[@]}"
+fi
+
+for benchmark in "${@:2}"; do
+    moddat="${benchmark}.dat"
+    monodat="${benchmark}-m.dat"
     # generate the plot
     if [ -e "results/${moddat}" ] && [ -e "results/${monodat}" ]; then
         # generate the PDF using the configured choice of \timeout, \benchmono and \benchmod
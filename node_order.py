@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# Learn how long Timepiece takes to check each node of a benchmark from the per-node times of its past runs
+# recorded in a results database (see run_all.py --node-times), and write them to a hint file
+# for Timepiece's --order option, which starts the slowest checks first so that they do not finish last.
+# With --simulate, predict the wall-clock time of the checks in the hinted order and in the default order.
+# Usage: node_order.py [policy] -k [size]
+# Run with --help for more options.
+
+import argparse
+import hashlib
+import heapq
+import pathlib
+import statistics
+import sys
+from typing import Optional
+
+import results_db
+from make_dat import available_cpus
+
+# where hint files are written, alongside the .dat files
+DEFAULT_DIRECTORY = pathlib.Path("results", "orders")
+# the number of most recent runs each node's time is estimated from
+DEFAULT_RUNS = 5
+
+
+def estimate_times(history: list[results_db.NodeTimes]) -> dict[str, int]:
+    """Return the median time of each node across the given runs, in milliseconds."""
+    times = {}
+    for node_times in history:
+        for node, ms in zip(node_times.nodes, node_times.ms):
+            times.setdefault(node, []).append(ms)
+    return {node: round(statistics.median(ms)) for node, ms in times.items()}
+
+
+def write_hints(path: pathlib.Path, estimates: dict[str, int], comment: Optional[str] = None):
+    """
+    Write a hint file for Timepiece's --order option (read by CheckOrder.Read):
+    each node and its estimated time in milliseconds, separated by a tab, longest first.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as hints:
+        if comment is not None:
+            hints.write("# {}\n".format(comment))
+        for node, ms in sorted(estimates.items(), key=lambda estimate: estimate[1], reverse=True):
+            hints.write("{}\t{}\n".format(node, ms))
+
+
+def hint_path(directory: pathlib.Path, policy: str, size: Optional[int], options: Optional[list[str]] = None):
+    """
+    Return the path of the hint file of the given policy and size (if any),
+    distinguished by a digest of the DLL options (e.g. the angler file) the times were learned from, if given.
+    """
+    name = policy if size is None else "{}-k{}".format(policy, size)
+    if options is not None:
+        name += "-" + hashlib.sha1(" ".join(options).encode()).hexdigest()[:8]
+    return directory.joinpath(name + ".order")
+
+
+def default_order(nodes: list[str], angler_nodes: Optional[list[str]] = None) -> list[str]:
+    """
+    Return the nodes in the order Timepiece checks them without hints (the order of its Digraph.Nodes):
+    that of the given nodes of an angler file, if any, and otherwise fat-tree nodes ("{role}-{index}")
+    by their index, which numbers them in the order they are created; other nodes keep their given order.
+    """
+    if angler_nodes is not None:
+        position = {node: i for i, node in enumerate(angler_nodes)}
+        return sorted(nodes, key=lambda node: position.get(node, len(position)))
+
+    def index(node):
+        _, _, i = node.rpartition("-")
+        return int(i) if i.isdigit() else sys.maxsize
+
+    return sorted(nodes, key=index)
+
+
+def hinted_order(nodes: list[str], estimates: dict[str, int]) -> list[str]:
+    """
+    Return the nodes longest-first by their estimated times, as Timepiece's CheckOrder.Order does:
+    nodes without an estimate come first, and nodes with equal estimates keep their given order.
+    """
+    return sorted(nodes, key=lambda node: -estimates.get(node, sys.maxsize))
+
+
+def list_makespan(order: list[str], times: dict[str, int], workers: int) -> int:
+    """
+    Return the time to check the nodes when each of `workers` threads takes the next node in the given order
+    as soon as it finishes its last, as Timepiece does with --order.
+    """
+    finish = [0] * min(workers, len(order))
+    if not finish:
+        return 0
+    for node in order:
+        heapq.heapreplace(finish, finish[0] + times[node])
+    return max(finish)
+
+
+def partitioned_makespan(order: list[str], times: dict[str, int], workers: int) -> int:
+    """
+    Return the time to check the nodes when they are split into `workers` contiguous ranges of (almost) equal size,
+    each checked in turn by one thread, as PLINQ partitions Timepiece's nodes without --order.
+    """
+    parts = min(workers, len(order))
+    if not parts:
+        return 0
+    base, extra = divmod(len(order), parts)
+    makespan, start = 0, 0
+    for part in range(parts):
+        end = start + base + (1 if part < extra else 0)
+        makespan = max(makespan, sum(times[node] for node in order[start:end]))
+        start = end
+    return makespan
+
+
+def simulate(
+    history: list[results_db.NodeTimes], workers: int, runs: int, angler_nodes: Optional[list[str]] = None
+) -> tuple[float, float, float]:
+    """
+    Predict the mean time to check each of the given runs' nodes on `workers` threads in the default order
+    and in the order hinted by the other runs (or by the run itself, if there are no others),
+    and a lower bound on any order: the longest node, or the total time spread evenly across the threads.
+    The hints of each run are estimated from at most `runs` of the others.
+    Return the default, hinted and lower bound times in milliseconds.
+    """
+    default, hinted, bound = [], [], []
+    for i, node_times in enumerate(history):
+        others = (history[:i] + history[i + 1 :])[:runs] or [node_times]
+        times = dict(zip(node_times.nodes, node_times.ms))
+        nodes = list(times)
+        order = default_order(nodes, angler_nodes)
+        default.append(partitioned_makespan(order, times, workers))
+        hinted.append(list_makespan(hinted_order(order, estimate_times(others)), times, workers))
+        bound.append(max(max(times.values(), default=0), sum(times.values()) / workers))
+    return statistics.mean(default), statistics.mean(hinted), statistics.mean(bound)
+
+
+class NodeOrders:
+    """
+    Write the hint files of modular runs from the recorded per-node times of earlier runs
+    with the same options and size, as run_all.py --order does before each run.
+    """
+
+    def __init__(self, conn, directory: pathlib.Path = DEFAULT_DIRECTORY, runs: int = DEFAULT_RUNS):
+        self.conn = conn
+        self.directory = directory
+        self.runs = runs
+
+    def options(self, options: list[str], size: Optional[int]) -> list[str]:
+        """
+        Return the DLL options that schedule a run with the given options and size by its hint file,
+        after (re)writing the file from the most recent runs; none if the run is monolithic or has no history.
+        """
+        policy, mode = results_db.policy_and_mode(options)
+        if mode != "modular":
+            return []
+        history = results_db.query_node_time_history(self.conn, policy, mode, size=size, options=" ".join(options))
+        if not history:
+            return []
+        history = [node_times for _, node_times in history[: self.runs]]
+        path = hint_path(self.directory, policy, size, options)
+        write_hints(
+            path,
+            estimate_times(history),
+            "median node times of the last {} runs of: {}".format(len(history), " ".join(options)),
+        )
+        return ["--order", str(path)]
+
+
+def parser():
+    parser = argparse.ArgumentParser(
+        description="Write a hint file of the estimated time to check each node of a benchmark, "
+        "learned from the per-node times of its runs in a results database, for Timepiece's --order option"
+    )
+    parser.add_argument("policy", help="The benchmark or angler query whose runs to learn from")
+    parser.add_argument(
+        "--size",
+        "-k",
+        type=int,
+        help="The size of the benchmark (default: write a hint file for each recorded size)",
+    )
+    parser.add_argument(
+        "--db",
+        type=pathlib.Path,
+        default=results_db.DEFAULT_DB,
+        help="The results database to read (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--options",
+        help="Only learn from runs with exactly these DLL options, space-separated "
+        "(e.g. to tell apart the runs of different angler files)",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=DEFAULT_RUNS,
+        help="Estimate each node's time as its median over this many of the most recent runs (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=pathlib.Path,
+        help="The hint file to write, with --size (default: {}/POLICY-kSIZE.order)".format(DEFAULT_DIRECTORY),
+    )
+    parser.add_argument(
+        "--simulate",
+        "-s",
+        action="store_true",
+        help="Also predict the time to check the nodes of the recorded runs in the default order and "
+        "in the hinted order (learned from the other runs), and a lower bound on any order",
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        nargs="+",
+        default=[available_cpus()],
+        help="With --simulate, the numbers of threads to check the nodes on (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--angler",
+        type=pathlib.Path,
+        help="With --simulate, the angler file the runs checked, whose order of nodes is the default order "
+        "(default: the order of fat-tree nodes)",
+    )
+    args = parser.parse_args()
+    if args.output is not None and args.size is None:
+        parser.error("--output requires --size")
+    if args.runs < 1 or min(args.workers) < 1:
+        parser.error("--runs and --workers must be at least 1")
+    return args
+
+
+if __name__ == "__main__":
+    args = parser()
+    if not args.db.exists():
+        print("Could not find {}, exiting...".format(args.db))
+        sys.exit(1)
+    history = results_db.query_node_time_history(
+        results_db.connect(args.db), args.policy, size=args.size, options=args.options
+    )
+    if not history:
+        print("No successful modular runs of {} with node times are recorded, exiting...".format(args.policy))
+        sys.exit(1)
+    by_size = {}
+    for size, node_times in history:
+        by_size.setdefault(size, []).append(node_times)
+    angler_nodes = None
+    if args.angler is not None:
+        import slice_angler
+
+        angler_nodes = list(slice_angler.Topology.read(args.angler).neighbors)
+    for size, size_history in sorted(by_size.items(), key=lambda item: (item[0] is not None, item[0])):
+        recent = size_history[: args.runs]
+        path = args.output or hint_path(DEFAULT_DIRECTORY, args.policy, size)
+        write_hints(
+            path,
+            estimate_times(recent),
+            "median node times of the last {} runs of {}{}".format(
+                len(recent), args.policy, "" if size is None else " k={}".format(size)
+            ),
+        )
+        print("Wrote the estimated times of {} runs to {}".format(len(recent), path))
+        if args.simulate:
+            print("workers\tdefault\thinted\tbound\tspeedup")
+            for workers in args.workers:
+                default, hinted, bound = simulate(size_history, workers, args.runs, angler_nodes)
+                print(
+                    "{}\t{:.0f}\t{:.0f}\t{:.0f}\t{:.2f}".format(
+                        workers, default, hinted, bound, default / hinted if hinted else 1.0
+                    )
+                )
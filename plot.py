@@ -1,29 +1,109 @@
 #!/usr/bin/env python3
-# Using `matplotlib`, plot the results of the given benchmark .dat file.
+# Using `matplotlib`, plot the results of the given benchmark .dat files,
+# or of the given policy's runs recorded in a results database.
 
+import argparse
+import concurrent.futures
+import functools
+import math
 import matplotlib.pyplot as plt
 import pandas as pd
 import pathlib
 import sys
 from cycler import cycler
+from matplotlib.backends.backend_pdf import PdfPages
+from typing import Optional
 
+import results_db
+from make_dat import MOD_HEADERS, MONO_HEADERS, fattree_nodes, min_rows_by_key
 
 def read_dat(path: str) -> pd.DataFrame:
     """
-    Read in a table formatted like a .dat file: whitespace is used to separate columns.
+    Read in a table formatted like a .dat file: whitespace is used to separate columns,
+    and lines starting with # (e.g. notes on rows added by hand) are ignored.
+    Each file is only read once, unless it is modified.
     """
-    dat_file = pathlib.PurePath(path)
+    dat_file = pathlib.Path(path)
+    return _read_dat(dat_file.resolve(), dat_file.stat().st_mtime_ns).copy()
+
+
+@functools.lru_cache(maxsize=None)
+def _read_dat(dat_file: pathlib.Path, mtime_ns: int) -> pd.DataFrame:
     with open(dat_file, "r") as dat:
-        return pd.read_table(dat, delim_whitespace=True)
+        return pd.read_table(dat, sep=r"\s+", comment="#")
+
+
+def split_legacy_dat(table: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Split a .dat file of paper-results, with columns k, tk (the wall time), med, 99 and ms (the monolithic time),
+    into its modular and monolithic tables. Rows that timed out are kept, at the timeout.
+    """
+    n = table["k"].map(fattree_nodes)
+    modular_table = pd.DataFrame({"n": n, "wall": table["tk"], "med": table["med"], "99p": table["99"]})
+    mono_table = pd.DataFrame({"n": n, "total": table["ms"]})
+    return modular_table, mono_table
+
+
+def find_benchmarks(sources: list[str]) -> dict[str, tuple[Optional[pathlib.Path], Optional[pathlib.Path]]]:
+    """
+    Return the modular and monolithic .dat files of each benchmark among the given .dat files and directories
+    (standing for their .dat files), by name: X.dat is the modular table of X, and X-m.dat its monolithic table.
+    A .dat file of paper-results has both tables of its benchmark, and a table without a wall column is monolithic.
+    """
+    benchmarks = {}
+    for source in sources:
+        path = pathlib.Path(source)
+        for dat_file in sorted(path.glob("*.dat")) if path.is_dir() else [path]:
+            if dat_file.stem.endswith("-m"):
+                name = dat_file.stem[: -len("-m")]
+                modular_file, _ = benchmarks.get(name, (None, None))
+                benchmarks[name] = (modular_file, dat_file)
+            else:
+                _, mono_file = benchmarks.get(dat_file.stem, (None, None))
+                benchmarks[dat_file.stem] = (dat_file, mono_file)
+    return benchmarks
+
+
+def load_benchmarks(
+    benchmarks: dict[str, tuple[Optional[pathlib.Path], Optional[pathlib.Path]]]
+) -> dict[str, tuple[Optional[pd.DataFrame], Optional[pd.DataFrame]]]:
+    """Read the modular and monolithic tables of each benchmark found by `find_benchmarks`."""
+    tables = {}
+    for name, (modular_file, mono_file) in benchmarks.items():
+        modular_table = read_dat(modular_file) if modular_file is not None else None
+        mono_table = read_dat(mono_file) if mono_file is not None else None
+        if modular_table is not None and "k" in modular_table.columns:
+            modular_table, mono_table = split_legacy_dat(modular_table)
+        elif modular_table is not None and "wall" not in modular_table.columns and mono_table is None:
+            # a monolithic table not named as such (e.g. tabulated from a monolithic log of paper-results)
+            modular_table, mono_table = None, modular_table
+        tables[name] = (modular_table, mono_table)
+    return tables
+
+
+def read_db(db_path, policy: str, is_mono: bool, **filters) -> pd.DataFrame:
+    """
+    Read the table of a policy's results from a results database,
+    keeping the run with the smallest total time for each size as make_dat.py does.
+    Any `filters` are passed on to `results_db.query_rows`.
+    """
+    headers = MONO_HEADERS if is_mono else MOD_HEADERS
+    rows = results_db.query_rows(
+        results_db.connect(db_path), policy, "mono" if is_mono else "modular", **filters
+    )
+    return pd.DataFrame(
+        min_rows_by_key(rows, headers, "n", "total"), columns=list(headers)
+    )
 
 
 def plot_modular_vs_mono(
-    modular_table: pd.DataFrame, mono_table: pd.DataFrame, timeout=None
+    modular_table: Optional[pd.DataFrame], mono_table: Optional[pd.DataFrame], timeout=None, ax=None, title=None
 ):
     """
     Plot verification time with respect to the number of nodes for modular verification
-    vs. monolithic verification.
+    vs. monolithic verification, leaving out either if its table is None.
     If a `timeout` is given, add as an additional horizontal line.
+    Plot onto the given axes (e.g. one of a grid of subplots) or a new figure, and return the figure.
     """
     cute_cycler = cycler(
         color=[
@@ -35,7 +115,12 @@ def plot_modular_vs_mono(
     ) + cycler(
         marker=["p", "^", "s", "D"]  # pentagon, triangle, square, diamond
     )
-    fig, ax = plt.subplots()
+    if ax is None:
+        fig, ax = plt.subplots()
+    else:
+        fig = ax.figure
+    if title is not None:
+        ax.set_title(title)
     ax.set_prop_cycle(cute_cycler)
     ax.set_xlabel("Number of nodes")
     ax.set_yscale("log")
@@ -52,24 +137,275 @@ def plot_modular_vs_mono(
             xytext=(0, -5),
             textcoords="offset points",
         )
-    ax.plot("n", "wall", label="Timepiece (wall)", data=modular_table)
-    ax.plot("n", "99p", label="Timepiece (99th percentile)", data=modular_table)
-    ax.plot("n", "med", label="Timepiece (median)", data=modular_table)
-    ax.plot("n", "total", label="Monolithic", data=mono_table)
+    # the tables are in milliseconds, as in plot.tex
+    if modular_table is not None:
+        ax.plot(modular_table["n"], modular_table["wall"] / 1000, label="Timepiece (wall)")
+        ax.plot(modular_table["n"], modular_table["99p"] / 1000, label="Timepiece (99th percentile)")
+        ax.plot(modular_table["n"], modular_table["med"] / 1000, label="Timepiece (median)")
+    else:
+        # skip the modular styles, so monolithic results look the same in every plot
+        ax.set_prop_cycle(cute_cycler[3:])
+    if mono_table is not None:
+        ax.plot(mono_table["n"], mono_table["total"] / 1000, label="Monolithic")
     ax.legend()
     ax.grid(True, which="major")
     return fig
 
 
+def plot_grid(tables: dict[str, tuple], timeout=None):
+    """
+    Plot each benchmark's modular and monolithic tables (as returned by `load_benchmarks`)
+    on one figure, in a grid of subplots titled by benchmark.
+    """
+    ncols = math.ceil(math.sqrt(len(tables)))
+    nrows = math.ceil(len(tables) / ncols)
+    fig, axes = plt.subplots(nrows, ncols, figsize=(6.4 * ncols, 4.8 * nrows), squeeze=False)
+    for ax, (name, (modular_table, mono_table)) in zip(axes.flat, tables.items()):
+        plot_modular_vs_mono(modular_table, mono_table, timeout, ax=ax, title=name)
+    for ax in axes.flat[len(tables) :]:
+        ax.set_visible(False)
+    fig.tight_layout()
+    return fig
+
+
+def save_pages(tables: dict[str, tuple], plotfile, timeout=None):
+    """Save a PDF with a page plotting each benchmark's modular and monolithic tables."""
+    with PdfPages(plotfile) as pdf:
+        for name, (modular_table, mono_table) in tables.items():
+            fig = plot_modular_vs_mono(modular_table, mono_table, timeout, title=name)
+            pdf.savefig(fig)
+            plt.close(fig)
+
+
+def save_plot(name: str, tables: tuple, plotfile, timeout=None):
+    """Save a plot of a benchmark's modular and monolithic tables to the given file, returning the file."""
+    fig = plot_modular_vs_mono(*tables, timeout, title=name)
+    fig.savefig(plotfile)
+    plt.close(fig)
+    return plotfile
+
+
+def parser():
+    parser = argparse.ArgumentParser(
+        description="Plot modular vs. monolithic verification times",
+        usage="plot.py [modular dat file] [mono dat file] [output file (default: plot.pdf)] [timeout (in seconds)?]\n"
+        "       plot.py --db [database] [policy] [output file (default: plot.pdf)] [timeout (in seconds)?]\n"
+        "       plot.py --db [database] --node-times [policy] [output file (default: plot.pdf)]\n"
+        "       plot.py --batch [-o output file | --out-dir directory] [--grid] [--timeout seconds] "
+        "[dat file or directory]...\n"
+        "       plot.py --scaling [-o output file] [scaling dat file]...",
+    )
+    parser.add_argument(
+        "--db",
+        type=pathlib.Path,
+        help="Read the results of the given policy from this results database (e.g. {}) "
+        "rather than from .dat files".format(results_db.DEFAULT_DB),
+    )
+    parser.add_argument(
+        "--node-times",
+        action="store_true",
+        help="With --db, plot the distribution of per-node check times of the policy's modular runs",
+    )
+    parser.add_argument(
+        "--batch",
+        "-b",
+        action="store_true",
+        help="Plot every benchmark among the given .dat files and directories of .dat files at once, "
+        "pairing X.dat (modular) with X-m.dat (monolithic), each on its own page of one PDF",
+    )
+    parser.add_argument(
+        "--scaling",
+        action="store_true",
+        help="Plot the speedup, parallel efficiency and serial fraction of each of the given strong-scaling "
+        ".dat files (written by run_all.py --scaling --dat) against the number of cores, each on its own page",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        default="plots.pdf",
+        help="With --batch or --scaling, the file to plot to (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--grid",
+        action="store_true",
+        help="With --batch, plot every benchmark in a grid on one page rather than on a page each",
+    )
+    parser.add_argument(
+        "--out-dir",
+        type=pathlib.Path,
+        help="With --batch, save each benchmark's plot to its own file X.pdf in this directory instead",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="With --out-dir, render this many plots at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--timeout",
+        "-t",
+        type=float,
+        help="With --batch, the timeout (in seconds) to draw on each plot",
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="The modular and mono .dat files (or with --db, the policy), "
+        "optionally followed by the output file and timeout "
+        "(or with --batch, any number of .dat files and directories of .dat files)",
+    )
+    args = parser.parse_args()
+    if args.node_times and args.db is None:
+        parser.error("--node-times requires --db")
+    if args.scaling:
+        if args.db is not None or args.batch:
+            parser.error("--scaling reads .dat files and cannot be combined with --db or --batch")
+        return args, 0
+    if args.batch:
+        if args.db is not None:
+            parser.error("--batch reads .dat files and cannot be combined with --db")
+        if args.grid and args.out_dir is not None:
+            parser.error("--grid plots to one file and cannot be combined with --out-dir")
+        if args.jobs < 1:
+            parser.error("--jobs must be at least 1")
+        return args, 0
+    ntables = 1 if args.db is not None else 2
+    if not ntables <= len(args.inputs) <= ntables + 2:
+        parser.error("wrong number of arguments")
+    return args, ntables
+
+
+def plot_node_times(node_times: list[tuple], title=None):
+    """
+    Plot the distribution of per-node check times of each run in `node_times`,
+    a list of (size, number of nodes, `results_db.NodeTimes`) triples as returned by `results_db.query_node_times`.
+    The left plot shows the cumulative distribution of check times for each size;
+    the right plot breaks the times down by the role of the node in the fat-tree,
+    showing the median (solid) and maximum (dashed) check time of each role with respect to the number of nodes.
+    """
+    fig, (cdf_ax, role_ax) = plt.subplots(1, 2, figsize=(12, 4.8))
+    if title is not None:
+        fig.suptitle(title)
+    cdf_ax.set_xlabel("Node check time (seconds)")
+    cdf_ax.set_xscale("log")
+    cdf_ax.set_ylabel("Fraction of nodes")
+    for size, n, times in node_times:
+        seconds = sorted(ms / 1000 for ms in times.ms)
+        fractions = [(i + 1) / len(seconds) for i in range(len(seconds))]
+        label = "k={}".format(size) if size is not None else "n={}".format(n)
+        cdf_ax.step(seconds, fractions, where="post", label=label)
+    cdf_ax.legend(fontsize="small")
+    cdf_ax.grid(True, which="major")
+
+    role_ax.set_xlabel("Number of nodes")
+    role_ax.set_yscale("log")
+    role_ax.set_ylabel("Node check time (seconds)")
+    colors = dict(zip(results_db.ROLES, ["coral", "goldenrod", "cornflowerblue", "darkseagreen"]))
+    for role in results_db.ROLES:
+        ns, medians, maxima = [], [], []
+        for _, n, times in node_times:
+            role_times = sorted(times.by_role().get(role, []))
+            if role_times:
+                ns.append(n)
+                medians.append(role_times[len(role_times) // 2] / 1000)
+                maxima.append(role_times[-1] / 1000)
+        if ns:
+            role_ax.plot(ns, medians, color=colors[role], marker="o", label="{} (median)".format(role))
+            role_ax.plot(ns, maxima, color=colors[role], marker="^", linestyle="--", label="{} (max)".format(role))
+    role_ax.legend(fontsize="small")
+    role_ax.grid(True, which="major")
+    return fig
+
+
+def plot_scaling(table: pd.DataFrame, title=None):
+    """
+    Plot a strong-scaling study (a .dat file written by run_all.py --scaling --dat): the speedup,
+    parallel efficiency and Karp-Flatt metric (experimentally determined serial fraction)
+    with respect to the number of cores, with a curve for each number of nodes.
+    Ideal scaling is drawn dashed: a speedup equal to the cores, an efficiency of 1 and a serial fraction of 0.
+    """
+    fig, (speedup_ax, efficiency_ax, serial_ax) = plt.subplots(1, 3, figsize=(15, 4.8))
+    if title is not None:
+        fig.suptitle(title)
+    cores = sorted(table["cores"].unique())
+    speedup_ax.plot(cores, cores, linestyle="--", color="#000000", label="ideal")
+    efficiency_ax.axhline(y=1, linestyle="--", color="#000000", label="ideal")
+    serial_ax.axhline(y=0, linestyle="--", color="#000000", label="ideal")
+    for n, size_table in table.sort_values(["n", "cores"]).groupby("n"):
+        label = "n={:.0f}".format(n)
+        speedup_ax.plot(size_table["cores"], size_table["speedup"], marker="o", label=label)
+        efficiency_ax.plot(size_table["cores"], size_table["efficiency"], marker="o", label=label)
+        serial = size_table[size_table["cores"] > 1]
+        serial_ax.plot(serial["cores"], serial["karp_flatt"], marker="o", label=label)
+    for ax, ylabel in [
+        (speedup_ax, "Speedup"),
+        (efficiency_ax, "Parallel efficiency"),
+        (serial_ax, "Serial fraction (Karp-Flatt)"),
+    ]:
+        ax.set_xlabel("Cores")
+        ax.set_xscale("log", base=2)
+        ax.set_ylabel(ylabel)
+        ax.legend(fontsize="small")
+        ax.grid(True, which="major")
+    fig.tight_layout()
+    return fig
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        raise Exception(
-            "Usage: plot.py [modular dat file] [mono dat file] [output file (default: plot.pdf)] [timeout (in seconds)?]"
-        )
-    modular_table = read_dat(sys.argv[1])
-    mono_table = read_dat(sys.argv[2])
-    plotfile = sys.argv[3] if len(sys.argv) > 3 else "plot.pdf"
-    timeout = float(sys.argv[4]) if len(sys.argv) > 4 else None
+    args, ntables = parser()
+    if args.scaling:
+        missing = [path for path in args.inputs if not pathlib.Path(path).exists()]
+        if missing:
+            print("Could not find .dat file(s): {}".format(", ".join(missing)), file=sys.stderr)
+            sys.exit(1)
+        with PdfPages(args.output) as pdf:
+            for path in args.inputs:
+                fig = plot_scaling(read_dat(path), title=pathlib.Path(path).stem)
+                pdf.savefig(fig)
+                plt.close(fig)
+        sys.exit(0)
+    if args.batch:
+        benchmarks = find_benchmarks(args.inputs)
+        missing = [str(f) for files in benchmarks.values() for f in files if f is not None and not f.exists()]
+        if missing:
+            print("Could not find .dat file(s): {}".format(", ".join(missing)), file=sys.stderr)
+            sys.exit(1)
+        if not benchmarks:
+            print("No .dat files found", file=sys.stderr)
+            sys.exit(1)
+        tables = load_benchmarks(benchmarks)
+        if args.out_dir is not None:
+            args.out_dir.mkdir(parents=True, exist_ok=True)
+            plotfiles = [args.out_dir / "{}.pdf".format(name) for name in tables]
+            if args.jobs > 1:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+                    list(executor.map(save_plot, tables.keys(), tables.values(), plotfiles, [args.timeout] * len(tables)))
+            else:
+                for (name, benchmark_tables), plotfile in zip(tables.items(), plotfiles):
+                    save_plot(name, benchmark_tables, plotfile, args.timeout)
+        elif args.grid:
+            plot_grid(tables, args.timeout).savefig(args.output)
+        else:
+            save_pages(tables, args.output, args.timeout)
+        sys.exit(0)
+    if args.node_times:
+        policy = args.inputs[0]
+        plotfile = args.inputs[1] if len(args.inputs) > 1 else "plot.pdf"
+        node_times = results_db.query_node_times(results_db.connect(args.db), policy)
+        fig = plot_node_times(node_times, title=policy)
+        fig.savefig(plotfile)
+        sys.exit(0)
+    if args.db is not None:
+        policy = args.inputs[0]
+        modular_table = read_db(args.db, policy, is_mono=False)
+        mono_table = read_db(args.db, policy, is_mono=True)
+    else:
+        modular_table = read_dat(args.inputs[0])
+        mono_table = read_dat(args.inputs[1])
+    rest = args.inputs[ntables:]
+    plotfile = rest[0] if len(rest) > 0 else "plot.pdf"
+    timeout = float(rest[1]) if len(rest) > 1 else None
     fig = plot_modular_vs_mono(modular_table, mono_table, timeout)
     # plt.show()
     fig.savefig(plotfile)
@@ -0,0 +1,621 @@
+# Store and query benchmark results in an SQLite database.
+# run_all.py records every run it makes here; make_dat.py and plot.py can read results back
+# with --db instead of re-parsing logs.
+
+import datetime
+import os
+import pathlib
+import sqlite3
+import subprocess
+import sys
+from array import array
+from typing import Optional
+
+# the default location of the database, alongside the .dat files
+DEFAULT_DB = pathlib.Path("results", "timepiece.db")
+
+# map Timepiece's table headers to database columns (which cannot start with a digit)
+COLUMNS = {
+    "n": "n",
+    "max": "max",
+    "min": "min",
+    "avg": "avg",
+    "med": "med",
+    "99p": "p99",
+    "total": "total",
+    "wall": "wall",
+}
+
+# summaries of each run's resource use (see Telemetry), added to its table rows when known
+RUN_COLUMNS = ["peak_rss", "cpu_util"]
+
+# the roles of nodes in a fat-tree, which name their nodes "{role}-{index}";
+# nodes named otherwise have the role "other"
+ROLES = ["core", "aggregation", "edge", "other"]
+
+# each migration brings the schema up to the version of its index + 1
+MIGRATIONS = [
+    """
+    CREATE TABLE runs (
+        id INTEGER PRIMARY KEY,
+        -- the benchmark or query run
+        policy TEXT NOT NULL,
+        -- the size of the benchmark (the number of pods), if any
+        size INTEGER,
+        trial INTEGER NOT NULL,
+        -- 'modular' or 'mono'
+        mode TEXT NOT NULL,
+        -- the options passed to the DLL, space-separated
+        options TEXT NOT NULL,
+        -- the number of cores on the host and the number available to the run
+        host_cores INTEGER,
+        cores INTEGER,
+        -- ISO 8601 UTC time the run started
+        started TEXT NOT NULL,
+        git_rev TEXT,
+        -- the name of the run's Response
+        response TEXT NOT NULL,
+        log_file TEXT
+    );
+    CREATE TABLE results (
+        run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+        n INTEGER,
+        max REAL,
+        min REAL,
+        avg REAL,
+        med REAL,
+        p99 REAL,
+        total REAL,
+        wall REAL
+    );
+    CREATE INDEX runs_policy ON runs(policy);
+    CREATE INDEX runs_size ON runs(size);
+    CREATE INDEX runs_trial ON runs(trial);
+    CREATE INDEX runs_mode ON runs(mode);
+    CREATE INDEX runs_options ON runs(options);
+    CREATE INDEX runs_host_cores ON runs(host_cores);
+    CREATE INDEX runs_started ON runs(started);
+    CREATE INDEX runs_git_rev ON runs(git_rev);
+    CREATE INDEX runs_policy_mode_size ON runs(policy, mode, size);
+    CREATE INDEX results_run_id ON results(run_id);
+    """,
+    """
+    -- the time taken to check each node of a run, as parallel arrays (see NodeTimes)
+    CREATE TABLE node_times (
+        run_id INTEGER PRIMARY KEY REFERENCES runs(id) ON DELETE CASCADE,
+        -- newline-separated node names
+        nodes TEXT NOT NULL,
+        -- one byte per node: an index into ROLES
+        roles BLOB NOT NULL,
+        -- one little-endian 64-bit integer per node: the time in milliseconds
+        ms BLOB NOT NULL
+    );
+    """,
+    """
+    -- the name of the campaign the run belongs to, if any (see run_all.py --campaign)
+    ALTER TABLE runs ADD COLUMN campaign TEXT;
+    CREATE INDEX runs_campaign ON runs(campaign, options, size, trial);
+    """,
+    """
+    -- 1 if the run was served by a warm worker process that had already run a job, 0 (or NULL) if cold
+    ALTER TABLE runs ADD COLUMN warm INTEGER;
+    """,
+    """
+    -- the peak resident set size of the run's process in kB,
+    -- and the CPU time it used per unit of wall-clock time (see Telemetry.peak_rss and Telemetry.cpu_util)
+    ALTER TABLE runs ADD COLUMN peak_rss INTEGER;
+    ALTER TABLE runs ADD COLUMN cpu_util REAL;
+    -- the resource use of the run's process sampled over time, as parallel arrays (see Telemetry)
+    CREATE TABLE telemetry (
+        run_id INTEGER PRIMARY KEY REFERENCES runs(id) ON DELETE CASCADE,
+        -- the sampling interval in seconds
+        interval REAL NOT NULL,
+        -- one little-endian 64-bit integer per sample for each field
+        ms BLOB NOT NULL,
+        rss BLOB NOT NULL,
+        peak_rss BLOB NOT NULL,
+        utime BLOB NOT NULL,
+        stime BLOB NOT NULL,
+        threads BLOB NOT NULL,
+        voluntary_switches BLOB NOT NULL,
+        involuntary_switches BLOB NOT NULL
+    );
+    """,
+    """
+    -- the exit code of the run's process, or minus the signal that killed it (as in Python's subprocess), if known
+    ALTER TABLE runs ADD COLUMN exit_code INTEGER;
+    """,
+    """
+    -- 1 if the run was part of a strong-scaling study (see run_all.py --scaling), which queries leave out by default
+    ALTER TABLE runs ADD COLUMN scaling INTEGER;
+    """,
+]
+
+
+class NodeTimes:
+    """
+    The time taken to check each node of a run,
+    stored as parallel arrays of node names, role indices (into ROLES) and times in milliseconds.
+    """
+
+    def __init__(self):
+        self.nodes: list[str] = []
+        self.roles = array("B")
+        self.ms = array("q")
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @staticmethod
+    def role(node: str) -> int:
+        """Return the index of the role of the given node in ROLES."""
+        prefix, _, index = node.rpartition("-")
+        if index.isdigit() and prefix in ROLES:
+            return ROLES.index(prefix)
+        return ROLES.index("other")
+
+    def append(self, node: str, ms: int):
+        self.nodes.append(node)
+        self.roles.append(NodeTimes.role(node))
+        self.ms.append(ms)
+
+    def by_role(self) -> dict[str, list[int]]:
+        """Return the times of the nodes of each role present."""
+        times = {}
+        for role, ms in zip(self.roles, self.ms):
+            times.setdefault(ROLES[role], []).append(ms)
+        return times
+
+    def to_blobs(self) -> tuple[str, bytes, bytes]:
+        """Return the database representation of the times."""
+        ms = array("q", self.ms)
+        if sys.byteorder != "little":
+            ms.byteswap()
+        return "\n".join(self.nodes), self.roles.tobytes(), ms.tobytes()
+
+    @classmethod
+    def from_blobs(cls, nodes: str, roles: bytes, ms: bytes) -> "NodeTimes":
+        """Return the times given their database representation."""
+        times = cls()
+        times.nodes = nodes.split("\n") if nodes else []
+        times.roles.frombytes(roles)
+        times.ms.frombytes(ms)
+        if sys.byteorder != "little":
+            times.ms.byteswap()
+        return times
+
+
+class Telemetry:
+    """
+    The resource use of a run's process sampled every `interval` seconds,
+    stored as parallel arrays with one integer per sample for each of FIELDS.
+    """
+
+    # the time of the sample in milliseconds since sampling started,
+    # the resident set size and its peak so far in kB, the user and system CPU time used in milliseconds,
+    # the number of threads and the numbers of voluntary and involuntary context switches
+    FIELDS = [
+        "ms",
+        "rss",
+        "peak_rss",
+        "utime",
+        "stime",
+        "threads",
+        "voluntary_switches",
+        "involuntary_switches",
+    ]
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.series = {field: array("q") for field in Telemetry.FIELDS}
+        # the peak RSS in kB and the CPU and wall-clock time in milliseconds of the whole run, if known,
+        # which are summarized in place of the samples (see `set_totals`)
+        self.totals: dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.series["ms"])
+
+    def append(self, **sample: int):
+        for field in Telemetry.FIELDS:
+            self.series[field].append(sample[field])
+
+    def set_totals(self, peak_rss: int, cpu_ms: int, wall_ms: int):
+        """
+        Set the totals of the whole run, e.g. from the resource usage of its process once it has exited,
+        which unlike the samples include the time after the last sample (and any run shorter than the interval).
+        """
+        self.totals = {"peak_rss": peak_rss, "cpu_ms": cpu_ms, "wall_ms": wall_ms}
+
+    def peak_rss(self) -> Optional[int]:
+        """Return the peak resident set size in kB of the whole run if known, otherwise of the samples."""
+        if "peak_rss" in self.totals:
+            return self.totals["peak_rss"]
+        return max(self.series["peak_rss"], default=None)
+
+    def cpu_util(self) -> Optional[float]:
+        """
+        Return the CPU time used per unit of wall-clock time (e.g. 4.0 if the process kept 4 cores busy)
+        over the whole run if known, otherwise between the first and last samples, if at least two were taken.
+        """
+        if self.totals.get("wall_ms"):
+            return self.totals["cpu_ms"] / self.totals["wall_ms"]
+        ms = self.series["ms"]
+        if len(ms) < 2 or ms[-1] <= ms[0]:
+            return None
+        cpu = [u + s for u, s in zip(self.series["utime"], self.series["stime"])]
+        return (cpu[-1] - cpu[0]) / (ms[-1] - ms[0])
+
+    def summary(self) -> dict[str, float]:
+        """Return the known summaries in RUN_COLUMNS."""
+        summary = {"peak_rss": self.peak_rss(), "cpu_util": self.cpu_util()}
+        return {k: float(v) for k, v in summary.items() if v is not None}
+
+    def to_blobs(self) -> list[bytes]:
+        """Return the database representation of each field's series."""
+        blobs = []
+        for field in Telemetry.FIELDS:
+            series = array("q", self.series[field])
+            if sys.byteorder != "little":
+                series.byteswap()
+            blobs.append(series.tobytes())
+        return blobs
+
+    @classmethod
+    def from_blobs(cls, interval: float, blobs) -> "Telemetry":
+        """Return the samples given their database representation."""
+        telemetry = cls(interval)
+        for field, blob in zip(Telemetry.FIELDS, blobs):
+            telemetry.series[field].frombytes(blob)
+            if sys.byteorder != "little":
+                telemetry.series[field].byteswap()
+        return telemetry
+
+
+def connect(path=DEFAULT_DB) -> sqlite3.Connection:
+    """
+    Open the results database at the given path, creating it or bringing its schema up to date if necessary.
+    """
+    path = pathlib.Path(path)
+    if not path.parent.exists():
+        path.parent.mkdir(parents=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    (version,) = conn.execute("PRAGMA user_version").fetchone()
+    for i, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with conn:
+            conn.executescript(migration)
+            conn.execute("PRAGMA user_version = {}".format(i))
+    return conn
+
+
+def git_revision() -> Optional[str]:
+    """
+    Return the git revision of Timepiece being benchmarked:
+    the TIMEPIECE_GIT_REV environment variable if set, otherwise the HEAD of this script's repository (if any).
+    """
+    if "TIMEPIECE_GIT_REV" in os.environ:
+        return os.environ["TIMEPIECE_GIT_REV"]
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=pathlib.Path(__file__).parent,
+            capture_output=True,
+            text=True,
+        )
+    except OSError:
+        return None
+    return proc.stdout.strip() if proc.returncode == 0 else None
+
+
+def policy_and_mode(options: list[str]) -> tuple[str, str]:
+    """
+    Return the policy (the benchmark or query) and mode ('mono' or 'modular') given by the DLL options.
+    The policy is the last positional argument, ignoring the values of options that take one.
+    """
+    valued = {"-k", "--size", "-d", "--dest", "-P", "--max-prefixes"}
+    positional = []
+    skip = False
+    for option in options:
+        if skip:
+            skip = False
+        elif option in valued:
+            skip = True
+        elif not option.startswith("-"):
+            positional.append(option)
+    policy = positional[-1] if positional else ""
+    mode = "mono" if "-m" in options else "modular"
+    return policy, mode
+
+
+def record_run(
+    conn: sqlite3.Connection,
+    options: list[str],
+    size: Optional[int],
+    trial: int,
+    started: datetime.datetime,
+    response: str,
+    rows: list[dict[str, float]],
+    cores: Optional[int] = None,
+    log_file=None,
+    git_rev: Optional[str] = None,
+    node_times: Optional[NodeTimes] = None,
+    campaign: Optional[str] = None,
+    warm: Optional[bool] = None,
+    telemetry: Optional[Telemetry] = None,
+    exit_code: Optional[int] = None,
+    scaling: bool = False,
+) -> int:
+    """
+    Record a run of the DLL with the given options, its table rows and (if given) its per-node times
+    and the resource use of its process.
+    `warm` says whether the run reused a worker process that had already run a job,
+    and `exit_code` is the exit code of the run (negative if its process was killed by a signal).
+    `scaling` marks a run of a strong-scaling study, on fewer cores than it would otherwise be given.
+    Return the id of the new run.
+    """
+    policy, mode = policy_and_mode(options)
+    summary = {} if telemetry is None else telemetry.summary()
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO runs"
+            " (policy, size, trial, mode, options, host_cores, cores, started, git_rev, response, log_file, campaign, warm,"
+            " peak_rss, cpu_util, exit_code, scaling) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                policy,
+                size,
+                trial,
+                mode,
+                " ".join(options),
+                os.cpu_count(),
+                cores,
+                started.isoformat(),
+                git_rev,
+                response,
+                None if log_file is None else str(log_file),
+                campaign,
+                None if warm is None else int(warm),
+                summary.get("peak_rss"),
+                summary.get("cpu_util"),
+                exit_code,
+                int(scaling),
+            ),
+        )
+        run_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT INTO results (run_id, {}) VALUES (?, {})".format(
+                ", ".join(COLUMNS[h] for h in COLUMNS),
+                ", ".join("?" for _ in COLUMNS),
+            ),
+            [(run_id, *(row.get(h) for h in COLUMNS)) for row in rows],
+        )
+        if node_times:
+            conn.execute(
+                "INSERT INTO node_times (run_id, nodes, roles, ms) VALUES (?, ?, ?, ?)",
+                (run_id, *node_times.to_blobs()),
+            )
+        if telemetry:
+            conn.execute(
+                "INSERT INTO telemetry (run_id, interval, {}) VALUES (?, ?, {})".format(
+                    ", ".join(Telemetry.FIELDS), ", ".join("?" for _ in Telemetry.FIELDS)
+                ),
+                (run_id, telemetry.interval, *telemetry.to_blobs()),
+            )
+    return run_id
+
+
+def to_rows(cursor) -> list[dict[str, float]]:
+    """
+    Return the table rows selected by the given cursor as the COLUMNS of results followed by the RUN_COLUMNS,
+    with keys named as in Timepiece's tables and unknown values left out.
+    """
+    headers = list(COLUMNS) + RUN_COLUMNS
+    return [
+        {h: float(v) for h, v in zip(headers, row) if v is not None} for row in cursor
+    ]
+
+
+def row_columns() -> str:
+    """Return the SQL selecting the columns read by `to_rows` from results joined with runs."""
+    return ", ".join(
+        ["results.{}".format(c) for c in COLUMNS.values()]
+        + ["runs.{}".format(c) for c in RUN_COLUMNS]
+    )
+
+
+def completed_runs(
+    conn: sqlite3.Connection, campaign: str, options: list[str], responses
+) -> dict[tuple[Optional[int], int], tuple[str, list[dict[str, float]]]]:
+    """
+    Return the response and table rows of each (size, trial) of the given campaign run with the given options,
+    taking the latest run of each whose response is one of the given `responses` (other than scaling runs).
+    """
+    responses = list(responses)
+    cursor = conn.execute(
+        "SELECT id, size, trial, response FROM runs"
+        " WHERE campaign = ? AND options = ? AND COALESCE(scaling, 0) = 0 AND response IN ({})"
+        " ORDER BY started".format(
+            ", ".join("?" for _ in responses)
+        ),
+        [campaign, " ".join(options)] + responses,
+    )
+    # later runs replace earlier ones
+    latest = {(size, trial): (run_id, response) for run_id, size, trial, response in cursor}
+    completed = {}
+    for job, (run_id, response) in latest.items():
+        rows = conn.execute(
+            "SELECT {} FROM results JOIN runs ON results.run_id = runs.id"
+            " WHERE results.run_id = ? ORDER BY results.rowid".format(row_columns()),
+            (run_id,),
+        )
+        completed[job] = (response, to_rows(rows))
+    return completed
+
+
+class Recorder:
+    """
+    Record runs in a results database, tagged with the current git revision and (optionally) a campaign name.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, campaign: Optional[str] = None):
+        self.conn = conn
+        self.campaign = campaign
+        self.git_rev = git_revision()
+
+    def record(self, options: list[str], size: Optional[int], trial: int, started, response: str, rows, **kwargs):
+        """Record a run as in `record_run`."""
+        return record_run(
+            self.conn,
+            options,
+            size,
+            trial,
+            started,
+            response,
+            rows,
+            git_rev=self.git_rev,
+            campaign=self.campaign,
+            **kwargs,
+        )
+
+    def completed(self, options: list[str], responses):
+        """Return the completed runs of the campaign as in `completed_runs` (none if there is no campaign)."""
+        if self.campaign is None:
+            return {}
+        return completed_runs(self.conn, self.campaign, options, responses)
+
+
+def run_conditions(
+    policy: str,
+    mode: str,
+    options: Optional[str] = None,
+    git_rev: Optional[str] = None,
+    since: Optional[str] = None,
+    warm: Optional[bool] = None,
+    cores: Optional[int] = None,
+    host_cores: Optional[int] = None,
+    scaling: Optional[bool] = False,
+    response: Optional[str] = None,
+) -> tuple[list[str], list]:
+    """Return the SQL conditions (and their parameters) selecting runs as described in `query_rows`."""
+    conditions = ["runs.policy = ?", "runs.mode = ?"]
+    params = [policy, mode]
+    if options is not None:
+        conditions.append("runs.options = ?")
+        params.append(options)
+    if git_rev is not None:
+        conditions.append("runs.git_rev = ?")
+        params.append(git_rev)
+    if since is not None:
+        conditions.append("runs.started >= ?")
+        params.append(since)
+    if warm is not None:
+        # runs recorded before workers existed were all cold
+        conditions.append("COALESCE(runs.warm, 0) = ?")
+        params.append(int(warm))
+    if cores is not None:
+        conditions.append("runs.cores = ?")
+        params.append(cores)
+    if host_cores is not None:
+        conditions.append("runs.host_cores = ?")
+        params.append(host_cores)
+    if scaling is not None:
+        # runs recorded before scaling studies existed were not part of one
+        conditions.append("COALESCE(runs.scaling, 0) = ?")
+        params.append(int(scaling))
+    if response is not None:
+        conditions.append("runs.response = ?")
+        params.append(response)
+    return conditions, params
+
+
+def query_rows(
+    conn: sqlite3.Connection, policy: str, mode: str, **filters
+) -> list[dict[str, float]]:
+    """
+    Return the table rows of every run of the given policy and mode, ordered by size, trial and start time,
+    with keys named as in Timepiece's tables (plus the run's resource use summaries, if sampled).
+    Optionally restrict to runs with exactly the given `options`, of the given `git_rev`ision,
+    or started no earlier than the given ISO 8601 time (`since`),
+    or to runs that did (or did not) reuse a `warm` worker process,
+    or to runs given the given number of `cores` or on a host with the given number (`host_cores`),
+    or to runs with the given `response` (the name of a run_all.Response).
+    Runs of strong-scaling studies are left out, as they are given fewer cores than usual,
+    unless `scaling` is True (to only return them) or None (to return every run).
+    """
+    conditions, params = run_conditions(policy, mode, **filters)
+    cursor = conn.execute(
+        "SELECT {} FROM results JOIN runs ON results.run_id = runs.id WHERE {}"
+        " ORDER BY runs.size, results.n, runs.trial, runs.started".format(
+            row_columns(), " AND ".join(conditions)
+        ),
+        params,
+    )
+    return to_rows(cursor)
+
+
+def query_node_times(
+    conn: sqlite3.Connection, policy: str, mode: str = "modular", **filters
+) -> list[tuple[Optional[int], int, NodeTimes]]:
+    """
+    Return the size, number of nodes and per-node times of the runs of the given policy and mode,
+    keeping the run with the smallest total time for each number of nodes, ordered by number of nodes.
+    Runs are filtered as in `query_rows`.
+    """
+    conditions, params = run_conditions(policy, mode, **filters)
+    cursor = conn.execute(
+        "SELECT runs.size, results.n, results.total, node_times.nodes, node_times.roles, node_times.ms"
+        " FROM node_times JOIN runs ON node_times.run_id = runs.id"
+        " JOIN results ON results.run_id = runs.id WHERE {} ORDER BY results.n, results.total".format(
+            " AND ".join(conditions)
+        ),
+        params,
+    )
+    best = {}
+    for size, n, _, nodes, roles, ms in cursor:
+        # rows are ordered by total time, so the first for each n is the fastest
+        if n not in best:
+            best[n] = (size, n, NodeTimes.from_blobs(nodes, roles, ms))
+    return [best[n] for n in sorted(best)]
+
+
+def query_node_time_history(
+    conn: sqlite3.Connection, policy: str, mode: str = "modular", size: Optional[int] = None, **filters
+) -> list[tuple[Optional[int], NodeTimes]]:
+    """
+    Return the size and per-node times of every successful run of the given policy and mode
+    (of the given size, if any), most recent first.
+    Runs are filtered as in `query_rows`.
+    """
+    # runs cut short have no times for the nodes they did not finish
+    conditions, params = run_conditions(policy, mode, response="SUCCESS", **filters)
+    if size is not None:
+        conditions.append("runs.size = ?")
+        params.append(size)
+    cursor = conn.execute(
+        "SELECT runs.size, node_times.nodes, node_times.roles, node_times.ms"
+        " FROM node_times JOIN runs ON node_times.run_id = runs.id WHERE {}"
+        " ORDER BY runs.started DESC, runs.id DESC".format(" AND ".join(conditions)),
+        params,
+    )
+    return [(size, NodeTimes.from_blobs(nodes, roles, ms)) for size, nodes, roles, ms in cursor]
+
+
+def query_telemetry(conn: sqlite3.Connection, run_id: int) -> Optional[Telemetry]:
+    """Return the resource use sampled during the given run, if any."""
+    row = conn.execute(
+        "SELECT interval, {} FROM telemetry WHERE run_id = ?".format(", ".join(Telemetry.FIELDS)),
+        (run_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    return Telemetry.from_blobs(row[0], row[1:])
+
+
+def policies(conn: sqlite3.Connection, mode: Optional[str] = None) -> list[str]:
+    """Return the policies with recorded runs (in the given mode, if any)."""
+    if mode is None:
+        cursor = conn.execute("SELECT DISTINCT policy FROM runs ORDER BY policy")
+    else:
+        cursor = conn.execute(
+            "SELECT DISTINCT policy FROM runs WHERE mode = ? ORDER BY policy", (mode,)
+        )
+    return [row[0] for row in cursor]
@@ -5,39 +5,106 @@
 import argparse
 import csv
 import datetime
+import fnmatch
 import itertools
+import json
+import math
 import pathlib
+import os
 import re
+import shlex
 import subprocess
 import sys
+import tempfile
+import threading
+import time
 from enum import Enum
+from typing import Optional
 
+import node_order
+import results_db
+import slice_angler
+import stats
+import stats_stream
+import work_queue
+from make_dat import available_cpus
 
-def table_pattern_to_rows(s: str, pat: re.Pattern[str]) -> list[dict[str, float]]:
+# table headers printed by Timepiece for modular and monolithic benchmarks
+MOD_HEADER = "n\tmax\tmin\tavg\tmed\t99p\ttotal\twall"
+MONO_HEADER = "n\ttotal"
+# line printed by Timepiece for each node's check time when run with --node-times
+NODE_TIME_PAT = re.compile(r"^(\S+) took (\d+)ms$")
+# the maximum number of bytes of output to read at once: longer lines are read in pieces
+CHUNK_SIZE = 1 << 16
+# how often (in seconds) to flush streamed output to the log file
+FLUSH_INTERVAL = 0.5
+# prefix of the line printed by a worker process when it finishes a job (see Timepiece/Worker.cs)
+WORKER_MARKER = b"##timepiece-worker"
+
+
+class TableParser:
     """
-    Convert the given text representing a one-row table
-    to dictionary rows according to the specified pattern.
-    The pattern should have two match groups: one for the table header,
-    and one for the table data.
+    Incrementally collect the rows of the one-row tables with the given header
+    from a stream of output lines.
     """
-    return [
-        dict(zip(match[1].split("\t"), map(float, match[2].split("\t"))))
-        for match in pat.finditer(s)
-    ]
+
+    def __init__(self, header: str):
+        self.header = header
+        self.rows: list[dict[str, float]] = []
+        self._after_header = False
+
+    def feed(self, line: str):
+        """Parse the next complete line of output."""
+        line = line.rstrip("\r\n")
+        if self._after_header:
+            self._after_header = False
+            try:
+                values = list(map(float, line.split("\t")))
+            except ValueError:
+                # not a table after all
+                pass
+            else:
+                self.rows.append(dict(zip(self.header.split("\t"), values)))
+        self._after_header = line == self.header
+
+    def reset(self):
+        """Forget any header seen, e.g. after part of an overlong line."""
+        self._after_header = False
 
 
 class Response(Enum):
     SUCCESS = 0
     USER_INTERRUPT = 1
     TIMEOUT = 2
+    # the process exited with a nonzero code, e.g. it crashed or was killed for running out of memory
+    FAILED = 3
 
 
-def tee_output(output, output_file):
-    """Print output and write to file if given."""
-    if isinstance(output, bytes):
-        print(output.decode("utf-8"))
-    else:
-        print(output)
+# responses of jobs that do not need to be rerun when resuming a campaign (failed jobs are rerun)
+FINISHED = (Response.SUCCESS.name, Response.TIMEOUT.name)
+# the runtime settings swept by --tune: each knob's settings other than the default, as the environment variables
+# setting them (see https://learn.microsoft.com/en-us/dotnet/core/runtime-config/ and Timepiece/RuntimeSettings.cs)
+TUNING_KNOBS = {
+    "server-gc": [{"DOTNET_gcServer": "1"}],
+    "concurrent-gc": [{"DOTNET_gcConcurrent": "0"}],
+    "tiered-compilation": [{"DOTNET_TieredCompilation": "0"}],
+    "tiered-pgo": [{"DOTNET_TieredPGO": "0"}],
+    "ready-to-run": [{"DOTNET_ReadyToRun": "0"}],
+    # sizes in bytes, in hexadecimal as the runtime reads them: 64 MiB and 256 MiB
+    "gen0-size": [{"DOTNET_GCgen0size": "0x4000000"}, {"DOTNET_GCgen0size": "0x10000000"}],
+    # 4 GiB and 16 GiB
+    "heap-limit": [{"DOTNET_GCHeapHardLimit": "0x100000000"}, {"DOTNET_GCHeapHardLimit": "0x400000000"}],
+    "zen-stack": [{"TIMEPIECE_ZEN_STACK_SIZE": "10000000"}, {"TIMEPIECE_ZEN_STACK_SIZE": "100000000"}],
+}
+
+
+def tee_output(output, output_file, echo=True):
+    """Print output (unless `echo` is false) and write to file if given."""
+    if echo:
+        if isinstance(output, bytes):
+            print(output.decode("utf-8"))
+        else:
+            print(output)
     if output_file is not None:
         # 'ab': append bytes to the end of the file
         mode = "ab" if isinstance(output, bytes) else "a"
@@ -49,45 +116,728 @@ def tee_output(output, output_file):
             f.write(output)
 
 
-def run_dotnet(dll_file, options, timeout, output_file) -> tuple[Response, list[dict]]:
+class OutputStream:
+    """
+    Tee the output of a process to stdout (unless `echo` is false) and to an output file (if given)
+    as it arrives, parsing it for table rows along the way.
+    Output is read in chunks of at most CHUNK_SIZE bytes, so memory use is bounded
+    no matter how much the process prints.
+    If `node_times` is given, any per-node check times in the output are added to it.
+    """
+
+    def __init__(self, output_file, header: str, echo=True, node_times=None):
+        self.echo = echo
+        self.parser = TableParser(header)
+        self.node_times = node_times
+        self._file = None if output_file is None else open(output_file, "ab")
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        # true if the last chunk written did not end a line
+        self._partial = False
+
+    def write(self, chunk: bytes):
+        """Write a chunk of output (a line or part of one)."""
+        with self._lock:
+            if self._file is not None:
+                self._file.write(chunk)
+                now = time.monotonic()
+                if now - self._last_flush >= FLUSH_INTERVAL:
+                    self._file.flush()
+                    self._last_flush = now
+            text = chunk.decode("utf-8", errors="replace")
+            if self.echo:
+                sys.stdout.write(text)
+            # only whole lines can be table rows
+            if self._partial or not chunk.endswith(b"\n"):
+                self.parser.reset()
+            else:
+                self.parser.feed(text)
+                if self.node_times is not None:
+                    match = NODE_TIME_PAT.match(text)
+                    if match is not None:
+                        self.node_times.append(match[1], int(match[2]))
+            self._partial = not chunk.endswith(b"\n")
+
+    def note(self, line: str):
+        """Print a line of our own to stdout only (if echoing), e.g. the progress of the process."""
+        with self._lock:
+            if self.echo:
+                sys.stdout.write(("\n" if self._partial else "") + line + "\n")
+                sys.stdout.flush()
+
+    def write_line(self, line: str):
+        """Write a line of our own (not the process's) output."""
+        with self._lock:
+            if self._partial:
+                line = "\n" + line
+        self.write((line + "\n").encode("utf-8"))
+
+    def pump(self, stream):
+        """Copy the given binary stream until it closes."""
+        for chunk in iter(lambda: stream.readline(CHUNK_SIZE), b""):
+            self.write(chunk)
+
+    def close(self):
+        """Flush and close the output file."""
+        with self._lock:
+            if self.echo:
+                sys.stdout.flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def exited(proc, timeout) -> bool:
+    """
+    Wait up to `timeout` seconds (or forever, if None) for the process to exit, returning whether it has.
+    Unlike Popen.wait, the process is not reaped, so its resource usage can still be read by `reap`
+    (except on platforms without os.waitid, e.g. macOS and Windows, where Popen.wait is used instead).
+    """
+    if not hasattr(os, "waitid"):
+        try:
+            proc.wait(timeout=timeout)
+            return True
+        except subprocess.TimeoutExpired:
+            return False
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = 0.0005
+    while os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is None:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            return False
+        delay = min(delay * 2, 0.05) if remaining is None else min(delay * 2, remaining, 0.05)
+        time.sleep(delay)
+    return True
+
+
+def reap(proc, telemetry=None, started=None):
+    """
+    Wait for the process to exit and reap it, setting its returncode as Popen.wait does.
+    If a results_db.Telemetry is given, set its totals from the resource usage of the whole process
+    (with its wall-clock time measured from `started`, a time.monotonic() time).
+    Where the process was already reaped by `exited`, or os.wait4 is not available, no totals are set.
+    """
+    if proc.returncode is not None or not hasattr(os, "wait4"):
+        return proc.wait()
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if telemetry is not None and started is not None:
+        telemetry.set_totals(
+            # in kB on Linux
+            peak_rss=usage.ru_maxrss,
+            cpu_ms=int((usage.ru_utime + usage.ru_stime) * 1000),
+            wall_ms=int((time.monotonic() - started) * 1000),
+        )
+    return proc.returncode
+
+
+def wait(proc, timeout, cancel=None, done=None):
+    """
+    Wait up to `timeout` seconds for the process to exit (without reaping it: see `reap`),
+    or if `done` (a threading.Event) is given, for it to be set.
+    If `cancel` is given, poll it while waiting and raise KeyboardInterrupt once it is set,
+    so that cancelled jobs are killed the same way as jobs interrupted by the user.
+    """
+
+    def wait_for(t):
+        """Wait up to `t` seconds, returning whether we are done."""
+        if done is not None:
+            return done.wait(t)
+        return exited(proc, t)
+
+    if cancel is None:
+        if not wait_for(timeout):
+            raise subprocess.TimeoutExpired(proc.args, timeout)
+        return
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        if cancel.is_set():
+            raise KeyboardInterrupt
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            raise subprocess.TimeoutExpired(proc.args, timeout)
+        if wait_for(1 if remaining is None else min(1, remaining)):
+            return
+
+
+def available_cpu_ids() -> list[int]:
+    """
+    Return the CPUs this process may run on,
+    or on platforms without CPU affinity, as many numbers as there are CPUs (see `set_affinity`).
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(available_cpus()))
+
+
+def set_affinity(cpus):
+    """
+    Restrict this thread (and the processes it starts, which inherit its affinity) to the given CPUs,
+    where CPU affinity is supported: elsewhere, runs are only limited by their DOTNET_PROCESSOR_COUNT.
+    """
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+
+def proc_status(path) -> dict[str, int]:
+    """Return the numeric fields of a /proc status file (sizes are in kB)."""
+    status = {}
+    with open(path) as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            value = value.split()
+            if value and value[0].isdigit():
+                status[key] = int(value[0])
+    return status
+
+
+class Sampler:
+    """
+    Sample the resource use of a running process from /proc every `telemetry.interval` seconds
+    into the given results_db.Telemetry, on a thread of its own.
+    Context switches are summed over all the threads of the process.
+    Nothing is sampled if /proc cannot be read (e.g. when not running on Linux).
+    """
+
+    def __init__(self, pid: int, telemetry):
+        self.pid = pid
+        self.telemetry = telemetry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._start = time.monotonic()
+
+    def start(self, reset_peak=False):
+        """
+        Take a first sample and start sampling.
+        If `reset_peak` is set, first reset the peak RSS of the process, e.g. for a worker starting a new job.
+        """
+        if reset_peak:
+            try:
+                with open("/proc/{}/clear_refs".format(self.pid), "w") as f:
+                    f.write("5")
+            except OSError:
+                pass
+        self._start = time.monotonic()
+        if self.sample():
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.telemetry.interval):
+            if not self.sample():
+                return
+
+    def sample(self) -> bool:
+        """Take a sample, returning false if the process could not be read (e.g. as it has exited)."""
+        proc = "/proc/{}".format(self.pid)
+        try:
+            status = proc_status(proc + "/status")
+            with open(proc + "/stat") as f:
+                stat = f.read()
+            # the fields after the command name (which may contain spaces) start at field 3:
+            # utime and stime are fields 14 and 15, in clock ticks
+            fields = stat[stat.rindex(")") + 2 :].split()
+            ticks = os.sysconf("SC_CLK_TCK")
+            utime, stime = (int(fields[i]) * 1000 // ticks for i in (11, 12))
+            voluntary, involuntary = 0, 0
+            for tid in os.listdir(proc + "/task"):
+                try:
+                    task = proc_status("{}/task/{}/status".format(proc, tid))
+                except OSError:
+                    # the thread has exited
+                    continue
+                voluntary += task.get("voluntary_ctxt_switches", 0)
+                involuntary += task.get("nonvoluntary_ctxt_switches", 0)
+            self.telemetry.append(
+                ms=int((time.monotonic() - self._start) * 1000),
+                # exited (zombie) processes have no memory fields
+                rss=status["VmRSS"],
+                peak_rss=status["VmHWM"],
+                utime=utime,
+                stime=stime,
+                threads=status["Threads"],
+                voluntary_switches=voluntary,
+                involuntary_switches=involuntary,
+            )
+        except (OSError, ValueError, IndexError, KeyError):
+            return False
+        return True
+
+    def stop(self, sample=False):
+        """
+        Stop sampling, taking a last sample first if `sample` is set.
+        Only take a last sample of a process that has not been waited for, as its pid may since be reused.
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if sample:
+            self.sample()
+
+
+def describe_resources(telemetry) -> str:
+    """Return a line summarizing the resource use sampled in the given results_db.Telemetry."""
+    summary = telemetry.summary()
+    return "Resource use ({n} samples): peak RSS {rss}, CPU utilization {util}".format(
+        n=len(telemetry),
+        rss="unknown" if "peak_rss" not in summary else "{:.1f} MiB".format(summary["peak_rss"] / 1024),
+        util="unknown" if "cpu_util" not in summary else "{:.2f} cores".format(summary["cpu_util"]),
+    )
+
+
+class Worker:
+    """
+    A long-lived dotnet process running one job after another (see the `worker` command of each DLL),
+    so that every job after the first skips the runtime's startup and JIT compilation
+    (and for Timepiece.Angler, deserializing the file its last job read, if unchanged).
+    """
+
+    def __init__(self, dll_file, key, env=None):
+        self.key = key
+        # the worker inherits the CPU affinity of the thread that starts it
+        self.proc = subprocess.Popen(
+            ["dotnet", dll_file, "worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=env,
+        )
+        self.jobs = 0
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def pin(self, cpus):
+        """Move all of the worker's threads onto the given CPUs: threads it starts later inherit them."""
+        if not hasattr(os, "sched_setaffinity"):
+            return
+        try:
+            tids = os.listdir("/proc/{}/task".format(self.proc.pid))
+        except OSError:
+            return
+        for tid in tids:
+            try:
+                os.sched_setaffinity(int(tid), cpus)
+            except OSError:
+                # the thread has exited
+                pass
+
+    def run(
+        self, options, timeout, output: OutputStream, cancel=None, telemetry=None
+    ) -> tuple[Response, bool, Optional[int]]:
+        """
+        Run a job with the given options, writing its output to the given OutputStream
+        and killing the worker if the job times out or is interrupted (as `run_dotnet` does).
+        If a results_db.Telemetry is given, sample the worker's resource use during the job into it.
+        Return the job's response, whether it ran warm, i.e. after an earlier job,
+        and its exit code (or the worker's, if the worker died or was killed), if known.
+        """
+        warm = self.jobs > 0
+        job = {"id": self.jobs, "args": [str(o) for o in options]}
+        self.jobs += 1
+        done = threading.Event()
+        # the worker's report of the job, if it finished it
+        report = {}
+
+        def pump():
+            for chunk in iter(lambda: self.proc.stdout.readline(CHUNK_SIZE), b""):
+                marker = chunk.find(WORKER_MARKER)
+                if marker < 0:
+                    output.write(chunk)
+                    continue
+                if marker > 0:
+                    # the job's output did not end its last line
+                    output.write(chunk[:marker] + b"\n")
+                try:
+                    report.update(json.loads(chunk[marker + len(WORKER_MARKER) :]))
+                except ValueError:
+                    report["status"] = "error"
+                break
+            # the job finished (or the worker died)
+            done.set()
+
+        reader = threading.Thread(target=pump, daemon=True)
+        reader.start()
+        sampler = None
+        if telemetry is not None:
+            sampler = Sampler(self.proc.pid, telemetry)
+            sampler.start(reset_peak=True)
+        try:
+            self.proc.stdin.write(json.dumps(job).encode("utf-8") + b"\n")
+            self.proc.stdin.flush()
+        except BrokenPipeError:
+            # the worker has died: the reader will see the end of its output
+            pass
+        try:
+            wait(self.proc, timeout, cancel, done)
+            if not report:
+                code = self.proc.wait()
+                output.write_line("Worker process exited with code {}".format(code))
+                response = Response.FAILED
+            elif report.get("status") != "done":
+                code = report.get("code")
+                output.write_line("Job failed in the worker process")
+                response = Response.FAILED
+            else:
+                code = report.get("code", 0)
+                response = Response.SUCCESS
+        except KeyboardInterrupt:
+            output.write_line("Killing process...")
+            self.proc.terminate()
+            code = self.proc.wait()
+            response = Response.USER_INTERRUPT
+        except subprocess.TimeoutExpired:
+            output.write_line("Timed out after {time} seconds".format(time=timeout))
+            self.proc.kill()
+            code = self.proc.wait()
+            response = Response.TIMEOUT
+        finally:
+            if sampler is not None:
+                sampler.stop(sample=self.alive())
+            reader.join()
+        return response, warm, code
+
+    def close(self):
+        """Ask the worker to exit once it finishes its job, killing it if it does not."""
+        if self.alive():
+            try:
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        self.proc.stdout.close()
+
+
+class WorkerPool:
+    """
+    Warm worker processes for each DLL, started when no idle worker is available and reused by later jobs.
+    Workers are also told how many processors they have (DOTNET_PROCESSOR_COUNT, read once when .NET starts),
+    so they are only reused by jobs given the same number of processors;
+    a reused worker is pinned to the CPUs of the thread that takes it.
+    """
+
+    def __init__(self):
+        self._idle: dict[tuple, list[Worker]] = {}
+        self._workers: list[Worker] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, dll_file, env=None) -> Worker:
+        """Take an idle worker for the given DLL and environment, or start one."""
+        key = (str(dll_file), None if env is None else env.get("DOTNET_PROCESSOR_COUNT"))
+        with self._lock:
+            idle = [worker for worker in self._idle.get(key, []) if worker.alive()]
+            worker = idle.pop() if idle else None
+            self._idle[key] = idle
+        if worker is not None:
+            worker.pin(available_cpu_ids())
+            return worker
+        worker = Worker(dll_file, key, env)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def release(self, worker: Worker):
+        """Return a worker to the pool once its job is done (unless it died or was killed)."""
+        with self._lock:
+            if worker.alive():
+                self._idle.setdefault(worker.key, []).append(worker)
+
+    def close(self):
+        """Stop all the workers."""
+        with self._lock:
+            workers, self._workers, self._idle = self._workers, [], {}
+        for worker in workers:
+            worker.close()
+
+
+def run_dotnet(
+    dll_file,
+    options,
+    timeout,
+    output_file,
+    env=None,
+    cancel=None,
+    echo=True,
+    node_times=None,
+    pool=None,
+    info=None,
+    telemetry=None,
+) -> tuple[Response, list[dict]]:
     """
     Run dotnet for the given dll file with the given options.
     options is a list of str
     output_file is None or a file name
-    Return the return code of running the process and any collected table rows.
-    """
-    subprocess_args = ["dotnet", dll_file] + options
-    # run the process, redirecting stderr to stdout, timing out after TIMEOUT,
-    # and raising an exception if the return code is non-zero
-    proc = subprocess.Popen(subprocess_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    # regex patterns for identifying table rows for modular and monolithic benchmarks
-    if "-m" in options:  # monolithic pattern
-        output_pat = re.compile(r"^(n\ttotal)\n((?:[\d\.]+\s)*)", re.M)
-    else:  # modular pattern
-        output_pat = re.compile(
-            r"^(n\tmax\tmin\tavg\tmed\t99p\ttotal\twall)\n((?:[\d\.]+\s)*)", re.M
+    env is None (inherit the environment) or a dict of environment variables
+    cancel is None or a threading.Event which interrupts the process when set
+    node_times is None or a results_db.NodeTimes to collect any per-node check times into
+    pool is None (start a fresh process) or a WorkerPool to run the job in one of its workers
+    info is None or a dict to store details of the run in: "warm" is whether it reused a worker
+    and "exit_code" is the run's exit code (negative if its process was killed by a signal), if known
+    telemetry is None or a results_db.Telemetry to sample the process's resource use into
+    The process's output is written to stdout and the output file as it arrives,
+    so if the process times out or is interrupted, all its output up to that point is kept.
+    The table rows and per-node check times are read from the events the process writes to a stream of its own
+    (see stats_stream.py), which also report its progress to stdout while it runs (if echoing),
+    or parsed from its output if its events have none.
+    Return the return code of running the process and any collected table rows,
+    with the summaries of any sampled resource use added to each.
+    """
+    # headers for identifying table rows for modular and monolithic benchmarks
+    output = OutputStream(
+        output_file,
+        MONO_HEADER if "-m" in options else MOD_HEADER,
+        echo,
+        None if node_times is None else results_db.NodeTimes(),
+    )
+    events = stats_stream.EventFollower(node_times, output.note if echo else None)
+    # not part of the options recorded for the run
+    options = options + events.options()
+    events.start()
+    if pool is not None:
+        worker = pool.acquire(dll_file, env)
+        try:
+            response, warm, code = worker.run(options, timeout, output, cancel, telemetry)
+            output.write_line(
+                "Ran in a {} worker process".format("warm" if warm else "cold")
+            )
+        finally:
+            pool.release(worker)
+            if telemetry is not None:
+                output.write_line(describe_resources(telemetry))
+            output.write_line("")
+            output.close()
+            events.stop()
+    else:
+        subprocess_args = ["dotnet", dll_file] + options
+        started = time.monotonic()
+        # run the process, redirecting stderr to stdout, timing out after TIMEOUT
+        proc = subprocess.Popen(
+            subprocess_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env
         )
-    try:
-        output, _ = proc.communicate(timeout=timeout)
-        tee_output(output, output_file)
-        table_rows = table_pattern_to_rows(output.decode("utf-8"), output_pat)
-        return Response.SUCCESS, table_rows
-    except KeyboardInterrupt:
-        kill_output = "Killing process..."
-        tee_output(kill_output, output_file)
-        proc.terminate()
-        output, _ = proc.communicate()
-        tee_output(output, output_file)
-        table_rows = table_pattern_to_rows(output.decode("utf-8"), output_pat)
-        return Response.USER_INTERRUPT, table_rows
-    except subprocess.TimeoutExpired:
-        timeout_output = "Timed out after {time} seconds".format(time=timeout)
-        tee_output(timeout_output, output_file)
-        proc.kill()
-        output, _ = proc.communicate()
-        tee_output(output, output_file)
-        table_rows = table_pattern_to_rows(output.decode("utf-8"), output_pat)
-        return Response.TIMEOUT, table_rows
+        sampler = None
+        if telemetry is not None:
+            sampler = Sampler(proc.pid, telemetry)
+            sampler.start()
+        reader = threading.Thread(target=output.pump, args=(proc.stdout,), daemon=True)
+        reader.start()
+        try:
+            wait(proc, timeout, cancel)
+            if reap(proc, telemetry, started) != 0:
+                # e.g. killed for running out of memory
+                output.write_line("Process exited with code {}".format(proc.returncode))
+                response = Response.FAILED
+            else:
+                response = Response.SUCCESS
+        except KeyboardInterrupt:
+            output.write_line("Killing process...")
+            proc.terminate()
+            reap(proc, telemetry, started)
+            response = Response.USER_INTERRUPT
+        except subprocess.TimeoutExpired:
+            output.write_line("Timed out after {time} seconds".format(time=timeout))
+            proc.kill()
+            reap(proc, telemetry, started)
+            response = Response.TIMEOUT
+        finally:
+            if sampler is not None:
+                sampler.stop()
+            # collect whatever the process wrote before it exited
+            reader.join()
+            proc.stdout.close()
+            if telemetry is not None:
+                output.write_line(describe_resources(telemetry))
+            output.write_line("")
+            output.close()
+            events.stop()
+        warm = False
+        code = proc.returncode
+    if info is not None:
+        info["warm"] = warm
+        info["exit_code"] = code
+    rows = events.rows() or output.parser.rows
+    if node_times is not None and not events.checked_nodes():
+        for node, ms in zip(output.node_times.nodes, output.node_times.ms):
+            node_times.append(node, ms)
+    if telemetry is not None:
+        for row in rows:
+            row.update(telemetry.summary())
+    return response, rows
+
+
+def telemetry_for(interval):
+    """Return a collector for the resource use of a run sampled every `interval` seconds, or None if not sampling."""
+    if interval:
+        return results_db.Telemetry(interval)
+    return None
+
+
+def benchmark_output(size, options: list[str]) -> str:
+    """Return the line logged before the first trial of a benchmark of the given size (or of an angler file if None)."""
+    if size is None:
+        return "Running benchmark with options: {options}".format(options=" ".join(options))
+    return "Running benchmark k={size} with options: {options}".format(size=size, options=" ".join(options))
+
+
+def resumed_output(trial: int, trials: int, response: str) -> str:
+    """Return the line logged in place of a trial that was already finished by an earlier run of its campaign."""
+    return "Trial {t} of {total} already finished ({response}): skipping".format(
+        t=trial, total=trials, response=response
+    )
+
+
+def node_times_for(options: list[str]):
+    """Return a collector for per-node check times if the options request them, otherwise None."""
+    if "--node-times" in options and "-m" not in options:
+        return results_db.NodeTimes()
+    return None
+
+
+def order_options(orders, options: list[str], size) -> list[str]:
+    """
+    Return the options scheduling the checks of a run of the given options and size longest-first
+    by the hint file `orders` (a node_order.NodeOrders, or None) writes for it, if any.
+    """
+    if orders is None:
+        return []
+    return orders.options(options, size)
+
+
+def fit_growth(points: list[tuple[float, float]]):
+    """
+    Fit a growth model to the given (number of nodes, time) points by least squares on the logarithm of the time,
+    trying both a power law (t = a * n^b) and an exponential (t = a * e^(b * n)).
+    Return the model that fits best as a (name, function from n to t) pair,
+    or None if there are not at least two distinct numbers of nodes with positive times.
+    With only two distinct numbers of nodes, both models fit exactly: we then use the (more conservative) power law.
+    """
+    points = [(n, t) for n, t in points if n > 0 and t > 0]
+    if len({n for n, _ in points}) < 2:
+        return None
+
+    def least_squares(xs, ys):
+        """Return the intercept, slope and sum of squared residuals of the least-squares line through the points."""
+        mean_x = sum(xs) / len(xs)
+        mean_y = sum(ys) / len(ys)
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sum(
+            (x - mean_x) ** 2 for x in xs
+        )
+        intercept = mean_y - slope * mean_x
+        residuals = sum((y - intercept - slope * x) ** 2 for x, y in zip(xs, ys))
+        return intercept, slope, residuals
+
+    log_ts = [math.log(t) for _, t in points]
+    a, b, power_residuals = least_squares([math.log(n) for n, _ in points], log_ts)
+    power = ("power", lambda n: math.exp(a + b * math.log(n)))
+    c, d, exp_residuals = least_squares([n for n, _ in points], log_ts)
+    exponential = ("exponential", lambda n: math.exp(c + d * n))
+    if len({n for n, _ in points}) > 2 and exp_residuals < power_residuals:
+        return exponential
+    return power
+
+
+class Extrapolator:
+    """
+    Predict how long a benchmark will take at each size from the times measured at other sizes
+    (in this sweep and any given history), and plan how to run it:
+    a size whose predicted time is over `margin` times the timeout is either skipped
+    (with `action` "skip") or run with the shorter `reduced_timeout` (with `action` "reduce").
+    Times are the wall-clock time of modular benchmarks and the total time of monolithic benchmarks.
+    """
+
+    def __init__(self, options, timeout, action, margin, reduced_timeout, history=()):
+        self.metric = "total" if "-m" in options else "wall"
+        self.timeout = timeout
+        self.action = action
+        self.margin = margin
+        self.reduced_timeout = reduced_timeout
+        # (number of nodes, time in ms) points
+        self.points = [(row["n"], row[self.metric]) for row in history if self.metric in row]
+
+    def observe(self, size: int, response, rows: list[dict]):
+        """Add the results of running the benchmark at the given size with the full timeout."""
+        self.points.extend((row["n"], row[self.metric]) for row in rows if self.metric in row)
+        if response == Response.TIMEOUT and not rows:
+            # the benchmark took at least as long as the timeout
+            self.points.append((fattree_nodes(size), self.timeout * 1000))
+
+    def predict(self, size: int):
+        """Return the name of the fitted model and its predicted time in ms for the given size, if any."""
+        model = fit_growth(self.points)
+        if model is None:
+            return None
+        name, f = model
+        return name, f(fattree_nodes(size))
+
+    def plan(self, size: int):
+        """
+        Return the timeout to run the given size with (None to skip it),
+        and the model and predicted time if the size is predicted to time out (otherwise None).
+        """
+        prediction = self.predict(size)
+        if prediction is None or prediction[1] <= self.margin * self.timeout * 1000:
+            return self.timeout, None
+        if self.action == "skip":
+            return None, prediction
+        return self.reduced_timeout, prediction
+
+    def extrapolated_row(self, size: int, predicted: float) -> dict[str, float]:
+        """Return a table row for the given size reporting the predicted time, marked as extrapolated."""
+        headers = MONO_HEADER if self.metric == "total" else MOD_HEADER
+        row = {h: math.nan for h in headers.split("\t")}
+        row["n"] = float(fattree_nodes(size))
+        row[self.metric] = float(round(predicted))
+        row["extrapolated"] = 1.0
+        return row
+
+
+class AdaptiveTrials:
+    """
+    Decide how many trials of each size to run: at least `minimum` (and at least two) and at most `maximum`,
+    stopping as soon as the confidence interval (at the `confidence` level) of the mean of `metric`,
+    excluding outliers (see stats.summarize), is narrower than `width` times the mean.
+    Monolithic benchmarks only report their total time, so for them `metric` is always "total".
+    """
+
+    def __init__(self, metric, width, confidence, minimum, maximum):
+        self.metric = metric
+        self.width = width
+        self.confidence = confidence
+        self.minimum = max(2, minimum)
+        self.maximum = max(self.minimum, maximum)
+
+    def metric_for(self, options: list[str]) -> str:
+        return "total" if "-m" in options else self.metric
+
+    def enough(self, trials: int, options: list[str], rows: list[dict], output_file) -> bool:
+        """
+        Return whether the given number of trials, with the given rows, are enough.
+        Once at least the minimum number of trials have run, log the confidence interval so far.
+        """
+        if trials < self.minimum:
+            return False
+        metric = self.metric_for(options)
+        values = [r[metric] for r in rows if metric in r]
+        if len(values) < 2:
+            return False
+        summary = stats.summarize(values, self.confidence)
+        width = stats.relative_width(summary)
+        tee_output(
+            "After {n} trials, the {c:.0%} confidence interval of the mean {metric} is "
+            "[{low:.1f}, {high:.1f}] ms (width {width:.1%} of the mean, {o:.0f} outliers excluded)".format(
+                n=trials,
+                c=self.confidence,
+                metric=metric,
+                low=summary["ci_low"],
+                high=summary["ci_high"],
+                width=width,
+                o=summary["outliers"],
+            ),
+            output_file,
+        )
+        return width <= self.width
 
 
 def run_all(
@@ -98,62 +848,1054 @@ def run_all(
     options,
     output_file,
     short_circuit=True,
+    recorder=None,
+    resume=False,
+    extrapolator=None,
+    pool=None,
+    sample_interval=None,
+    adaptive=None,
+    orders=None,
 ) -> list[dict]:
     """
     Run the given benchmark for the sequence of sizes and trials.
     Pass the given options into dotnet and optionally save the results to
-    the given output file.
+    the given output file and record each run with the given results_db.Recorder.
+    If a WorkerPool is given, run each job in one of its workers rather than a fresh process.
+    If a `sample_interval` is given, sample the resource use of each run that often (in seconds).
+    If `resume` is set, reuse the results of the jobs the recorder's campaign already finished
+    instead of running them again.
+    If an Extrapolator is given, use it to skip (or shorten) sizes predicted to time out,
+    returning rows of their predicted times marked as extrapolated.
+    If AdaptiveTrials are given, run as many trials of each size as they decide instead of `trials`.
+    If node_order.NodeOrders are given, schedule each run's checks longest-first by the times of earlier runs.
     """
+    max_trials = trials if adaptive is None else adaptive.maximum
     rows = []
+    completed = recorder.completed(options, FINISHED) if resume and recorder is not None else {}
     for size in sizes:
-        bench_output = "Running benchmark k={size} with options: {options}".format(
-            size=size, options=" ".join(options)
-        )
+        size_timeout, prediction = timeout, None
+        if extrapolator is not None:
+            size_timeout, prediction = extrapolator.plan(size)
+        if prediction is not None:
+            model, predicted = prediction
+            predicted_output = "Predicted time for k={size} is {predicted:.0f}ms ({model} fit), over {margin} times the timeout".format(
+                size=size, predicted=predicted, model=model, margin=extrapolator.margin
+            )
+            tee_output(predicted_output, output_file)
+            if size_timeout is None:
+                tee_output("Skipping benchmark k={size}".format(size=size), output_file)
+                rows.append(extrapolator.extrapolated_row(size, predicted))
+                continue
+        bench_output = benchmark_output(size, options)
+        if size_timeout != timeout:
+            bench_output += " (reduced timeout: {t} seconds)".format(t=size_timeout)
         tee_output(bench_output, output_file)
-        for trial in range(trials):
+        size_rows = []
+        for trial in range(max_trials):
+            if (size, trial) in completed:
+                response, bench_rows = completed[(size, trial)]
+                return_code = Response[response]
+                tee_output(resumed_output(trial, max_trials, response), output_file)
+                rows.extend(bench_rows)
+                size_rows.extend(bench_rows)
+                if extrapolator is not None:
+                    extrapolator.observe(size, return_code, bench_rows)
+                if return_code != Response.SUCCESS and short_circuit:
+                    return rows
+                if adaptive is not None and adaptive.enough(trial + 1, options, size_rows, output_file):
+                    break
+                continue
             date = datetime.datetime.now(datetime.timezone.utc)
             trial_output = "Trial {t} of {total} started {date}".format(
-                t=trial, total=trials, date=date
+                t=trial, total=max_trials, date=date
             )
             tee_output(trial_output, output_file)
 
             # run the benchmark
             # add [-k size] to the options to set the size
+            node_times = node_times_for(options)
+            telemetry = telemetry_for(sample_interval)
+            info = {}
             return_code, bench_rows = run_dotnet(
-                dll_file, ["-k", str(size)] + options, timeout, output_file
+                dll_file,
+                (options if size is None else ["-k", str(size)] + options) + order_options(orders, options, size),
+                size_timeout,
+                output_file,
+                node_times=node_times,
+                pool=pool,
+                info=info,
+                telemetry=telemetry,
             )
+            if recorder is not None:
+                recorder.record(
+                    options,
+                    size,
+                    trial,
+                    date,
+                    return_code.name,
+                    bench_rows,
+                    cores=available_cpus(),
+                    log_file=output_file,
+                    node_times=node_times,
+                    warm=info.get("warm"),
+                    exit_code=info.get("exit_code"),
+                    telemetry=telemetry,
+                )
             rows.extend(bench_rows)
+            size_rows.extend(bench_rows)
+            if prediction is not None and return_code == Response.TIMEOUT:
+                # the reduced timeout expired: report the prediction instead, and carry on,
+                # as the remaining sizes will be skipped or run with a reduced timeout too
+                rows.append(extrapolator.extrapolated_row(size, prediction[1]))
+                break
+            if extrapolator is not None:
+                extrapolator.observe(size, return_code, bench_rows)
             # if the benchmark timed out or was interrupted and short_circuit is set,
             # end immediately
             if return_code != Response.SUCCESS and short_circuit:
                 return rows
+            if adaptive is not None and adaptive.enough(trial + 1, options, size_rows, output_file):
+                break
     return rows
 
 
+def fattree_nodes(size: int) -> int:
+    """Return the number of nodes in a fat-tree with the given number of pods."""
+    return 5 * size * size // 4
+
+
+def core_allotment(size, options: list[str], budget: int, nodes=None) -> int:
+    """
+    Return the number of cores a benchmark of the given size can keep busy.
+    Monolithic benchmarks run a single SMT query, so they only ever need one core;
+    modular benchmarks check each node in parallel, so they need at most one core per node.
+    Jobs without a size (of angler files) have the given number of nodes, or may use the whole budget if not known.
+    """
+    if "-m" in options:
+        return 1
+    if size is not None:
+        nodes = fattree_nodes(size)
+    return max(1, min(budget, budget if nodes is None else nodes))
+
+
+def flush_job_log(job_log: pathlib.Path, output_file, echo=True):
+    """Print the contents of a job's log (unless `echo` is false), append it to the output file and delete it."""
+    with open(job_log, "rb") as f:
+        output = f.read()
+    if echo:
+        print(output.decode("utf-8"), end="")
+    if output_file is not None:
+        with open(output_file, "ab") as f:
+            f.write(output)
+    job_log.unlink()
+
+
+def run_concurrent(
+    dll_file,
+    campaigns,
+    sizes,
+    trials,
+    timeout,
+    cores,
+    short_circuit=True,
+    recorder=None,
+    resume=False,
+    pool=None,
+    sample_interval=None,
+    nodes=None,
+    orders=None,
+) -> list[list[dict]]:
+    """
+    Run each of the given benchmark campaigns for the sequence of sizes and trials,
+    running as many jobs at once as fit in a budget of `cores` CPUs.
+    Each campaign is a pair of the options passed into dotnet and the output file (or None).
+    A size of None runs the campaign's options as they are, without passing a size (e.g. to Timepiece.Angler);
+    the number of nodes of each such campaign can then be given in `nodes`, a list in the order of the campaigns.
+    Each job is pinned to its own allotment of CPUs (see `core_allotment`)
+    and told how many it has through DOTNET_PROCESSOR_COUNT, so that its times
+    are comparable to running it alone on a machine of that size.
+    Jobs write to their own log while they run, which is appended to the campaign's output file
+    in the same order as `run_all` once all the jobs before it have finished:
+    the logs, returned rows and runs recorded with the results_db.Recorder (if given)
+    are therefore the same as running each campaign with `run_all`, as is resuming with `resume`.
+    If a WorkerPool is given, jobs are run in its workers, which are pinned to each job's CPUs in turn.
+    If a `sample_interval` is given, the resource use of each job is sampled that often (in seconds).
+    If node_order.NodeOrders are given, each job's checks are scheduled longest-first by the times of
+    the runs recorded before it started.
+    Return the rows collected for each campaign.
+    """
+    available = available_cpu_ids()
+    if cores > len(available):
+        print(
+            "Warning: only {n} cores are available, reducing budget from {cores}".format(
+                n=len(available), cores=cores
+            )
+        )
+    free = available[:cores]
+    budget = len(free)
+    # the jobs of each campaign, in the order run_all would run them
+    jobs = [
+        [(size, trial) for size in sizes for trial in range(trials)]
+        for _ in campaigns
+    ]
+    results = [[None] * len(campaign_jobs) for campaign_jobs in jobs]
+    cancels = [
+        [threading.Event() for _ in campaign_jobs] for campaign_jobs in jobs
+    ]
+    # index of the first job of each campaign that did not succeed, if short-circuiting
+    cutoffs = [len(campaign_jobs) for campaign_jobs in jobs]
+    flushed = [0 for _ in campaigns]
+    for c, (options, _) in enumerate(campaigns):
+        completed = recorder.completed(options, FINISHED) if resume and recorder is not None else {}
+        for i, job in enumerate(jobs[c]):
+            if job in completed:
+                response, bench_rows = completed[job]
+                # finished jobs have no log, date, cores or other details
+                results[c][i] = (Response[response], bench_rows, None, None, None, None, {}, None)
+                if Response[response] != Response.SUCCESS and short_circuit:
+                    cutoffs[c] = min(cutoffs[c], i)
+    pending = [(c, i) for i in range(max(map(len, jobs), default=0)) for c in range(len(campaigns))]
+    pending = [
+        (c, i) for c, i in pending if i < len(jobs[c]) and results[c][i] is None
+    ]
+    threads = []
+    cond = threading.Condition()
+
+    def work(c, i, cpus, hints):
+        options, _ = campaigns[c]
+        size, trial = jobs[c][i]
+        # the child process inherits the CPU affinity of the thread that starts it
+        set_affinity(cpus)
+        env = dict(os.environ, DOTNET_PROCESSOR_COUNT=str(len(cpus)))
+        fd, job_log = tempfile.mkstemp(prefix="timepiece-k{}-t{}-".format(size, trial), suffix=".txt")
+        os.close(fd)
+        job_log = pathlib.Path(job_log)
+        if trial == 0:
+            tee_output(benchmark_output(size, options), job_log, echo=False)
+        date = datetime.datetime.now(datetime.timezone.utc)
+        trial_output = "Trial {t} of {total} started {date}".format(
+            t=trial, total=trials, date=date
+        )
+        tee_output(trial_output, job_log, echo=False)
+        return_code, bench_rows = Response.USER_INTERRUPT, []
+        node_times = node_times_for(options)
+        telemetry = telemetry_for(sample_interval)
+        info = {}
+        try:
+            return_code, bench_rows = run_dotnet(
+                dll_file,
+                (options if size is None else ["-k", str(size)] + options) + hints,
+                timeout,
+                job_log,
+                env=env,
+                cancel=cancels[c][i],
+                echo=False,
+                node_times=node_times,
+                pool=pool,
+                info=info,
+                telemetry=telemetry,
+            )
+        finally:
+            with cond:
+                results[c][i] = (
+                    return_code,
+                    bench_rows,
+                    job_log,
+                    date,
+                    cpus,
+                    node_times,
+                    info,
+                    telemetry,
+                )
+                free.extend(cpus)
+                free.sort()
+                if return_code != Response.SUCCESS and short_circuit and i < cutoffs[c]:
+                    cutoffs[c] = i
+                    # later jobs of this campaign would not have been run: stop them
+                    for cancel in cancels[c][i + 1 :]:
+                        cancel.set()
+                cond.notify_all()
+
+    def flush():
+        """Write out every finished job whose predecessors have all been written out."""
+        for c, (options, output_file) in enumerate(campaigns):
+            while flushed[c] <= min(cutoffs[c], len(jobs[c]) - 1):
+                result = results[c][flushed[c]]
+                if result is None:
+                    break
+                return_code, bench_rows, job_log, date, cpus, node_times, info, telemetry = result
+                size, trial = jobs[c][flushed[c]]
+                if job_log is None:
+                    # the job was finished by an earlier run of the campaign
+                    if trial == 0:
+                        tee_output(benchmark_output(size, options), output_file)
+                    tee_output(resumed_output(trial, trials, return_code.name), output_file)
+                    flushed[c] += 1
+                    continue
+                flush_job_log(job_log, output_file)
+                if recorder is not None:
+                    recorder.record(
+                        options,
+                        size,
+                        trial,
+                        date,
+                        return_code.name,
+                        bench_rows,
+                        cores=len(cpus),
+                        log_file=output_file,
+                        node_times=node_times,
+                        warm=info.get("warm"),
+                        exit_code=info.get("exit_code"),
+                        telemetry=telemetry,
+                    )
+                flushed[c] += 1
+
+    try:
+        with cond:
+            while pending:
+                # drop the jobs cut off by an earlier failure
+                pending = [(c, i) for c, i in pending if i <= cutoffs[c]]
+                if not pending:
+                    break
+                # start the first pending job that fits in the free cores
+                for c, i in pending:
+                    size, _ = jobs[c][i]
+                    need = core_allotment(size, campaigns[c][0], budget, None if nodes is None else nodes[c])
+                    if need <= len(free):
+                        cpus = free[:need]
+                        del free[:need]
+                        pending.remove((c, i))
+                        # learn the hints here, as the database connection belongs to this thread
+                        hints = order_options(orders, campaigns[c][0], size)
+                        thread = threading.Thread(target=work, args=(c, i, cpus, hints))
+                        thread.start()
+                        threads.append(thread)
+                        break
+                else:
+                    cond.wait()
+                flush()
+            while any(thread.is_alive() for thread in threads):
+                cond.wait(timeout=1)
+                flush()
+    except KeyboardInterrupt:
+        for campaign_cancels in cancels:
+            for cancel in campaign_cancels:
+                cancel.set()
+        for thread in threads:
+            thread.join()
+        for c, campaign_results in enumerate(results):
+            # as with run_all, stop at the first job that was interrupted
+            for i, result in enumerate(campaign_results):
+                if result is not None and result[0] != Response.SUCCESS:
+                    cutoffs[c] = min(cutoffs[c], i)
+                    break
+    finally:
+        with cond:
+            flush()
+            # remove the logs of jobs that were started but then cut off
+            for campaign_results in results:
+                for result in campaign_results:
+                    if result is not None and result[2] is not None and result[2].exists():
+                        result[2].unlink()
+    return [
+        [row for result in campaign_results[: flushed[c]] for row in result[1]]
+        for c, campaign_results in enumerate(results)
+    ]
+
+
 def run_angler(
-  angler_dll_file, angler_files, trials, timeout, output_file, short_circuit=True
+  angler_dll_file,
+  angler_files,
+  trials,
+  timeout,
+  output_file,
+  short_circuit=True,
+  recorder=None,
+  resume=False,
+  pool=None,
+  sample_interval=None,
+  adaptive=None,
+  orders=None,
 ):
-    """Run the given angler dll for the given files for the specified number of trials."""
+    """
+    Run the given angler dll for the given files for the specified number of trials,
+    recording each run with the given results_db.Recorder.
+    If `resume` is set, skip the trials the recorder's campaign already finished.
+    If a WorkerPool is given, run the trials in one of its workers,
+    so that trials after the first reuse the deserialized file.
+    If a `sample_interval` is given, sample the resource use of each run that often (in seconds).
+    If AdaptiveTrials are given, run as many trials as they decide instead of `trials`.
+    If node_order.NodeOrders are given, schedule each trial's checks longest-first by the times of earlier runs.
+    """
+    max_trials = trials if adaptive is None else adaptive.maximum
     output_rows = []
-    for trial in range(trials):
+    completed = recorder.completed(angler_files, FINISHED) if resume and recorder is not None else {}
+    for trial in range(max_trials):
+        if (None, trial) in completed:
+            response, bench_rows = completed[(None, trial)]
+            tee_output(resumed_output(trial, max_trials, response), output_file)
+            output_rows.extend(bench_rows)
+            if Response[response] != Response.SUCCESS and short_circuit:
+                return output_rows
+            if adaptive is not None and adaptive.enough(trial + 1, angler_files, output_rows, output_file):
+                break
+            continue
         date = datetime.datetime.now(datetime.timezone.utc)
         trial_output = "Trial {t} of {total} started {date}".format(
-            t=trial, total=trials, date=date
+            t=trial, total=max_trials, date=date
         )
         tee_output(trial_output, output_file)
 
         # run the benchmark
+        node_times = node_times_for(angler_files)
+        telemetry = telemetry_for(sample_interval)
+        info = {}
         return_code, bench_rows = run_dotnet(
-          angler_dll_file, angler_files, timeout, output_file
+          angler_dll_file,
+          angler_files + order_options(orders, angler_files, None),
+          timeout,
+          output_file,
+          node_times=node_times,
+          pool=pool,
+          info=info,
+          telemetry=telemetry,
         )
+        if recorder is not None:
+            recorder.record(
+                angler_files,
+                None,
+                trial,
+                date,
+                return_code.name,
+                bench_rows,
+                cores=available_cpus(),
+                log_file=output_file,
+                node_times=node_times,
+                warm=info.get("warm"),
+                exit_code=info.get("exit_code"),
+                telemetry=telemetry,
+            )
         output_rows.extend(bench_rows)
         # if the benchmark timed out or was interrupted and short_circuit is set,
         # end immediately
         if return_code != Response.SUCCESS and short_circuit:
           return output_rows
+        if adaptive is not None and adaptive.enough(trial + 1, angler_files, output_rows, output_file):
+            break
     return output_rows
 
 
+def scaling_cores(available: int) -> list[int]:
+    """Return the default core counts of a scaling study: the powers of two up to `available`, and `available`."""
+    counts = []
+    cores = 1
+    while cores < available:
+        counts.append(cores)
+        cores *= 2
+    return counts + [available]
+
+
+def parse_core_counts(counts: str) -> list[int]:
+    """
+    Parse the core counts of a scaling study given as numbers separated by commas,
+    or "auto" for the default ones (see `scaling_cores`), returned as none.
+    """
+    if counts.strip() == "auto":
+        return []
+    try:
+        cores = [int(c) for c in counts.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected auto or CORES[,CORES...], not {}".format(counts))
+    if any(c < 1 for c in cores):
+        raise argparse.ArgumentTypeError("core counts must be at least 1, not {}".format(counts))
+    return cores
+
+
+def run_scaling(
+    dll_file,
+    sizes,
+    trials,
+    timeout,
+    options,
+    output_file,
+    core_counts,
+    recorder=None,
+    pool=None,
+    sample_interval=None,
+) -> list[dict]:
+    """
+    Run a strong-scaling study of the benchmark with the given options: run each size's trials on each of the
+    given numbers of cores in turn, pinning the benchmark to that many of the available CPUs and telling it
+    how many it has through DOTNET_PROCESSOR_COUNT (as `run_concurrent` does).
+    Each run is recorded with its number of cores (marked as a scaling run, which queries of the results database
+    leave out by default), and each returned row has its number of cores ("cores").
+    Runs that time out or are interrupted do not stop the study, except that a user interrupt ends it.
+    """
+    available = available_cpu_ids()
+    rows = []
+    try:
+        for size in sizes:
+            for cores in core_counts:
+                cpus = available[:cores]
+                env = dict(os.environ, DOTNET_PROCESSOR_COUNT=str(cores))
+                tee_output(
+                    "{} on {} cores".format(benchmark_output(size, options), cores), output_file
+                )
+                for trial in range(trials):
+                    date = datetime.datetime.now(datetime.timezone.utc)
+                    tee_output(
+                        "Trial {t} of {total} started {date}".format(t=trial, total=trials, date=date),
+                        output_file,
+                    )
+                    node_times = node_times_for(options)
+                    telemetry = telemetry_for(sample_interval)
+                    info = {}
+                    # the child process inherits the CPU affinity of this thread
+                    set_affinity(cpus)
+                    try:
+                        return_code, bench_rows = run_dotnet(
+                            dll_file,
+                            ["-k", str(size)] + options,
+                            timeout,
+                            output_file,
+                            env=env,
+                            node_times=node_times,
+                            pool=pool,
+                            info=info,
+                            telemetry=telemetry,
+                        )
+                    finally:
+                        set_affinity(available)
+                    if recorder is not None:
+                        recorder.record(
+                            options,
+                            size,
+                            trial,
+                            date,
+                            return_code.name,
+                            bench_rows,
+                            cores=cores,
+                            log_file=output_file,
+                            node_times=node_times,
+                            warm=info.get("warm"),
+                            exit_code=info.get("exit_code"),
+                            telemetry=telemetry,
+                            scaling=True,
+                        )
+                    rows.extend(dict(r, cores=float(cores)) for r in bench_rows)
+                    if return_code == Response.USER_INTERRUPT:
+                        return rows
+                    if return_code != Response.SUCCESS:
+                        # the remaining trials on as few cores would fail or time out too
+                        break
+    except KeyboardInterrupt:
+        pass
+    return rows
+
+
+def queue_jobs(campaigns, sizes, trials: int, timeout: int) -> list[dict]:
+    """
+    Return the job records of a work queue running each of the given campaigns (pairs of the options passed into
+    dotnet and the output file) for the sequence of sizes and trials, in the order `run_concurrent` starts them:
+    the first job of each campaign, then the second of each, and so on.
+    """
+    jobs = [[(size, trial) for size in sizes for trial in range(trials)] for _ in campaigns]
+    records = []
+    for i in range(max(map(len, jobs), default=0)):
+        for c, (options, _) in enumerate(campaigns):
+            if i < len(jobs[c]):
+                size, trial = jobs[c][i]
+                records.append(
+                    {
+                        "id": "{:06d}".format(len(records)),
+                        "campaign": c,
+                        "index": i,
+                        "options": options,
+                        "size": size,
+                        "trial": trial,
+                        "trials": trials,
+                        "timeout": timeout,
+                    }
+                )
+    return records
+
+
+def failed_before(job: dict, results: dict[str, dict]) -> bool:
+    """Return whether any job of the same campaign before the given one has a result that did not succeed."""
+    return any(
+        result.get("campaign") == job["campaign"]
+        and result["index"] < job["index"]
+        and result.get("response", Response.SUCCESS.name) != Response.SUCCESS.name
+        for result in results.values()
+    )
+
+
+def serve_queue(
+    dll_path: pathlib.Path,
+    queue: work_queue.WorkQueue,
+    worker: str,
+    heartbeat=work_queue.DEFAULT_HEARTBEAT,
+    stale=work_queue.DEFAULT_STALE,
+    pool=None,
+    sample_interval=None,
+) -> int:
+    """
+    Run the jobs of the work queue as the named worker, one at a time, until none are left pending or claimed,
+    writing each job's output to the queue's log of the job and its result back to the queue.
+    While a job runs, its claim is touched every `heartbeat` seconds; if it is reclaimed meanwhile
+    (having missed heartbeats for `stale` seconds), the job is stopped and its result dropped.
+    Claims of other workers that are stale are reclaimed whenever a job is claimed,
+    and the worker waits for the jobs claimed by others before exiting, in case they need to be run again.
+    If the queue's campaigns short-circuit, jobs after a failed job of their campaign are skipped.
+    If a WorkerPool is given, jobs are run in its workers.
+    Return the number of jobs run.
+    """
+    description = queue.description()
+    dll_file = dll_path.joinpath(description["dll"])
+    ran = 0
+    while True:
+        for job_id in queue.reclaim_stale(stale):
+            print("Reclaimed job {} from a worker that stopped sending heartbeats".format(job_id))
+        claim = queue.claim(worker)
+        if claim is None:
+            if not queue.counts()["claimed"]:
+                return ran
+            time.sleep(heartbeat)
+            continue
+        job = claim.job
+        size, trial, options = job["size"], job["trial"], job["options"]
+        record = {"campaign": job["campaign"], "index": job["index"], "worker": worker}
+        if description["short_circuit"] and failed_before(job, queue.results()):
+            queue.complete(claim, dict(record, skipped=True))
+            continue
+        job_log = queue.log_file(job)
+        # drop the output of any earlier attempt at the job
+        job_log.unlink(missing_ok=True)
+        if trial == 0:
+            tee_output(benchmark_output(size, options), job_log)
+        date = datetime.datetime.now(datetime.timezone.utc)
+        tee_output(
+            "Trial {t} of {total} started {date}".format(t=trial, total=job["trials"], date=date), job_log
+        )
+        cancel = threading.Event()
+        lost = threading.Event()
+        finished = threading.Event()
+
+        def beat():
+            while not finished.wait(heartbeat):
+                if not queue.heartbeat(claim):
+                    lost.set()
+                    cancel.set()
+                    return
+
+        beater = threading.Thread(target=beat, daemon=True)
+        beater.start()
+        node_times = node_times_for(options)
+        telemetry = telemetry_for(sample_interval)
+        info = {}
+        try:
+            return_code, bench_rows = run_dotnet(
+                dll_file,
+                options if size is None else ["-k", str(size)] + options,
+                job["timeout"],
+                job_log,
+                cancel=cancel,
+                node_times=node_times,
+                pool=pool,
+                info=info,
+                telemetry=telemetry,
+            )
+        finally:
+            finished.set()
+            beater.join()
+        if lost.is_set():
+            print("Job {} was reclaimed from this worker: dropping its result".format(job["id"]))
+            continue
+        if return_code == Response.USER_INTERRUPT:
+            queue.release(claim)
+            return ran
+        record.update(
+            started=date.isoformat(),
+            response=return_code.name,
+            rows=bench_rows,
+            cores=available_cpus(),
+            warm=info.get("warm"),
+            exit_code=info.get("exit_code"),
+        )
+        if node_times is not None:
+            record["node_times"] = {"nodes": node_times.nodes, "ms": list(node_times.ms)}
+        if telemetry is not None:
+            record["telemetry"] = {
+                "interval": telemetry.interval,
+                "series": {field: list(series) for field, series in telemetry.series.items()},
+                "totals": telemetry.totals,
+            }
+        if queue.complete(claim, record):
+            ran += 1
+
+
+def collect_queue(queue: work_queue.WorkQueue, recorder=None) -> tuple[list, list[list[dict]]]:
+    """
+    Gather the results written back to the work queue into the logs of its campaigns, as `run_concurrent`
+    would have written them, recording each run with the given results_db.Recorder (if any)
+    unless an earlier collection of the queue recorded it.
+    Each campaign's results are gathered in order up to its first job without a result
+    (or, if the campaigns short-circuit, up to its first failed job).
+    Return the campaigns (pairs of the options passed into dotnet and the output file) and the rows of each.
+    """
+    description = queue.description()
+    results = queue.results()
+    recorded_file = queue.directory.joinpath("recorded.json")
+    recorded = set(work_queue.read_json(recorded_file)["ids"]) if recorded_file.exists() else set()
+    campaigns = [
+        (campaign["options"], pathlib.Path(campaign["output_file"])) for campaign in description["campaigns"]
+    ]
+    campaign_rows = [[] for _ in campaigns]
+    unfinished = [0 for _ in campaigns]
+    stopped = [False for _ in campaigns]
+    for job in description["jobs"]:
+        c = job["campaign"]
+        options, output_file = campaigns[c]
+        result = results.get(job["id"])
+        if stopped[c] or result is None or result.get("skipped"):
+            stopped[c] = True
+            unfinished[c] += 1
+            continue
+        with open(queue.log_file(job), "rb") as log:
+            output = log.read()
+        with open(output_file, "ab") as f:
+            f.write(output)
+        if recorder is not None and job["id"] not in recorded:
+            node_times = None
+            if "node_times" in result:
+                node_times = results_db.NodeTimes()
+                for node, ms in zip(result["node_times"]["nodes"], result["node_times"]["ms"]):
+                    node_times.append(node, ms)
+            telemetry = None
+            if "telemetry" in result:
+                telemetry = results_db.Telemetry(result["telemetry"]["interval"])
+                for field, series in result["telemetry"]["series"].items():
+                    telemetry.series[field].extend(series)
+                telemetry.totals.update(result["telemetry"].get("totals", {}))
+            recorder.record(
+                options,
+                job["size"],
+                job["trial"],
+                datetime.datetime.fromisoformat(result["started"]),
+                result["response"],
+                result["rows"],
+                cores=result["cores"],
+                log_file=output_file,
+                node_times=node_times,
+                warm=result["warm"],
+                telemetry=telemetry,
+                exit_code=result.get("exit_code"),
+            )
+            recorded.add(job["id"])
+        campaign_rows[c].extend(result["rows"])
+        if result["response"] != Response.SUCCESS.name and description["short_circuit"]:
+            stopped[c] = True
+    work_queue.write_json(recorded_file, {"ids": sorted(recorded)})
+    for (options, output_file), count in zip(campaigns, unfinished):
+        if count:
+            print(
+                "{} jobs of {} are unfinished, skipped or cut off by a failure".format(count, " ".join(options))
+            )
+    return campaigns, campaign_rows
+
+
+def write_scaling_dat(rows: list[dict], options: list[str], dat_file: pathlib.Path):
+    """
+    Write a .dat file of a scaling study with a row for each size and number of cores, giving the minimum time
+    across trials (the wall-clock time, or total time of monolithic benchmarks) and its speedup, efficiency
+    and Karp-Flatt metric relative to one core (see stats.scaling_columns).
+    """
+    metric = "total" if "-m" in options else "wall"
+    headers = ["n", "cores", metric] + [h for h in results_db.RUN_COLUMNS if any(h in r for r in rows)]
+    min_rows = []
+    for _, g in itertools.groupby(sorted(rows, key=lambda r: r["n"]), key=lambda r: r["n"]):
+        groups = list(g)
+        by_cores = {}
+        for r in groups:
+            by_cores.setdefault(int(r["cores"]), []).append(r)
+        size_rows = {cores: min_row(cores_rows, headers) for cores, cores_rows in sorted(by_cores.items())}
+        metrics = stats.scaling_columns({cores: row[metric] for cores, row in size_rows.items()})
+        for cores, row in size_rows.items():
+            row.update(metrics[cores])
+            min_rows.append(row)
+    with open(dat_file, "w") as dat:
+        writer = csv.DictWriter(dat, fieldnames=headers + stats.SCALING_COLUMNS, delimiter="\t")
+        writer.writeheader()
+        writer.writerows(min_rows)
+
+
+def angler_queries(dll_file, patterns: list[str]) -> list[str]:
+    """
+    Return the queries given by the patterns, in order and without repeats.
+    Each pattern is the name (or shorthand) of a query, or a glob pattern (e.g. Fat*) matching the names of
+    the queries listed by the DLL's list-queries command.
+    A pattern matching no query is returned as it is, so that the DLL reports it.
+    """
+    names = []
+    if any(re.search(r"[*?[]", pattern) for pattern in patterns):
+        proc = subprocess.run(["dotnet", dll_file, "list-queries"], capture_output=True, text=True)
+        names = re.findall(r"^- '\S+' or '(\S+)'", proc.stdout, re.MULTILINE)
+    queries = []
+    for pattern in patterns:
+        matches = [name for name in names if fnmatch.fnmatchcase(name, pattern)] or [pattern]
+        queries.extend(query for query in matches if query not in queries)
+    return queries
+
+
+def angler_nodes(angler_file) -> int:
+    """Return the number of nodes of the network in the given angler file, streaming through it."""
+    return len(slice_angler.Topology.read(angler_file).neighbors)
+
+
+def matrix_campaigns(
+    angler_files, queries, flags, options, log_dir: pathlib.Path
+) -> list[tuple[str, str, list[str], list[str], pathlib.Path]]:
+    """
+    Return the campaigns of every combination of angler file, query and flags (each a list of options),
+    as the file, query and flags with the options passed to the DLL (followed by the given options)
+    and the output file, named after the file (up to its first .), the query and the flags.
+    """
+    return [
+        (
+            angler_file,
+            query,
+            job_flags,
+            ["run", angler_file, query] + job_flags + options,
+            log_dir.joinpath(
+                "{}-{}{}.txt".format(pathlib.PurePath(angler_file).name.split(".")[0], query, "".join(job_flags))
+            ),
+        )
+        for angler_file in angler_files
+        for query in queries
+        for job_flags in flags
+    ]
+
+
+def min_row(rows: list[dict], headers: list[str]) -> dict:
+    """Return the minimum of each header's known values across the given rows (NaN if none is known)."""
+    return {
+        h: min((r[h] for r in rows if h in r and not math.isnan(r[h])), default=math.nan)
+        for h in headers
+    }
+
+
+def matrix_table(matrix, campaign_rows: list[list[dict]]) -> tuple[list[str], list[dict]]:
+    """
+    Return the headers and rows of a table with a row for each (file, query, flags) of the matrix,
+    giving its mode, how many trials finished and the minimum of each column across them.
+    """
+    rows = [r for campaign in campaign_rows for r in campaign]
+    headers = MOD_HEADER.split("\t") + [h for h in results_db.RUN_COLUMNS if any(h in r for r in rows)]
+    table = []
+    for (angler_file, query, job_flags), runs in zip(matrix, campaign_rows):
+        _, mode = results_db.policy_and_mode(job_flags)
+        row = {"file": angler_file, "query": query, "flags": " ".join(job_flags), "mode": mode, "trials": len(runs)}
+        row.update(min_row(runs, headers))
+        table.append(row)
+    return ["file", "query", "flags", "mode", "trials"] + headers, table
+
+
+def print_matrix(table: list[dict]):
+    """Print the time taken by each (file, query, flags) of a matrix: its wall-clock time, or total time if mono."""
+    lines = [["file", "query", "flags", "trials", "time (ms)"]]
+    for row in table:
+        ms = row["total"] if row["mode"] == "mono" else row["wall"]
+        time_ms = "-" if math.isnan(ms) else "{:.0f}".format(ms)
+        lines.append([row["file"], row["query"], row["flags"], str(row["trials"]), time_ms])
+    widths = [max(len(line[i]) for line in lines) for i in range(len(lines[0]))]
+    for line in lines:
+        print("  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip())
+
+
+def describe_env(env: dict[str, str]) -> str:
+    """Return the environment variables of a runtime configuration as shell assignments."""
+    return " ".join("{}={}".format(name, value) for name, value in env.items()) or "(runtime defaults)"
+
+
+def config_label(env: dict[str, str]) -> str:
+    """Return a short label of a runtime configuration: its settings, without the DOTNET_ prefix of their names."""
+    return ",".join(
+        "{}={}".format(name[len("DOTNET_"):] if name.startswith("DOTNET_") else name, value)
+        for name, value in env.items()
+    ) or "default"
+
+
+def parse_env(assignments: str) -> dict[str, str]:
+    """Parse a runtime configuration given as NAME=VALUE assignments separated by commas."""
+    env = {}
+    for assignment in assignments.split(","):
+        name, sep, value = assignment.partition("=")
+        if not sep or not name.strip():
+            raise argparse.ArgumentTypeError("expected NAME=VALUE[,NAME=VALUE...], not {}".format(assignments))
+        env[name.strip()] = value.strip()
+    return env
+
+
+class Tuning:
+    """The times and memory use of running a set of benchmarks in one runtime configuration (see `run_tuning`)."""
+
+    def __init__(self, knob, env: dict[str, str]):
+        self.knob = knob
+        self.env = env
+        # the minimum time across trials of each (options, size): the wall-clock time, or total time if mono
+        self.times: dict[tuple, float] = {}
+        self.wall = 0.0
+        self.total = 0.0
+        self.peak_rss = math.nan
+        self.failure = None
+        self.ratio = math.nan
+
+    @property
+    def label(self) -> str:
+        return config_label(self.env)
+
+    def relative_to(self, baseline: "Tuning") -> float:
+        """
+        Return the geometric mean of the ratio of each benchmark's time to its time in the baseline
+        (NaN if either failed or they have no benchmarks in common).
+        """
+        if self.failure is not None or baseline.failure is not None:
+            return math.nan
+        ratios = [
+            self.times[key] / baseline.times[key]
+            for key in self.times.keys() & baseline.times.keys()
+            if baseline.times[key] > 0 and self.times[key] > 0
+        ]
+        if not ratios:
+            return math.nan
+        return math.exp(sum(map(math.log, ratios)) / len(ratios))
+
+    def row(self) -> dict:
+        """Return the configuration's row of the table written by --tune --dat."""
+        return {
+            "config": self.label,
+            "env": describe_env(self.env),
+            "wall": self.wall,
+            "total": self.total,
+            "peak_rss": self.peak_rss,
+            "ratio": self.ratio,
+            "gain": 1 - self.ratio,
+            "failure": self.failure or "",
+        }
+
+
+def tune(dll_file, benchmarks, sizes, trials, timeout, tuning: Tuning, output_file, sample_interval=None):
+    """
+    Run each of the benchmarks (lists of options) for the sequence of sizes and trials in the tuning's
+    runtime configuration, collecting the times and peak memory use of its runs.
+    Stop at the first run that does not succeed, marking the configuration as failed.
+    """
+    env = dict(os.environ, **tuning.env)
+    tee_output(
+        "Tuning configuration {label}: {env}".format(label=tuning.label, env=describe_env(tuning.env)),
+        output_file,
+    )
+    peaks = []
+    for options in benchmarks:
+        metric = "total" if "-m" in options else "wall"
+        for size in sizes:
+            tee_output(benchmark_output(size, options), output_file)
+            times = []
+            for trial in range(trials):
+                date = datetime.datetime.now(datetime.timezone.utc)
+                tee_output("Trial {t} of {total} started {date}".format(t=trial, total=trials, date=date), output_file)
+                telemetry = telemetry_for(sample_interval)
+                return_code, bench_rows = run_dotnet(
+                    dll_file, ["-k", str(size)] + options, timeout, output_file, env=env, telemetry=telemetry
+                )
+                if return_code != Response.SUCCESS or not any(metric in r for r in bench_rows):
+                    tuning.failure = return_code.name if return_code != Response.SUCCESS else "NO_RESULTS"
+                    return
+                times.extend(r[metric] for r in bench_rows if metric in r)
+                if telemetry is not None and "peak_rss" in telemetry.summary():
+                    peaks.append(telemetry.summary()["peak_rss"])
+            row = min(times)
+            tuning.times[(tuple(options), size)] = row
+            if metric == "wall":
+                tuning.wall += row
+            else:
+                tuning.total += row
+    tuning.peak_rss = max(peaks, default=math.nan)
+
+
+def run_tuning(
+    dll_file,
+    benchmarks,
+    sizes,
+    trials,
+    timeout,
+    knobs,
+    extra_configs,
+    threshold,
+    output_file,
+    sample_interval=None,
+) -> list[Tuning]:
+    """
+    Sweep runtime configurations over the given benchmarks (as in `tune`), one knob setting at a time:
+    first the runtime's defaults, then each setting of the given TUNING_KNOBS, then each extra configuration
+    (a dict of environment variables).
+    Finally, if settings of more than one knob ran faster than the defaults by over `threshold`,
+    run the fastest setting of each such knob together.
+    Return the configurations run, each with its time relative to the defaults.
+    """
+    configs = [Tuning(None, {})]
+    configs.extend(Tuning(knob, env) for knob in knobs for env in TUNING_KNOBS[knob])
+    configs.extend(Tuning(None, env) for env in extra_configs)
+    for tuning in configs:
+        tune(dll_file, benchmarks, sizes, trials, timeout, tuning, output_file, sample_interval)
+    baseline = configs[0]
+    for tuning in configs:
+        tuning.ratio = tuning.relative_to(baseline)
+    # the fastest setting of each knob that beat the defaults
+    best = {}
+    for tuning in configs:
+        if tuning.knob is not None and tuning.ratio < 1 - threshold:
+            if tuning.knob not in best or tuning.ratio < best[tuning.knob].ratio:
+                best[tuning.knob] = tuning
+    if len(best) > 1:
+        combined = Tuning("combined", {name: value for t in best.values() for name, value in t.env.items()})
+        tune(dll_file, benchmarks, sizes, trials, timeout, combined, output_file, sample_interval)
+        combined.ratio = combined.relative_to(baseline)
+        configs.append(combined)
+    return configs
+
+
+def print_tuning(configs: list[Tuning], threshold: float):
+    """Print the times and memory use of each configuration, fastest first, and the best configuration found."""
+    lines = [["config", "wall (s)", "total (s)", "peak RSS (MiB)", "vs default"]]
+    ranked = sorted(configs, key=lambda t: (math.isnan(t.ratio), t.ratio))
+    for tuning in ranked:
+        if tuning.failure is not None:
+            lines.append([tuning.label, "-", "-", "-", tuning.failure.lower()])
+            continue
+        lines.append(
+            [
+                tuning.label,
+                "{:.1f}".format(tuning.wall / 1000),
+                "{:.1f}".format(tuning.total / 1000),
+                "-" if math.isnan(tuning.peak_rss) else "{:.0f}".format(tuning.peak_rss / 1024),
+                "-" if math.isnan(tuning.ratio) else "{:+.1%}".format(tuning.ratio - 1),
+            ]
+        )
+    widths = [max(len(line[i]) for line in lines) for i in range(len(lines[0]))]
+    for line in lines:
+        print("  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip())
+    best = ranked[0]
+    if best.knob is None and not best.env or math.isnan(best.ratio) or best.ratio >= 1 - threshold:
+        print("No configuration was faster than the runtime defaults by over {:.0%}".format(threshold))
+    else:
+        print(
+            "Best configuration: {env} ({gain:.1%} faster than the runtime defaults)".format(
+                env=describe_env(best.env), gain=1 - best.ratio
+            )
+        )
+
+
 def parser():
     parser = argparse.ArgumentParser(description="Run Timepiece benchmarks")
     parser.add_argument(
@@ -168,7 +1910,7 @@ def parser():
         "-n",
         type=int,
         default=1,
-        help="Number of trials to run (default: %(default))",
+        help="Number of trials to run (default: %(default)s)",
     )
     parser.add_argument(
         "--timeout",
@@ -177,7 +1919,8 @@ def parser():
         default=3600,
         help="Number of seconds to wait before timing out benchmark (default: %(default)s)",
     )
-    benchmark_arg = parser.add_mutually_exclusive_group(required=True)
+    # one is required, unless the benchmarks are taken from a work queue
+    benchmark_arg = parser.add_mutually_exclusive_group()
     benchmark_arg.add_argument(
         "--size",
         "-k",
@@ -191,6 +1934,31 @@ def parser():
         action="store_true",
         help="Interpret inputs as angler files rather than benchmarks",
     )
+    benchmark_arg.add_argument(
+        "--matrix",
+        "-M",
+        nargs="+",
+        metavar="FILE",
+        help="Run Timepiece.Angler on every combination of these angler files, --queries and --flags, "
+        "passing any options after them to every run, concurrently within the --cores budget "
+        "(by default, all available cores); each combination is logged separately, "
+        "and the minimum times of each are summarized in a table (written to the results directory with --dat)",
+    )
+    parser.add_argument(
+        "--queries",
+        "-Q",
+        nargs="+",
+        help="With --matrix, the queries to run: names of queries or glob patterns "
+        "matching those listed by list-queries, e.g. 'Internet2*' (default: every query)",
+    )
+    parser.add_argument(
+        "--flags",
+        "-F",
+        action="append",
+        type=shlex.split,
+        help="With --matrix, the options of one mode to run each file and query in, "
+        "e.g. --flags=-m or --flags='-P 5' (may be repeated; default: --flags= --flags=-m, i.e. modular and mono)",
+    )
     parser.add_argument(
         "--no-short-circuit",
         "-X",
@@ -209,8 +1977,330 @@ def parser():
         action="store_true",
         help="Output a .dat file summarizing the benchmark results in a table",
     )
-    parser.add_argument("options", nargs="+", help="Options passed to DLL")
-    return parser.parse_args()
+    parser.add_argument(
+        "--db",
+        type=pathlib.Path,
+        default=results_db.DEFAULT_DB,
+        help="Record every run in this results database (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-db",
+        action="store_false",
+        help="Do not record the runs in a results database",
+    )
+    parser.add_argument(
+        "--campaign",
+        "-c",
+        help="Name the campaign these runs belong to in the results database",
+    )
+    parser.add_argument(
+        "--resume",
+        "-r",
+        action="store_true",
+        help="Resume the named campaign: only run the jobs it has not finished (or that failed), "
+        "appending to the existing logs and merging with the finished jobs' results",
+    )
+    parser.add_argument(
+        "--node-times",
+        "-N",
+        action="store_true",
+        help="Have Timepiece report the time taken to check each node of modular benchmarks, "
+        "and record these times in the results database",
+    )
+    parser.add_argument(
+        "--order",
+        "-O",
+        action="store_true",
+        help="Have Timepiece check the nodes of each modular run longest-first, by the median times of "
+        "the last {} runs of the same benchmark and size recorded in the results database "
+        "(written to a hint file in {}; see node_order.py); implies --node-times".format(
+            node_order.DEFAULT_RUNS, node_order.DEFAULT_DIRECTORY
+        ),
+    )
+    parser.add_argument(
+        "--predict",
+        choices=["skip", "reduce"],
+        help="Fit a growth model to the times measured so far (and recorded for the policy in the results database) "
+        "and skip, or run with --reduced-timeout, any size predicted to take well over the timeout; "
+        "predicted times are marked as extrapolated in the .dat file (cannot be used with --cores)",
+    )
+    parser.add_argument(
+        "--predict-margin",
+        type=float,
+        default=2.0,
+        help="With --predict, act on sizes predicted to take over this many times the timeout (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--reduced-timeout",
+        type=int,
+        help="With --predict reduce, the timeout in seconds for sizes predicted to time out "
+        "(default: a tenth of the timeout)",
+    )
+    parser.add_argument(
+        "--cores",
+        "-j",
+        type=int,
+        help="Run benchmark jobs concurrently within a budget of this many cores, "
+        "pinning each job to as many cores as it can use (default: run jobs one at a time)",
+    )
+    parser.add_argument(
+        "--policies",
+        "-p",
+        nargs="+",
+        help="Run each of the given benchmarks, passing the options after them to the DLL; "
+        "each benchmark is logged separately, as if run_all.py was run once per benchmark",
+    )
+    parser.add_argument(
+        "--warm",
+        "-w",
+        action="store_true",
+        help="Run jobs in long-lived worker processes, reusing them for later jobs to skip the startup "
+        "and JIT compilation of the runtime (and re-reading angler files); "
+        "runs are logged and recorded in the results database as cold or warm",
+    )
+    parser.add_argument(
+        "--sample-interval",
+        type=float,
+        default=1.0,
+        help="Sample the memory and CPU use of each run from /proc every this many seconds, "
+        "logging and recording it and adding peak_rss (kB) and cpu_util (cores kept busy) columns "
+        "to the .dat file, which cover the whole run (from its resource usage once it exits) "
+        "unless it ran in a --warm worker; 0 disables sampling (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--stats",
+        "-s",
+        choices=["wall", "med", "99p", "total"],
+        help="Run trials of each size until the confidence interval of the mean of this metric "
+        "(excluding outliers) is narrower than --ci-width, running at least --trials and at most --max-trials, "
+        "and add its median, mean and confidence interval to the .dat file "
+        "(monolithic benchmarks always use their total time; cannot be used with --cores)",
+    )
+    parser.add_argument(
+        "--ci-width",
+        type=float,
+        default=0.1,
+        help="With --stats, the width of the confidence interval to reach as a fraction of the mean (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="With --stats, the confidence level of the intervals (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-trials",
+        type=int,
+        default=10,
+        help="With --stats, the most trials to run of each size (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--scaling",
+        type=parse_core_counts,
+        metavar="auto|CORES[,CORES...]",
+        help="Run a strong-scaling study: run each size on each of these numbers of cores in turn "
+        "(with auto, 1, 2, 4, ... up to all available cores), restricted by CPU affinity and DOTNET_PROCESSOR_COUNT, "
+        "logging to a separate -scaling log and, with --dat, writing the speedup, efficiency and "
+        "Karp-Flatt metric of each relative to one core (plot them with plot.py --scaling)",
+    )
+    parser.add_argument(
+        "--tune",
+        action="store_true",
+        help="Instead of running the benchmarks, find the fastest .NET runtime settings for them: "
+        "run them (at each size, for --trials trials) with the runtime's defaults and then with each setting of "
+        "each --tune-knobs in turn (and each --tune-env), reporting the times and peak memory use of each "
+        "and the best configuration found; runs are logged to tune.txt but not recorded in the results database",
+    )
+    parser.add_argument(
+        "--tune-knobs",
+        nargs="+",
+        choices=list(TUNING_KNOBS),
+        default=list(TUNING_KNOBS),
+        metavar="KNOB",
+        help="With --tune, the runtime settings to sweep, of: {} (default: all)".format(", ".join(TUNING_KNOBS)),
+    )
+    parser.add_argument(
+        "--tune-env",
+        action="append",
+        type=parse_env,
+        default=[],
+        metavar="NAME=VALUE[,NAME=VALUE...]",
+        help="With --tune, also run with these environment variables set (may be repeated)",
+    )
+    parser.add_argument(
+        "--tune-threshold",
+        type=float,
+        default=0.02,
+        help="With --tune, the fraction by which a configuration must beat the defaults to count as faster, "
+        "and settings of different knobs that do so are also run together (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--queue",
+        type=pathlib.Path,
+        metavar="DIR",
+        help="Instead of running the benchmarks, add their jobs to a new work queue in this directory "
+        "(e.g. on a filesystem shared by several hosts), for any number of --work processes to run",
+    )
+    parser.add_argument(
+        "--work",
+        type=pathlib.Path,
+        metavar="DIR",
+        help="Run the jobs of the work queue in this directory one at a time, alongside any other workers, "
+        "until none are left, writing their output and results back to the queue (no other arguments are "
+        "needed, but --dll-path, --warm and --sample-interval apply)",
+    )
+    parser.add_argument(
+        "--collect",
+        type=pathlib.Path,
+        metavar="DIR",
+        help="Gather the results of the work queue in this directory into logs (and, with --dat, .dat files), "
+        "recording the runs in the results database as if they had been run here; may be repeated as jobs finish",
+    )
+    parser.add_argument(
+        "--heartbeat",
+        type=float,
+        default=work_queue.DEFAULT_HEARTBEAT,
+        help="With --work, the seconds between a worker's heartbeats while it runs a job (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--stale",
+        type=float,
+        default=work_queue.DEFAULT_STALE,
+        help="With --work, the seconds after its last heartbeat that a job is reclaimed from a worker "
+        "that is taken to have died, to be run again (default: %(default)s)",
+    )
+    parser.add_argument("options", nargs="*", help="Options passed to DLL")
+    args = parser.parse_args()
+    if args.work is not None or args.collect is not None:
+        if args.work is not None and args.collect is not None:
+            parser.error("--work and --collect cannot be used together")
+        if args.size is not None or args.angler or args.matrix is not None or args.options or args.queue:
+            parser.error("--work and --collect take the benchmarks to run from the queue")
+        if args.heartbeat <= 0 or args.stale <= args.heartbeat:
+            parser.error("--heartbeat must be positive, and less than --stale")
+        return args
+    if args.size is None and not args.angler and args.matrix is None:
+        parser.error("one of the arguments --size/-k --angler/-a --matrix/-M is required")
+    if args.sample_interval < 0:
+        parser.error("--sample-interval cannot be negative")
+    if args.cores is not None and args.cores < 1:
+        parser.error("--cores must be at least 1")
+    if args.angler and (args.cores is not None or args.policies is not None):
+        parser.error("--cores and --policies cannot be used with --angler")
+    if args.matrix is not None and args.policies is not None:
+        parser.error("--policies cannot be used with --matrix")
+    if args.matrix is None and (args.queries is not None or args.flags is not None):
+        parser.error("--queries and --flags are only used with --matrix")
+    if args.queries is None:
+        args.queries = ["*"]
+    if args.flags is None:
+        args.flags = [[], ["-m"]]
+    if args.stats is not None and (args.cores is not None or args.matrix is not None):
+        parser.error("--stats cannot be used with --cores or --matrix")
+    if not 0 < args.confidence < 1:
+        parser.error("--confidence must be between 0 and 1")
+    if args.predict is not None and (args.cores is not None or args.angler or args.matrix is not None):
+        parser.error("--predict cannot be used with --cores, --angler or --matrix")
+    if args.tune and (
+        args.size is None
+        or args.cores is not None
+        or args.warm
+        or args.stats is not None
+        or args.predict is not None
+        or args.resume
+    ):
+        parser.error("--tune requires --size, and cannot be used with --cores, --warm, --stats, --predict or --resume")
+    if args.scaling is not None:
+        if args.size is None or args.cores is not None or args.tune or args.stats is not None:
+            parser.error("--scaling requires --size, and cannot be used with --cores, --tune or --stats")
+        if args.predict is not None or args.resume:
+            parser.error("--scaling cannot be used with --predict or --resume")
+    if args.resume and args.campaign is None:
+        parser.error("--resume requires --campaign")
+    if args.resume and not args.no_db:
+        parser.error("--resume cannot be used with --no-db")
+    if args.order and (not args.no_db or args.tune or args.scaling is not None):
+        parser.error("--order cannot be used with --no-db, --tune or --scaling")
+    if args.queue is not None and (
+        args.matrix is not None
+        or args.cores is not None
+        or args.stats is not None
+        or args.predict is not None
+        or args.scaling is not None
+        or args.tune
+        or args.resume
+        or args.order
+    ):
+        parser.error(
+            "--queue cannot be used with --matrix, --cores, --stats, --predict, --scaling, --tune, --resume or --order"
+        )
+    if not args.options and not args.policies and args.matrix is None:
+        parser.error("the following arguments are required: options")
+    return args
+
+
+def prepare_output_file(output_file: pathlib.Path):
+    """Move any previous log at the given output file out of the way."""
+    if output_file.exists():
+        # move the old output file
+        # add the {current time} in front of the original stem
+        output_file.rename(
+            output_file.with_stem(
+                "{:%Y-%m-%dT%H%M%S}.{}".format(
+                    datetime.datetime.now(datetime.timezone.utc), output_file.stem
+                )
+            )
+        )
+        # create a new file
+        output_file.touch()
+
+
+def write_dat(
+    rows: list[dict], options: list[str], dat_file: pathlib.Path, adaptive=None
+):
+    """
+    Write a .dat file summarizing the given rows, taking the minimum of each column across trials.
+    If AdaptiveTrials are given, also summarize their metric's trials (see stats.metric_columns).
+    """
+    is_mono = "-m" in options
+    if is_mono:
+        headers = ["n", "total"]
+    else:
+        headers = [
+            "n",
+            "max",
+            "min",
+            "avg",
+            "med",
+            "99p",
+            "total",
+            "wall",
+        ]
+    # add the summaries of the runs' resource use, if sampled
+    headers.extend(h for h in results_db.RUN_COLUMNS if any(h in r for r in rows))
+    metric = None if adaptive is None else adaptive.metric_for(options)
+    min_headers = list(headers)
+    if metric is not None:
+        headers.extend(stats.stat_columns(metric))
+    if any("extrapolated" in r for r in rows):
+        # mark which rows are predictions rather than measurements
+        headers.append("extrapolated")
+        min_headers.append("extrapolated")
+        rows = [{"extrapolated": 0.0, **r} for r in rows]
+    # we use multiple trials to avoid noise in the results, hence we want to take the minimum
+    # (of the known values: runs may not have been sampled)
+    min_rows = []
+    # group every trial of each size, wherever it appears (e.g. after resuming a campaign)
+    for _, g in itertools.groupby(sorted(rows, key=lambda r: r["n"]), key=lambda r: r["n"]):
+        groups = list(g)
+        size_row = min_row(groups, min_headers)
+        if metric is not None:
+            size_row.update(stats.metric_columns(groups, metric, adaptive.confidence))
+        min_rows.append(size_row)
+    with open(dat_file, "w") as dat:
+        writer = csv.DictWriter(dat, fieldnames=headers, delimiter="\t")
+        writer.writeheader()
+        writer.writerows(min_rows)
 
 
 if __name__ == "__main__":
@@ -228,82 +2318,332 @@ if __name__ == "__main__":
     # parse arguments and begin
     args = parser()
 
-    # name the output file after the runner arguments
-    if args.angler:
-        # name it after the first angler file passed in
-        output_file = log_dir.joinpath(
-            pathlib.PurePath(args.options[0]).with_suffix(".txt").name
-        )
-    else:
-        output_file = log_dir.joinpath("{}.txt".format("".join(args.options)))
-    if output_file.exists():
-        # move the old output file
-        # add the {current time} in front of the original stem
-        output_file.rename(
-            output_file.with_stem(
-                "{:%Y-%m-%dT%H%M%S}.{}".format(
-                    datetime.datetime.now(datetime.timezone.utc), output_file.stem
-                )
+    queue_dir = args.work if args.work is not None else args.collect
+    if queue_dir is not None:
+        queue = work_queue.WorkQueue(queue_dir)
+        if not queue.exists():
+            print("Could not find a work queue in {}, exiting...".format(queue_dir))
+            sys.exit(1)
+    if args.work is not None:
+        dll = queue.description()["dll"]
+        if not args.dll_path.joinpath(dll).exists():
+            print("Could not find DLL {}, exiting...".format(dll))
+            sys.exit(1)
+        pool = WorkerPool() if args.warm else None
+        worker = work_queue.worker_name()
+        print("Running the jobs of {} as worker {}".format(queue_dir, worker))
+        try:
+            ran = serve_queue(
+                args.dll_path,
+                queue,
+                worker,
+                args.heartbeat,
+                args.stale,
+                pool=pool,
+                sample_interval=args.sample_interval,
+            )
+        except KeyboardInterrupt:
+            print("Interrupted: any job claimed but not started will be reclaimed once its claim is stale")
+            sys.exit(1)
+        finally:
+            if pool is not None:
+                pool.close()
+        print(
+            "Ran {ran} jobs: {pending} pending, {claimed} claimed and {done} done jobs remain in the queue".format(
+                ran=ran, **queue.counts()
             )
         )
-        # create a new file
-        output_file.touch()
+        sys.exit(0)
+    if args.collect is not None:
+        for output_file in dict.fromkeys(c["output_file"] for c in queue.description()["campaigns"]):
+            prepare_output_file(pathlib.Path(output_file))
+        recorder = (
+            results_db.Recorder(results_db.connect(args.db), args.campaign)
+            if args.no_db
+            else None
+        )
+        campaigns, campaign_rows = collect_queue(queue, recorder)
+        if args.dat:
+            results_path = pathlib.Path("results")
+            results_path.mkdir(exist_ok=True)
+            for (options, output_file), rows in zip(campaigns, campaign_rows):
+                write_dat(rows, options, results_path.joinpath(output_file.stem + ".dat"))
+        sys.exit(0)
 
     # run the appropriate DLL
-    if args.angler:
+    if args.angler or args.matrix is not None:
         dll = "Timepiece.Angler.dll"
     else:
         dll = "Timepiece.Benchmarks.dll"
     dll_file = args.dll_path.joinpath(dll)
-    if not dll_file.exists():
+    # the workers of a queue may find the DLL elsewhere
+    if not dll_file.exists() and args.queue is None:
         print("Could not find DLL {}, exiting...".format(dll))
         sys.exit(1)
+
+    # name the output file after the runner arguments
+    matrix = None
+    if args.matrix is not None:
+        missing = [angler_file for angler_file in args.matrix if not pathlib.Path(angler_file).exists()]
+        if missing:
+            print("Could not find {}, exiting...".format(", ".join(missing)))
+            sys.exit(1)
+        jobs = matrix_campaigns(
+            args.matrix, angler_queries(dll_file, args.queries), args.flags, args.options, log_dir
+        )
+        matrix = [(angler_file, query, job_flags) for angler_file, query, job_flags, _, _ in jobs]
+        campaigns = [(options, output_file) for _, _, _, options, output_file in jobs]
+        if len({output_file for _, output_file in campaigns}) < len(campaigns):
+            print("The logs of some files would have the same name: give files with distinct names, exiting...")
+            sys.exit(1)
+    elif args.angler:
+        # name it after the first angler file passed in
+        campaigns = [
+            (
+                args.options,
+                log_dir.joinpath(
+                    pathlib.PurePath(args.options[0]).with_suffix(".txt").name
+                ),
+            )
+        ]
+    elif args.policies:
+        campaigns = [
+            (
+                [policy] + args.options,
+                log_dir.joinpath("{}.txt".format("".join([policy] + args.options))),
+            )
+            for policy in args.policies
+        ]
+    else:
+        campaigns = [
+            (args.options, log_dir.joinpath("{}.txt".format("".join(args.options))))
+        ]
+    if args.scaling is not None:
+        # keep the runs of the study apart from ordinary runs of the same benchmarks
+        campaigns = [
+            (options, output_file.with_name("{}-scaling.txt".format(output_file.stem)))
+            for options, output_file in campaigns
+        ]
+    if args.tune:
+        # every benchmark is logged to the one log of the sweep
+        campaigns = [(options, log_dir.joinpath("tune.txt")) for options, _ in campaigns]
+    if not args.resume and args.queue is None:
+        for output_file in dict.fromkeys(output_file for _, output_file in campaigns):
+            prepare_output_file(output_file)
+    if args.node_times or args.order:
+        # ask for per-node times without changing the names of the logs
+        campaigns = [(options + ["--node-times"], output_file) for options, output_file in campaigns]
+    if args.queue is not None:
+        sizes = [None] if args.angler else range(args.size[0], args.size[1] + 1, 4)
+        jobs = queue_jobs(campaigns, sizes, args.trials, args.timeout)
+        try:
+            work_queue.WorkQueue(args.queue).create(
+                {
+                    "dll": dll,
+                    "campaigns": [
+                        {"options": options, "output_file": str(output_file)} for options, output_file in campaigns
+                    ],
+                    "short_circuit": args.no_short_circuit,
+                    "jobs": jobs,
+                },
+                jobs,
+            )
+        except FileExistsError as e:
+            print("{}, exiting...".format(e))
+            sys.exit(1)
+        print(
+            "Added {} jobs to the work queue in {}: run them with run_all.py --work {} "
+            "and gather their results with run_all.py --collect {}".format(len(jobs), args.queue, args.queue, args.queue)
+        )
+        sys.exit(0)
+
+    recorder = (
+        results_db.Recorder(results_db.connect(args.db), args.campaign)
+        if args.no_db
+        else None
+    )
+    orders = node_order.NodeOrders(recorder.conn) if args.order else None
+    adaptive = (
+        AdaptiveTrials(args.stats, args.ci_width, args.confidence, args.trials, args.max_trials)
+        if args.stats is not None
+        else None
+    )
+    if args.tune:
+        configs = run_tuning(
+            dll_file,
+            [options for options, _ in campaigns],
+            range(args.size[0], args.size[1] + 1, 4),
+            args.trials,
+            args.timeout,
+            args.tune_knobs,
+            args.tune_env,
+            args.tune_threshold,
+            campaigns[0][1] if args.no_log else None,
+            sample_interval=args.sample_interval,
+        )
+        print_tuning(configs, args.tune_threshold)
+        if args.dat:
+            results_path = pathlib.Path("results")
+            results_path.mkdir(exist_ok=True)
+            rows = [tuning.row() for tuning in configs]
+            with open(results_path.joinpath("tune.dat"), "w") as dat:
+                writer = csv.DictWriter(dat, fieldnames=list(rows[0]), delimiter="\t")
+                writer.writeheader()
+                writer.writerows(rows)
+        sys.exit(0)
+    # workers exit by themselves if we do not get to close them, as their stdin is closed
+    pool = WorkerPool() if args.warm else None
     if args.angler:
-        rows = run_angler(
+        options, output_file = campaigns[0]
+        campaign_rows = [
+            run_angler(
+                dll_file,
+                options,
+                args.trials,
+                args.timeout,
+                output_file if args.no_log else None,
+                short_circuit=args.no_short_circuit,
+                recorder=recorder,
+                resume=args.resume,
+                pool=pool,
+                sample_interval=args.sample_interval,
+                orders=orders,
+                adaptive=adaptive,
+            )
+        ]
+    elif args.scaling is not None:
+        available = available_cpus()
+        core_counts = sorted(set(args.scaling or scaling_cores(available)))
+        if core_counts[-1] > available:
+            print(
+                "Warning: only {n} cores are available, dropping larger core counts".format(n=available)
+            )
+            core_counts = [cores for cores in core_counts if cores <= available]
+        if core_counts[0] != 1:
+            # speedups are relative to one core
+            core_counts.insert(0, 1)
+        sizes = range(args.size[0], args.size[1] + 1, 4)
+        campaign_rows = [
+            run_scaling(
+                dll_file,
+                sizes,
+                args.trials,
+                args.timeout,
+                options,
+                output_file if args.no_log else None,
+                core_counts,
+                recorder=recorder,
+                pool=pool,
+                sample_interval=args.sample_interval,
+            )
+            for options, output_file in campaigns
+        ]
+    elif args.matrix is not None:
+        # give each file's modular runs as many cores as it has nodes
+        nodes = {angler_file: angler_nodes(angler_file) for angler_file in args.matrix}
+        campaign_rows = run_concurrent(
             dll_file,
-            args.options,
+            [
+                (options, output_file if args.no_log else None)
+                for options, output_file in campaigns
+            ],
+            [None],
             args.trials,
             args.timeout,
-            output_file if args.no_log else None,
+            args.cores or available_cpus(),
             short_circuit=args.no_short_circuit,
+            recorder=recorder,
+            resume=args.resume,
+            pool=pool,
+            sample_interval=args.sample_interval,
+            orders=orders,
+            nodes=[nodes[angler_file] for angler_file, _, _ in matrix],
         )
-    else:
+    elif args.cores is not None:
         sizes = range(args.size[0], args.size[1] + 1, 4)
-        rows = run_all(
+        campaign_rows = run_concurrent(
             dll_file,
+            [
+                (options, output_file if args.no_log else None)
+                for options, output_file in campaigns
+            ],
             sizes,
             args.trials,
             args.timeout,
-            args.options,
-            output_file if args.no_log else None,
+            args.cores,
             short_circuit=args.no_short_circuit,
+            recorder=recorder,
+            resume=args.resume,
+            pool=pool,
+            sample_interval=args.sample_interval,
+            orders=orders,
         )
+    else:
+        sizes = range(args.size[0], args.size[1] + 1, 4)
+
+        def extrapolator(options):
+            if args.predict is None:
+                return None
+            history = []
+            if recorder is not None:
+                # only the successful runs with the same options, on as many cores of as large a host
+                # (scaling runs are left out, and runs cut short, e.g. by a reduced timeout, did not finish their size)
+                history = results_db.query_rows(
+                    recorder.conn,
+                    *results_db.policy_and_mode(options),
+                    options=" ".join(options),
+                    cores=available_cpus(),
+                    host_cores=os.cpu_count(),
+                    response=Response.SUCCESS.name,
+                )
+            return Extrapolator(
+                options,
+                args.timeout,
+                args.predict,
+                args.predict_margin,
+                args.reduced_timeout or max(1, args.timeout // 10),
+                history,
+            )
+
+        campaign_rows = [
+            run_all(
+                dll_file,
+                sizes,
+                args.trials,
+                args.timeout,
+                options,
+                output_file if args.no_log else None,
+                short_circuit=args.no_short_circuit,
+                recorder=recorder,
+                resume=args.resume,
+                extrapolator=extrapolator(options),
+                pool=pool,
+                sample_interval=args.sample_interval,
+                orders=orders,
+                adaptive=adaptive,
+            )
+            for options, output_file in campaigns
+        ]
+    if pool is not None:
+        pool.close()
     if args.dat:
-        is_mono = "-m" in args.options
-        if is_mono:
-            headers = ["n", "total"]
-        else:
-            headers = [
-                "n",
-                "max",
-                "min",
-                "avg",
-                "med",
-                "99p",
-                "total",
-                "wall",
-            ]
-        # we use multiple trials to avoid noise in the results, hence we want to take the minimum
-        min_rows = []
-        for _, g in itertools.groupby(rows, key=lambda r: r["n"]):
-            groups = list(g)
-            min_rows.append({h: min(r[h] for r in groups) for h in headers})
         # create a .dat file in the results directory adjacent to logs
         results_path = pathlib.Path("results")
         if not results_path.exists():
             results_path.mkdir()
-        dat_file = results_path.joinpath(output_file.stem + ".dat")
-        with open(dat_file, "w") as dat:
-            writer = csv.DictWriter(dat, fieldnames=headers, delimiter="\t")
-            writer.writeheader()
-            writer.writerows(min_rows)
+        if args.scaling is not None:
+            for (options, output_file), rows in zip(campaigns, campaign_rows):
+                write_scaling_dat(rows, options, results_path.joinpath(output_file.stem + ".dat"))
+        elif matrix is None:
+            for (options, output_file), rows in zip(campaigns, campaign_rows):
+                write_dat(
+                    rows, options, results_path.joinpath(output_file.stem + ".dat"), adaptive
+                )
+    if matrix is not None:
+        headers, table = matrix_table(matrix, campaign_rows)
+        print_matrix(table)
+        if args.dat:
+            with open(results_path.joinpath("{}.dat".format(args.campaign or "matrix")), "w") as dat:
+                writer = csv.DictWriter(dat, fieldnames=headers, delimiter="\t")
+                writer.writeheader()
+                writer.writerows(table)
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+# Cut a smaller network out of an Angler-produced network (.angler.json) file:
+# either a sub-network of chosen nodes and their k-hop neighborhood,
+# or a shard for each region of the network.
+# Each slice is a network Timepiece.Angler can run on its own: it keeps the external peers of its nodes
+# and only the declarations their policies refer to, and edges to nodes outside the slice are cut.
+# The file is streamed node by node (twice: once for its topology and once to write the slices),
+# so networks too large to load at once can be sliced.
+# Usage: slice_angler.py [network] --node [node] [--hops K] [--output FILE]
+#        slice_angler.py [network] --shards [directory] [--region-pattern REGEX | --regions FILE]
+# Run with --help for more options.
+
+import argparse
+import collections
+import json
+import pathlib
+import re
+import sys
+
+# characters to read from the network file at a time
+CHUNK_SIZE = 1 << 20
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# the region of a node for --shards, by default: its name up to the first -
+DEFAULT_REGION_PATTERN = r"[^-]+"
+
+
+class JsonReader:
+    """
+    Read a JSON document incrementally: objects and arrays member by member,
+    and each member's value whole, so that only one value of the document is in memory at a time.
+    """
+
+    def __init__(self, file, chunk_size: int = CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        # the position in the buffer, and the characters of the file dropped before the buffer
+        self.pos = 0
+        self.offset = 0
+        self.eof = False
+
+    def _read_more(self) -> bool:
+        """
+        Drop what has been read from the buffer and read another chunk onto it,
+        at least as long as what is left so that reading a long value takes linear time.
+        Return False at the end of the file.
+        """
+        if self.eof:
+            return False
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos :]
+        self.pos = 0
+        chunk = self.file.read(max(self.chunk_size, len(self.buffer)))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character, or the empty string at the end of the file."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read_more():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        """Read the next character, which must be one of the given characters."""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(
+                "Expected one of {} but found {} at character {}".format(
+                    ", ".join(chars), repr(char) if char else "the end of the file", self.offset + self.pos
+                )
+            )
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Read the next value whole."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a value running to the end of the buffer (e.g. a number) may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read_more()
+
+    def members(self):
+        """
+        Iterate over the keys of the next object.
+        The value of each key must be read (with value, members or elements) before moving on to the next.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError("Expected an object key at character {}".format(self.offset + self.pos))
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def elements(self):
+        """
+        Iterate over the next array, yielding the position of each element.
+        Each element must be read before moving on to the next.
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        i = 0
+        while True:
+            yield i
+            i += 1
+            if self.expect(",]") == "]":
+                return
+
+
+def field(obj: dict, name: str, default=None):
+    """Return the given field of a JSON object, matching its name case-insensitively as Timepiece.Angler does."""
+    if name in obj:
+        return obj[name]
+    name = name.lower()
+    return next((value for key, value in obj.items() if key.lower() == name), default)
+
+
+class Topology:
+    """The nodes of a network with their neighbors (including external peers)."""
+
+    def __init__(self):
+        self.neighbors: dict[str, list[str]] = {}
+
+    @staticmethod
+    def read(path: pathlib.Path) -> "Topology":
+        topology = Topology()
+        with open(path, encoding="utf-8-sig") as file:
+            reader = JsonReader(file)
+            for key in reader.members():
+                if key.lower() == "nodes":
+                    for node in reader.members():
+                        topology.neighbors[node] = list(field(reader.value(), "Policies") or {})
+                else:
+                    reader.value()
+        return topology
+
+    def neighborhood(self, nodes, hops: int) -> set[str]:
+        """Return the nodes within the given number of hops of the given nodes (not counting external peers)."""
+        seen = set(nodes)
+        frontier = list(seen)
+        for _ in range(hops):
+            next_frontier = []
+            for node in frontier:
+                for neighbor in self.neighbors[node]:
+                    if neighbor in self.neighbors and neighbor not in seen:
+                        seen.add(neighbor)
+                        next_frontier.append(neighbor)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return seen
+
+
+def strings(value):
+    """Iterate over all the strings in a JSON value."""
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, str):
+            yield value
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+
+
+def referenced_declarations(declarations: dict, roots) -> set[str]:
+    """
+    Return the names of the declarations the given names refer to, those declarations refer to, and so on.
+    Any string in a declaration naming another (e.g. a call or a default policy) counts as a reference.
+    """
+    found = set()
+    stack = [root for root in roots if root in declarations]
+    while stack:
+        name = stack.pop()
+        if name in found:
+            continue
+        found.add(name)
+        stack.extend(s for s in strings(declarations[name]) if s in declarations and s not in found)
+    return found
+
+
+class Slice:
+    """A sub-network being written to a file, with counts of what was kept of the network."""
+
+    def __init__(self, path: pathlib.Path, nodes: set[str], topology: Topology):
+        self.path = path
+        self.nodes = nodes
+        self.topology = topology
+        self.file = open(path, "w")
+        self.counts = collections.Counter()
+        self._first = True
+
+    def write(self, text: str):
+        self.file.write(text)
+
+    def begin_member(self, key: str, opening: str = ""):
+        """Write the key of the next member of an object, followed by the opening of its value."""
+        self.write("{}\n{}: {}".format("" if self._first else ",", json.dumps(key), opening))
+        self._first = False
+
+    def end_member(self, closing: str = ""):
+        self.write(closing)
+        self._first = False
+
+    def open(self, opening: str):
+        """Open an object or array, whose first member is next."""
+        self.write(opening)
+        self._first = True
+
+    def prune(self, node: str, properties: dict) -> dict:
+        """Cut the node's edges to nodes outside the slice and drop the declarations its policies no longer need."""
+        policies = field(properties, "Policies") or {}
+        kept = {
+            neighbor: policy
+            for neighbor, policy in policies.items()
+            if neighbor in self.nodes or neighbor not in self.topology.neighbors
+        }
+        declarations = field(properties, "Declarations") or {}
+        roots = [field(policy, name) for policy in kept.values() for name in ("Import", "Export")]
+        needed = referenced_declarations(declarations, roots)
+        self.counts["nodes"] += 1
+        self.counts["cut"] += len(policies) - len(kept)
+        self.counts["declarations"] += len(needed)
+        self.counts["dropped"] += len(declarations) - len(needed)
+        pruned = {}
+        for key, value in properties.items():
+            if key.lower() == "policies":
+                value = kept
+            elif key.lower() == "declarations":
+                value = {name: declaration for name, declaration in declarations.items() if name in needed}
+            pruned[key] = value
+        return pruned
+
+    def write_node(self, node: str, properties: dict):
+        if self._first:
+            self.write("\n")
+        else:
+            self.write(",\n")
+        self.write("{}: {}".format(json.dumps(node), json.dumps(self.prune(node, properties))))
+        self._first = False
+
+    def write_external(self, peer: dict):
+        """Write the external peer if it peers with the slice, only with the nodes of the slice."""
+        peering = [node for node in field(peer, "Peering") or [] if node in self.nodes]
+        if not peering:
+            return
+        pruned = {key: peering if key.lower() == "peering" else value for key, value in peer.items()}
+        self.write("{}\n{}".format("" if self._first else ",", json.dumps(pruned)))
+        self._first = False
+        self.counts["externals"] += 1
+
+    def close(self):
+        self.file.close()
+
+    def describe(self) -> str:
+        return "{}: {} nodes ({} edges cut), {} external peers, {} declarations ({} dropped)".format(
+            self.path,
+            self.counts["nodes"],
+            self.counts["cut"],
+            self.counts["externals"],
+            self.counts["declarations"],
+            self.counts["dropped"],
+        )
+
+
+def write_slices(path: pathlib.Path, slices: list[Slice]):
+    """Stream through the network, writing each node and external peer to the slices it belongs to."""
+    with open(path, encoding="utf-8-sig") as file:
+        reader = JsonReader(file)
+        for s in slices:
+            s.open("{")
+        for key in reader.members():
+            if key.lower() == "nodes":
+                for s in slices:
+                    s.begin_member(key)
+                    s.open("{")
+                for node in reader.members():
+                    members = [s for s in slices if node in s.nodes]
+                    if not members:
+                        reader.value()
+                        continue
+                    properties = reader.value()
+                    for s in members:
+                        s.write_node(node, properties)
+                for s in slices:
+                    s.end_member("\n}")
+            elif key.lower() == "externals":
+                for s in slices:
+                    s.begin_member(key)
+                    s.open("[")
+                for _ in reader.elements():
+                    peer = reader.value()
+                    for s in slices:
+                        s.write_external(peer)
+                for s in slices:
+                    s.end_member("\n]")
+            else:
+                value = json.dumps(reader.value())
+                for s in slices:
+                    s.begin_member(key, value)
+                    s.end_member()
+        for s in slices:
+            s.write("\n}\n")
+            s.close()
+
+
+def regions_of(topology: Topology, pattern: re.Pattern, regions_file: pathlib.Path = None) -> dict[str, list[str]]:
+    """
+    Group the nodes of the network by region: as given by the regions file (a JSON object of nodes to regions),
+    or else by the first group of the pattern matching the start of their name (or the whole match if none).
+    Nodes without a region are grouped in the region "other".
+    """
+    node_regions = {}
+    if regions_file is not None:
+        with open(regions_file) as f:
+            node_regions = json.load(f)
+    regions = collections.defaultdict(list)
+    for node in topology.neighbors:
+        region = node_regions.get(node)
+        if region is None and regions_file is None:
+            match = pattern.match(node)
+            if match:
+                region = match.group(1) if pattern.groups else match.group(0)
+        regions[region or "other"].append(node)
+    return regions
+
+
+def parser():
+    parser = argparse.ArgumentParser(
+        description="Cut a sub-network out of an Angler network file: chosen nodes and their k-hop neighborhood, "
+        "or a shard for each region. Edges to nodes outside a slice are cut, "
+        "and only the external peers and declarations its nodes use are kept"
+    )
+    parser.add_argument("network", type=pathlib.Path, help="The network (.angler.json) file")
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument(
+        "--node",
+        "-n",
+        action="append",
+        dest="nodes",
+        metavar="NODE",
+        help="A node to keep (may be repeated)",
+    )
+    selection.add_argument(
+        "--match",
+        type=re.compile,
+        metavar="REGEX",
+        help="Keep the nodes whose name matches this regular expression",
+    )
+    selection.add_argument(
+        "--shards",
+        "-s",
+        type=pathlib.Path,
+        metavar="DIRECTORY",
+        help="Write a shard of the network for each region to DIRECTORY, as REGION.angler.json",
+    )
+    parser.add_argument(
+        "--hops",
+        "-k",
+        type=int,
+        help="Also keep the nodes within this many hops of the chosen nodes (or a shard's region) "
+        "(default: 1, or 0 for shards)",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=pathlib.Path,
+        help="The file to write the sub-network to (default: the network's name with -slice appended)",
+    )
+    parser.add_argument(
+        "--region-pattern",
+        type=re.compile,
+        metavar="REGEX",
+        help="The regular expression matching the start of each node's name whose first group "
+        "(or whole match) is its region, for --shards (default: %s, the name up to its first -)" % DEFAULT_REGION_PATTERN,
+    )
+    parser.add_argument(
+        "--regions",
+        type=pathlib.Path,
+        metavar="FILE",
+        help="A JSON object of nodes to their regions, for --shards, instead of --region-pattern",
+    )
+    args = parser.parse_args()
+    if args.hops is not None and args.hops < 0:
+        parser.error("--hops must not be negative")
+    if args.shards is None and (args.regions is not None or args.region_pattern is not None):
+        parser.error("--regions and --region-pattern are only used with --shards")
+    if args.regions is not None and args.region_pattern is not None:
+        parser.error("--regions and --region-pattern cannot be used together")
+    if args.region_pattern is None:
+        args.region_pattern = re.compile(DEFAULT_REGION_PATTERN)
+    if args.shards is not None and args.output is not None:
+        parser.error("--output is not used with --shards")
+    return args
+
+
+if __name__ == "__main__":
+    args = parser()
+    if not args.network.exists():
+        print("Could not find {}, exiting...".format(args.network))
+        sys.exit(1)
+    topology = Topology.read(args.network)
+    if args.shards is None:
+        if args.match is not None:
+            chosen = [node for node in topology.neighbors if args.match.search(node)]
+        else:
+            chosen = args.nodes
+        unknown = [node for node in chosen if node not in topology.neighbors]
+        if unknown:
+            print("Unknown nodes: {}, exiting...".format(", ".join(unknown)))
+            sys.exit(1)
+        if not chosen:
+            print("No nodes match {}, exiting...".format(args.match.pattern))
+            sys.exit(1)
+        output = args.output
+        if output is None:
+            stem = args.network.name.split(".", 1)
+            output = args.network.with_name(".".join([stem[0] + "-slice"] + stem[1:]))
+        hops = 1 if args.hops is None else args.hops
+        slices = [Slice(output, topology.neighborhood(chosen, hops), topology)]
+    else:
+        hops = 0 if args.hops is None else args.hops
+        args.shards.mkdir(parents=True, exist_ok=True)
+        slices = [
+            Slice(
+                args.shards / "{}.angler.json".format(re.sub(r"[^\w.-]", "_", region)),
+                topology.neighborhood(nodes, hops),
+                topology,
+            )
+            for region, nodes in sorted(regions_of(topology, args.region_pattern, args.regions).items())
+        ]
+    write_slices(args.network, slices)
+    for s in slices:
+        print(s.describe())
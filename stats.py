@@ -0,0 +1,200 @@
+# Summary statistics of benchmark trials: outlier detection, confidence intervals, significance tests
+# and strong-scaling metrics.
+# Used by run_all.py to decide how many trials to run, by run_all.py and make_dat.py to summarize them,
+# and by compare.py to compare them.
+
+import math
+import statistics
+
+# the modified z-score (see `outliers`) above which a value is an outlier
+OUTLIER_THRESHOLD = 3.5
+
+
+def _beta_continued_fraction(a: float, b: float, x: float) -> float:
+    """Evaluate the continued fraction of the regularized incomplete beta function (by the modified Lentz method)."""
+    tiny = 1e-300
+    c = 1.0
+    d = 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 300):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1)),
+        ):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1.0) < 1e-14:
+            break
+    return h
+
+
+def incomplete_beta(a: float, b: float, x: float) -> float:
+    """Return the regularized incomplete beta function I_x(a, b)."""
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    log_front = (
+        math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x)
+    )
+    # the continued fraction converges quickly on this side of the mean of the beta distribution
+    if x < (a + 1) / (a + b + 2):
+        return math.exp(log_front) * _beta_continued_fraction(a, b, x) / a
+    return 1 - math.exp(log_front) * _beta_continued_fraction(b, a, 1 - x) / b
+
+
+def t_cdf(t: float, df: float) -> float:
+    """Return the cumulative distribution function of Student's t distribution with `df` degrees of freedom."""
+    tail = 0.5 * incomplete_beta(df / 2, 0.5, df / (df + t * t))
+    return 1 - tail if t >= 0 else tail
+
+
+def t_quantile(p: float, df: float) -> float:
+    """Return the `p` quantile of Student's t distribution with `df` degrees of freedom (0 < p < 1)."""
+    if p == 0.5:
+        return 0.0
+    if p < 0.5:
+        return -t_quantile(1 - p, df)
+    high = 1.0
+    while t_cdf(high, df) < p:
+        high *= 2
+    low = 0.0
+    # bisect to well within the precision we report
+    for _ in range(100):
+        mid = (low + high) / 2
+        if t_cdf(mid, df) < p:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def welch_t_test(a: list[float], b: list[float]) -> float:
+    """
+    Return the two-sided p-value of Welch's t-test of the hypothesis that samples `a` and `b` have equal means,
+    or NaN if either has fewer than two values.
+    """
+    if len(a) < 2 or len(b) < 2:
+        return math.nan
+    var_a = statistics.variance(a) / len(a)
+    var_b = statistics.variance(b) / len(b)
+    if var_a + var_b == 0:
+        return 1.0 if statistics.mean(a) == statistics.mean(b) else 0.0
+    t = (statistics.mean(a) - statistics.mean(b)) / math.sqrt(var_a + var_b)
+    df = (var_a + var_b) ** 2 / (var_a**2 / (len(a) - 1) + var_b**2 / (len(b) - 1))
+    # both tails at once, without losing precision to 1 - t_cdf(t, df) for large t
+    return incomplete_beta(df / 2, 0.5, df / (df + t * t))
+
+
+def outliers(values: list[float], threshold: float = OUTLIER_THRESHOLD) -> list[bool]:
+    """
+    Flag each value that is an outlier: one whose modified z-score |0.6745 (x - median) / MAD|
+    (where MAD is the median absolute deviation) is over the threshold (Iglewicz and Hoaglin).
+    If over half of the values are equal (so the MAD is 0), the mean absolute deviation is used instead.
+    """
+    if len(values) < 3:
+        return [False for _ in values]
+    median = statistics.median(values)
+    deviations = [abs(x - median) for x in values]
+    mad = statistics.median(deviations)
+    if mad > 0:
+        scores = [0.6745 * d / mad for d in deviations]
+    else:
+        mean_ad = statistics.mean(deviations)
+        if mean_ad == 0:
+            return [False for _ in values]
+        scores = [d / (1.253314 * mean_ad) for d in deviations]
+    return [score > threshold for score in scores]
+
+
+def summarize(values: list[float], confidence: float = 0.95) -> dict[str, float]:
+    """
+    Summarize the given trials' values: their number, how many are outliers (see `outliers`), their minimum,
+    and the median, mean and confidence interval (at the given level) of the mean of the values that are not outliers.
+    The interval is NaN for fewer than two such values.
+    """
+    flags = outliers(values)
+    inliers = [x for x, outlier in zip(values, flags) if not outlier]
+    mean = statistics.mean(inliers)
+    if len(inliers) >= 2:
+        half_width = (
+            t_quantile((1 + confidence) / 2, len(inliers) - 1)
+            * statistics.stdev(inliers)
+            / math.sqrt(len(inliers))
+        )
+    else:
+        half_width = math.nan
+    return {
+        "trials": float(len(values)),
+        "outliers": float(sum(flags)),
+        "min": min(values),
+        "median": statistics.median(inliers),
+        "mean": mean,
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width,
+    }
+
+
+def relative_width(summary: dict[str, float]) -> float:
+    """Return the width of the summary's confidence interval as a fraction of its mean (NaN if unknown)."""
+    width = summary["ci_high"] - summary["ci_low"]
+    if summary["mean"] == 0:
+        return 0.0 if width == 0 else math.inf
+    return width / abs(summary["mean"])
+
+
+def stat_columns(metric: str) -> list[str]:
+    """Return the names of the .dat columns summarizing the trials of the given metric (see `metric_columns`)."""
+    return [
+        "{}_median".format(metric),
+        "{}_mean".format(metric),
+        "{}_ci_low".format(metric),
+        "{}_ci_high".format(metric),
+        "trials",
+        "outliers",
+    ]
+
+
+def metric_columns(rows: list[dict[str, float]], metric: str, confidence: float = 0.95) -> dict[str, float]:
+    """
+    Return the .dat columns summarizing the given metric over the given rows (one per trial):
+    its median, mean and confidence interval (excluding outliers), the number of trials and the number of outliers.
+    Rows without a value for the metric (e.g. extrapolated rows) are ignored.
+    """
+    values = [r[metric] for r in rows if metric in r and not math.isnan(r[metric])]
+    if not values:
+        return {c: math.nan for c in stat_columns(metric)}
+    summary = summarize(values, confidence)
+    return dict(
+        zip(
+            stat_columns(metric),
+            [summary[k] for k in ["median", "mean", "ci_low", "ci_high", "trials", "outliers"]],
+        )
+    )
+
+
+# the .dat columns describing how a benchmark's time scales with its cores (see `scaling_columns`)
+SCALING_COLUMNS = ["speedup", "efficiency", "karp_flatt"]
+
+
+def scaling_columns(times: dict[int, float]) -> dict[int, dict[str, float]]:
+    """
+    Return the strong-scaling metrics of a benchmark given its time on each number of cores, relative to one core:
+    its speedup S = T(1) / T(p), its parallel efficiency S / p,
+    and its Karp-Flatt metric (1/S - 1/p) / (1 - 1/p), the serial fraction of the work implied by the speedup
+    (which, if it grows with p, shows overheads of parallelism rather than serial work limiting the speedup).
+    Metrics that are undefined (without a time on one core, or the Karp-Flatt metric on one core) are NaN.
+    """
+    base = times.get(1, math.nan)
+    columns = {}
+    for cores, time in times.items():
+        speedup = base / time if time > 0 else math.nan
+        karp_flatt = math.nan
+        if cores > 1 and speedup > 0:
+            karp_flatt = (1 / speedup - 1 / cores) / (1 - 1 / cores)
+        columns[cores] = dict(zip(SCALING_COLUMNS, [speedup, speedup / cores, karp_flatt]))
+    return columns
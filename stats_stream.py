@@ -0,0 +1,166 @@
+# Read the JSON-lines event stream Timepiece writes with --stats-file (see Timepiece/StatsStream.cs):
+# one JSON object per line, each with an "event" field:
+#   run       the run's metadata: its mode ("modular" or "mono"), number of nodes, benchmark or file, ...
+#   start     a node's modular check started
+#   finish    a node's modular check finished, with its duration and whether it found a counterexample
+#   summary   the statistics of the run's table, whether it passed and any failed nodes
+#   error     verification did not complete
+# run_all.py follows the stream of each run as it is written, for its table rows and per-node times
+# (instead of parsing them from the run's output) and to report its progress.
+
+import json
+import os
+import pathlib
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+
+# the columns of the tables of modular and monolithic runs, as in run_all.MOD_HEADER and run_all.MONO_HEADER
+MOD_COLUMNS = ["n", "max", "min", "avg", "med", "99p", "total", "wall"]
+MONO_COLUMNS = ["n", "total"]
+# how often (in seconds) to check for new events
+POLL_INTERVAL = 0.2
+# how often (in seconds) to report the progress of a run
+PROGRESS_INTERVAL = 10.0
+
+
+def parse_event(line: str) -> Optional[dict]:
+    """Return the event of a line of a stream, or None if it is not one (e.g. the line was cut short)."""
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return None
+    return event if isinstance(event, dict) and "event" in event else None
+
+
+def summary_row(mode: Optional[str], summary: dict) -> Optional[dict[str, float]]:
+    """
+    Return the table row of a run of the given mode from its summary event,
+    or None if the run printed no table (e.g. its modular checks did not complete).
+    """
+    columns = MONO_COLUMNS if mode == "mono" else MOD_COLUMNS
+    if any(summary.get(column) is None for column in columns):
+        return None
+    return {column: float(summary[column]) for column in columns}
+
+
+class Progress:
+    """The progress of a run's modular checks, learned from its events."""
+
+    def __init__(self):
+        self.mode: Optional[str] = None
+        self.nodes: Optional[int] = None
+        self.finished = 0
+        self.counterexamples = 0
+        # the time the run event arrived
+        self.started: Optional[float] = None
+
+    def update(self, event: dict):
+        if event["event"] == "run":
+            self.mode = event.get("mode")
+            self.nodes = event.get("nodes")
+            self.started = time.monotonic()
+        elif event["event"] == "finish":
+            self.finished += 1
+            self.counterexamples += bool(event.get("counterexample"))
+
+    def describe(self) -> Optional[str]:
+        """
+        Return a line describing the progress of the modular checks and how long the rest should take
+        at the rate they have finished so far, or None before any have started.
+        """
+        if self.mode != "modular" or not self.nodes or self.started is None:
+            return None
+        elapsed = time.monotonic() - self.started
+        line = "Progress: {f} of {n} nodes checked after {s:.0f}s".format(f=self.finished, n=self.nodes, s=elapsed)
+        if self.counterexamples:
+            line += " ({} with counterexamples)".format(self.counterexamples)
+        if 0 < self.finished < self.nodes:
+            line += ", about {:.0f}s left".format(elapsed * (self.nodes - self.finished) / self.finished)
+        return line
+
+
+class EventFollower:
+    """
+    Follow the events a run writes to a stream file of its own (created here, to pass to its --stats-file option)
+    as they arrive, on a thread of its own, until stopped.
+    Each node's check time is added to `node_times` (a results_db.NodeTimes) if given,
+    and if `report` is given, it is called with a line describing the run's progress every `interval` seconds.
+    """
+
+    def __init__(
+        self,
+        node_times=None,
+        report: Optional[Callable[[str], None]] = None,
+        interval: float = PROGRESS_INTERVAL,
+    ):
+        fd, path = tempfile.mkstemp(prefix="timepiece-", suffix=".jsonl")
+        os.close(fd)
+        self.path = pathlib.Path(path)
+        self.node_times = node_times
+        self.report = report
+        self.interval = interval
+        self.events: list[dict] = []
+        self.progress = Progress()
+        self._file = open(self.path, "r")
+        self._partial = ""
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def options(self) -> list[str]:
+        """Return the DLL options writing the run's events to the stream."""
+        return ["--stats-file", str(self.path)]
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        last_report = time.monotonic()
+        while not self._stop.wait(POLL_INTERVAL):
+            self._read()
+            now = time.monotonic()
+            if self.report is not None and now - last_report >= self.interval:
+                last_report = now
+                line = self.progress.describe()
+                if line is not None:
+                    self.report(line)
+
+    def _read(self):
+        """Handle the events written since the last read."""
+        for line in iter(self._file.readline, ""):
+            if not line.endswith("\n"):
+                # the rest of the line is still being written
+                self._partial += line
+                return
+            event = parse_event(self._partial + line)
+            self._partial = ""
+            if event is None:
+                continue
+            self.events.append(event)
+            self.progress.update(event)
+            if self.node_times is not None and event["event"] == "finish":
+                self.node_times.append(event["node"], int(event["duration"]))
+
+    def stop(self):
+        """Stop following the stream once the run has exited, handling any events it wrote last, and remove it."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._read()
+        self._file.close()
+        self.path.unlink(missing_ok=True)
+
+    def checked_nodes(self) -> bool:
+        """Return whether the run reported any of its nodes' check times."""
+        return self.progress.finished > 0
+
+    def rows(self) -> list[dict[str, float]]:
+        """Return the table rows of the run's summary events."""
+        rows = []
+        for event in self.events:
+            if event["event"] == "summary":
+                row = summary_row(self.progress.mode, event)
+                if row is not None:
+                    rows.append(row)
+        return rows
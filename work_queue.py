@@ -0,0 +1,170 @@
+# A queue of benchmark jobs in a directory shared by any number of run_all.py workers
+# (see run_all.py --queue, --work and --collect), e.g. on a filesystem mounted by several hosts.
+# Each job is a JSON record that moves between subdirectories of the queue by renaming,
+# which is atomic, so that each job is claimed by exactly one worker at a time:
+#   pending/JOB.json          waiting to be run
+#   claimed/JOB@WORKER.json   being run by WORKER, which touches the file every heartbeat while it runs
+#   done/JOB@WORKER.json      the result WORKER wrote back
+#   logs/JOB.txt              the output of the job's run
+# Claims that have not been touched for longer than the stale timeout (e.g. of workers that died)
+# are moved back to pending/ to be run again.
+
+import json
+import os
+import pathlib
+import socket
+from typing import Optional
+
+# the file describing the queue's campaigns, written when it is created
+QUEUE_FILE = "queue.json"
+# the seconds between a worker's heartbeats
+DEFAULT_HEARTBEAT = 10.0
+# the seconds after its last heartbeat that a claim is taken to be abandoned
+DEFAULT_STALE = 60.0
+
+
+def worker_name() -> str:
+    """Return a name for this process that is unique among the workers of a queue: its host and process id."""
+    return "{}-{}".format(socket.gethostname().replace("@", "-"), os.getpid())
+
+
+def write_json(path: pathlib.Path, record: dict):
+    """Write the record to the path atomically: readers see either no file or all of it."""
+    temp = path.with_name(".{}.tmp".format(path.name))
+    with open(temp, "w") as f:
+        json.dump(record, f)
+    os.rename(temp, path)
+
+
+def read_json(path: pathlib.Path) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class Claim:
+    """A job claimed by a worker, held as long as the worker's claim file exists."""
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self.job = read_json(path)
+
+
+class WorkQueue:
+    """A work queue in the given directory (see the top of this file for its layout)."""
+
+    def __init__(self, directory: pathlib.Path):
+        self.directory = pathlib.Path(directory)
+        self.pending = self.directory.joinpath("pending")
+        self.claimed = self.directory.joinpath("claimed")
+        self.done = self.directory.joinpath("done")
+        self.logs = self.directory.joinpath("logs")
+
+    def exists(self) -> bool:
+        return self.directory.joinpath(QUEUE_FILE).exists()
+
+    def create(self, description: dict, jobs: list[dict]):
+        """
+        Create the queue with the given description and pending jobs, each of which must have an "id";
+        jobs are claimed in the order of their ids.
+        Raise FileExistsError if the directory already holds a queue.
+        """
+        if self.exists():
+            raise FileExistsError("{} already holds a work queue".format(self.directory))
+        for directory in [self.pending, self.claimed, self.done, self.logs]:
+            directory.mkdir(parents=True, exist_ok=True)
+        for job in jobs:
+            write_json(self.pending.joinpath("{}.json".format(job["id"])), job)
+        # written last, so that workers only find the queue once all its jobs are pending
+        write_json(self.directory.joinpath(QUEUE_FILE), description)
+
+    def description(self) -> dict:
+        return read_json(self.directory.joinpath(QUEUE_FILE))
+
+    def log_file(self, job: dict) -> pathlib.Path:
+        return self.logs.joinpath("{}.txt".format(job["id"]))
+
+    def now(self) -> float:
+        """
+        Return the current time of the queue's filesystem (the modification time of a file just touched),
+        so that hosts whose clocks disagree agree on which claims are stale.
+        """
+        clock = self.directory.joinpath(".clock")
+        clock.touch()
+        return clock.stat().st_mtime
+
+    def claim(self, worker: str) -> Optional[Claim]:
+        """Claim the first pending job for the given worker, returning None if there are none."""
+        for path in sorted(self.pending.glob("*.json")):
+            try:
+                # touch the job first, so that its claim is not stale as soon as it is made
+                os.utime(path)
+                claimed = self.claimed.joinpath("{}@{}.json".format(path.stem, worker))
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # another worker claimed it first
+                continue
+            return Claim(claimed)
+        return None
+
+    def heartbeat(self, claim: Claim) -> bool:
+        """Mark the claim as still held, returning False if it has been reclaimed."""
+        try:
+            os.utime(claim.path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, claim: Claim, result: dict) -> bool:
+        """
+        Write back the result of a claimed job and give up the claim,
+        returning False (and dropping the result) if the claim has been reclaimed.
+        """
+        if not self.heartbeat(claim):
+            return False
+        write_json(self.done.joinpath(claim.path.name), dict(result, id=claim.job["id"]))
+        try:
+            claim.path.unlink()
+        except FileNotFoundError:
+            # reclaimed since the heartbeat: the job may be run again, but only one of its results is used
+            pass
+        return True
+
+    def release(self, claim: Claim):
+        """Give up a claim without a result, so that the job can be run by another worker."""
+        try:
+            os.rename(claim.path, self.pending.joinpath("{}.json".format(claim.job["id"])))
+        except FileNotFoundError:
+            pass
+
+    def reclaim_stale(self, stale: float = DEFAULT_STALE) -> list[str]:
+        """Move the claims not touched for `stale` seconds back to pending, returning their job ids."""
+        now = self.now()
+        reclaimed = []
+        for path in sorted(self.claimed.glob("*.json")):
+            job_id = path.stem.partition("@")[0]
+            try:
+                if now - path.stat().st_mtime < stale:
+                    continue
+                os.rename(path, self.pending.joinpath("{}.json".format(job_id)))
+            except FileNotFoundError:
+                # completed, released or reclaimed by another worker meanwhile
+                continue
+            reclaimed.append(job_id)
+        return reclaimed
+
+    def results(self) -> dict[str, dict]:
+        """Return the result of each job written back so far (only one, if a job was run more than once)."""
+        results = {}
+        for path in sorted(self.done.glob("*.json")):
+            result = read_json(path)
+            if result["id"] not in results:
+                results[result["id"]] = result
+        return results
+
+    def counts(self) -> dict[str, int]:
+        """Return the numbers of pending, claimed and done jobs."""
+        return {
+            "pending": sum(1 for _ in self.pending.glob("*.json")),
+            "claimed": sum(1 for _ in self.claimed.glob("*.json")),
+            "done": len(self.results()),
+        }